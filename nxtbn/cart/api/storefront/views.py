@@ -1,87 +1,95 @@
+from decimal import Decimal
+
 from django.conf import settings
 from django.shortcuts import get_object_or_404
 from rest_framework import generics
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from nxtbn.cart.models import Cart, CartItem
-from nxtbn.cart.api.storefront.serializers import CartAddUpdateSerializer, CartSerializer
+from nxtbn.cart.api.storefront.serializers import CartAddUpdateSerializer
 from rest_framework import status
 from rest_framework.permissions import AllowAny
 
-from nxtbn.cart.utils import get_or_create_cart, save_guest_cart
-from nxtbn.core.utils import apply_exchange_rate, build_currency_amount, get_in_user_currency
-from nxtbn.product.models import ProductVariant
-from nxtbn.core.currency.backend import currency_Backend
+from nxtbn.cart.utils import get_or_create_cart
+from nxtbn.core.utils import build_currency_amount, get_currency_formatter, get_in_user_currency
+from nxtbn.product.models import Product, ProductVariant
+from nxtbn.core.currency.backend import get_currency_backend
 
 
-class CartView(generics.GenericAPIView):
+class CartRenderMixin:
     """
-    GET: Retrieve the current cart.
+    Renders a cart. Guest and user carts are rendered the same way: all variants, their products and
+    first images are loaded in a fixed number of queries, and every price is formatted in one pass.
     """
-    permission_classes = [AllowAny]
 
-    def get(self, request, *args, **kwargs):
-        cart, is_guest = get_or_create_cart(request)
-        exchange_rate = currency_Backend().get_exchange_rate(self.request.currency)
+    def get_variants(self, variant_ids):
+        variants = ProductVariant.objects.filter(id__in=variant_ids).select_related(
+            'product', 'variant_image'
+        ).prefetch_related(
+            Product.prefetch_first_image('product__images')
+        )
+        return {variant.id: variant for variant in variants}
+
+    def render_cart(self, quantities, is_guest):
+        variants = self.get_variants({int(product_variant_id) for product_variant_id, quantity in quantities})
+
+        lines = []
+        for product_variant_id, quantity in quantities:
+            product_variant = variants.get(int(product_variant_id))
+            if product_variant is None:
+                continue  # Optionally, handle missing product variants
+            lines.append((product_variant, quantity, product_variant.price * quantity))
+        total = sum(subtotal for product_variant, quantity, subtotal in lines)
+
+        # Convert and format every amount at once: unit prices, line subtotals and the total
+        exchange_rate = Decimal(get_currency_backend().get_exchange_rate(self.request.currency))
+        amounts = [product_variant.price for product_variant, quantity, subtotal in lines]
+        amounts += [subtotal for product_variant, quantity, subtotal in lines]
+        amounts.append(total)
+        formatted = get_currency_formatter(self.request.currency, 'en_US').format_many(
+            [Decimal(amount) * exchange_rate for amount in amounts]
+        )
+        prices, subtotals, formatted_total = formatted[:len(lines)], formatted[len(lines):-1], formatted[-1]
 
         items = []
-        total = 0
-
-        if is_guest:
-            # Handle guest cart stored in session
-            for product_variant_id, item in cart.items():
-                try:
-                    product_variant = ProductVariant.objects.get(id=product_variant_id)
-                    subtotal = product_variant.price * item['quantity']
-                    total += subtotal
-                    items.append({
-                        'product_variant': {
-                            'id': product_variant.id,
-                            'alias': product_variant.alias,
-                            'thumbnail': product_variant.variant_thumbnail(request),
-                            'name': product_variant.get_descriptive_name(),
-                            'price': apply_exchange_rate(product_variant.price, exchange_rate, self.request.currency, 'en_US'),
-                            'stock': product_variant.stock,
-                            'is_guest': is_guest
-                        },
-                        'quantity': item['quantity'],
-                        'subtotal': apply_exchange_rate(subtotal, exchange_rate, self.request.currency, 'en_US'),
-                    })
-                except ProductVariant.DoesNotExist:
-                    continue  # Optionally, handle missing product variants
-        else:
-            # Handle authenticated user's cart
-            cart_items = cart.items.all()  # Assuming this is a reverse relation in Cart model
-            for cart_item in cart_items:
-                product_variant = cart_item.variant
-                subtotal = product_variant.price * cart_item.quantity
-                total += subtotal
-                items.append({
-                    'product_variant': {
-                        'id': product_variant.id,
-                        'alias': product_variant.alias,
-                        'thumbnail': product_variant.variant_thumbnail(request),
-                        'name': product_variant.get_descriptive_name(),
-                        'price': apply_exchange_rate(product_variant.price, exchange_rate, self.request.currency, 'en_US'),
-                        'stock': product_variant.stock,
-                        'is_guest': is_guest
-                    },
-                    'quantity': cart_item.quantity,
-                    'subtotal': apply_exchange_rate(subtotal, exchange_rate, self.request.currency, 'en_US'),
-                })
+        for (product_variant, quantity, subtotal), price, formatted_subtotal in zip(lines, prices, subtotals):
+            items.append({
+                'product_variant': {
+                    'id': product_variant.id,
+                    'alias': product_variant.alias,
+                    'thumbnail': product_variant.variant_thumbnail(self.request),
+                    'name': product_variant.get_descriptive_name(),
+                    'price': price,
+                    'stock': product_variant.stock,
+                    'is_guest': is_guest
+                },
+                'quantity': quantity,
+                'subtotal': formatted_subtotal,
+            })
 
         # Unified response for both guest and authenticated users
-        unified_response = {
+        return {
             'items': items,
-            'total':  apply_exchange_rate(total, exchange_rate, self.request.currency, 'en_US'),
+            'total': formatted_total,
         }
-        return Response(unified_response, status=status.HTTP_200_OK)
+
+
+class CartView(CartRenderMixin, generics.GenericAPIView):
+    """
+    GET: Retrieve the current cart.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        cart, is_guest = get_or_create_cart(request)
+        quantities = list(cart.get_items().items())
+
+        return Response(self.render_cart(quantities, is_guest), status=status.HTTP_200_OK)
 
 
 
-class AddToCartView(generics.CreateAPIView):
+class AddToCartView(CartRenderMixin, generics.CreateAPIView):
     """
-    POST: Add an item to the cart.
+    POST: Add an item to the cart. Signed-in customers get the updated cart back.
     """
     permission_classes = [AllowAny]
     serializer_class = CartAddUpdateSerializer
@@ -93,33 +101,10 @@ class AddToCartView(generics.CreateAPIView):
         product_variant = get_object_or_404(ProductVariant, id=product_variant_id)
 
         cart, is_guest = get_or_create_cart(request)
-
+        cart.add(product_variant.id, quantity)
         if not is_guest:
-            # Authenticated user
-            cart_item, created = CartItem.objects.get_or_create(
-                cart=cart,
-                variant=product_variant
-            )
-            if not created:
-                cart_item.quantity += quantity
-                cart_item.save()
-            else:
-                cart_item.quantity = quantity
-                cart_item.save()
-            serializer = CartSerializer(cart)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        else:
-            # Guest user
-            cart = request.session.get('cart', {})
-            if str(product_variant_id) in cart:
-                cart[str(product_variant_id)]['quantity'] += quantity
-            else:
-                cart[str(product_variant_id)] = {
-                    'quantity': quantity,
-                    'price': str(product_variant.price)  # Ensure JSON serializable
-                }
-            save_guest_cart(request, cart)
-            return Response({'message': 'Item added to cart successfully.'}, status=status.HTTP_200_OK)
+            return Response(self.render_cart(list(cart.get_items().items()), is_guest), status=status.HTTP_200_OK)
+        return Response({'message': 'Item added to cart successfully.'}, status=status.HTTP_200_OK)
 
 
 class UpdateCartItemView(generics.UpdateAPIView):
@@ -139,26 +124,9 @@ class UpdateCartItemView(generics.UpdateAPIView):
         product_variant = get_object_or_404(ProductVariant, id=product_variant_id)
 
         cart, is_guest = get_or_create_cart(request)
-
-        if not is_guest:
-            # Authenticated user
-            try:
-                cart_item = CartItem.objects.get(cart=cart, variant=product_variant)
-                cart_item.quantity = quantity
-                cart_item.save()
-                message = {'message': 'Cart item updated successfully.'}
-                return Response(message, status=status.HTTP_200_OK)
-            except CartItem.DoesNotExist:
-                return Response({'error': 'Item not found in cart.'}, status=status.HTTP_404_NOT_FOUND)
-        else:
-            # Guest user
-            cart = request.session.get('cart', {})
-            if str(product_variant_id) in cart:
-                cart[str(product_variant_id)]['quantity'] = quantity
-                save_guest_cart(request, cart)
-                return Response({'message': 'Cart item updated successfully.'}, status=status.HTTP_200_OK)
-            else:
-                return Response({'error': 'Item not found in cart.'}, status=status.HTTP_404_NOT_FOUND)
+        if cart.update(product_variant.id, quantity):
+            return Response({'message': 'Cart item updated successfully.'}, status=status.HTTP_200_OK)
+        return Response({'error': 'Item not found in cart.'}, status=status.HTTP_404_NOT_FOUND)
 
 
 class RemoveFromCartView(generics.DestroyAPIView):
@@ -172,22 +140,6 @@ class RemoveFromCartView(generics.DestroyAPIView):
         product_variant = get_object_or_404(ProductVariant, id=product_variant_id)
 
         cart, is_guest = get_or_create_cart(request)
-
-        if not is_guest:
-            # Authenticated user
-            try:
-                cart_item = CartItem.objects.get(cart=cart, variant=product_variant)
-                cart_item.delete()
-                serializer = CartSerializer(cart)
-                return Response(serializer.data, status=status.HTTP_200_OK)
-            except CartItem.DoesNotExist:
-                return Response({'error': 'Item not found in cart.'}, status=status.HTTP_404_NOT_FOUND)
-        else:
-            # Guest user
-            cart = request.session.get('cart', {})
-            if str(product_variant_id) in cart:
-                del cart[str(product_variant_id)]
-                save_guest_cart(request, cart)
-                return Response({'message': 'Item removed from cart successfully.'}, status=status.HTTP_200_OK)
-            else:
-                return Response({'error': 'Item not found in cart.'}, status=status.HTTP_404_NOT_FOUND)
+        if cart.remove(product_variant.id):
+            return Response({'message': 'Item removed from cart successfully.'}, status=status.HTTP_200_OK)
+        return Response({'error': 'Item not found in cart.'}, status=status.HTTP_404_NOT_FOUND)
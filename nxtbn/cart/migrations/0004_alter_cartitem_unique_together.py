@@ -0,0 +1,32 @@
+# Generated by Django 4.2.11 on 2026-10-18 03:04
+
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_cart_items(apps, schema_editor):
+    """Folds duplicate (cart, variant) rows into one, summing their quantities."""
+    CartItem = apps.get_model('cart', 'CartItem')
+    duplicates = CartItem.objects.values('cart_id', 'variant_id').annotate(
+        rows=Count('id'), keep_id=Min('id'), total=Sum('quantity')
+    ).filter(rows__gt=1)
+    for duplicate in duplicates:
+        items = CartItem.objects.filter(cart_id=duplicate['cart_id'], variant_id=duplicate['variant_id'])
+        items.exclude(id=duplicate['keep_id']).delete()
+        items.update(quantity=duplicate['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0005_productvariantprice'),
+        ('cart', '0003_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cart_items, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='cartitem',
+            unique_together={('cart', 'variant')},
+        ),
+    ]
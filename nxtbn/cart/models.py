@@ -46,5 +46,8 @@ class CartItem(AbstractBaseUUIDModel):
         validators=[MinValueValidator(1)]
     )
 
+    class Meta:
+        unique_together = ('cart', 'variant')
+
     def __str__(self):
         return f"{self.variant.name} in Cart {self.cart.id}"
\ No newline at end of file
@@ -0,0 +1,25 @@
+from celery import shared_task
+
+from nxtbn.cart.utils import merge_cart_items, remove_ordered_items
+from nxtbn.users.models import User
+
+
+@shared_task(ignore_result=True)
+def merge_cart_items_task(user_id, items):
+    """Merges a large guest cart, {variant_id: quantity}, into the user's cart after login."""
+    user = User.objects.filter(pk=user_id).first()
+    if user is None:
+        return
+    # JSON serialization turns the variant ids into strings
+    merge_cart_items(user, {int(variant_id): quantity for variant_id, quantity in items.items()})
+
+
+@shared_task(ignore_result=True)
+def remove_ordered_items_task(order_id, user_id=None, guest_token=None):
+    """Removes the items of a placed order from the cart it was checked out from."""
+    user = None
+    if user_id is not None:
+        user = User.objects.filter(pk=user_id).first()
+        if user is None:
+            return
+    remove_ordered_items(order_id, user=user, guest_token=guest_token)
@@ -1,3 +1,213 @@
-from django.test import TestCase
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from allauth.account.models import EmailAddress
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.reverse import reverse
+
+from nxtbn.cart.models import Cart, CartItem
+from nxtbn.cart.utils import DatabaseCartStorage, remove_ordered_items_from_cart
+from nxtbn.filemanager.models import Image
+from nxtbn.home.base_tests import BaseTestCase
+from nxtbn.order.proccesor.views import OrderCalculation
+from nxtbn.product.models import Category, Product, ProductType, ProductVariant
+
+
+class CartFixtureTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(name='Cart Category')
+        self.product_type = ProductType.objects.create(name='Cart Type')
+
+    def create_variants(self, count):
+        variants = []
+        for _ in range(count):
+            index = ProductVariant.objects.count()
+            product = Product.objects.create(
+                created_by=self.user,
+                name=f'Cart Product {index}',
+                summary='summary',
+                description='description',
+                category=self.category,
+                product_type=self.product_type,
+            )
+            image = Image.objects.create(created_by=self.user, name=f'Cart Image {index}', image=f'cart-{index}.png', image_alt_text='alt')
+            product.images.add(image)
+            variants.append(ProductVariant.objects.create(
+                product=product,
+                price=Decimal('10.00'),
+                cost_per_unit=Decimal('5.00'),
+                sku=f'CART-{index}',
+            ))
+        return variants
+
+
+class CartViewQueryCountTest(CartFixtureTestCase):
+
+    def fill_guest_cart(self, variants):
+        for variant in variants:
+            response = self.client.post(reverse('cart-add'), {'product_variant_id': variant.id, 'quantity': 2})
+            self.assertSuccess(response)
+
+    def fill_user_cart(self, variants):
+        cart, created = Cart.objects.get_or_create(user=self.user)
+        CartItem.objects.bulk_create([CartItem(cart=cart, variant=variant, quantity=2) for variant in variants])
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('cart-list'))
+        self.assertSuccess(response)
+        return len(context.captured_queries), response.data
+
+    def test_guest_cart_query_count_does_not_grow(self):
+        self.fill_guest_cart(self.create_variants(2))
+        small_cart_queries, data = self.count_queries()
+        self.assertEqual(len(data['items']), 2)
+        self.assertEqual(data['total'], '$40.00')
+
+        self.fill_guest_cart(self.create_variants(8))
+        large_cart_queries, data = self.count_queries()
+        self.assertEqual(len(data['items']), 10)
+        self.assertEqual(small_cart_queries, large_cart_queries)
+
+    def test_user_cart_query_count_does_not_grow(self):
+        self.client.force_login(self.user)
+
+        self.fill_user_cart(self.create_variants(2))
+        small_cart_queries, data = self.count_queries()
+        self.assertEqual(data['items'][0]['subtotal'], '$20.00')
+
+        self.fill_user_cart(self.create_variants(8))
+        large_cart_queries, data = self.count_queries()
+        self.assertEqual(len(data['items']), 10)
+        self.assertEqual(small_cart_queries, large_cart_queries)
+
+
+class CartStorageTest(CartFixtureTestCase):
+
+    def test_user_cart_mutations(self):
+        self.client.force_login(self.user)
+        variant, other_variant = self.create_variants(2)
+
+        for _ in range(2):
+            response = self.client.post(reverse('cart-add'), {'product_variant_id': variant.id, 'quantity': 2})
+            self.assertSuccess(response)
+        self.assertEqual(CartItem.objects.get(cart__user=self.user, variant=variant).quantity, 4)
+
+        response = self.client.put(reverse('cart-update'), {'product_variant_id': variant.id, 'quantity': 1}, content_type='application/json')
+        self.assertSuccess(response)
+        response = self.client.put(reverse('cart-update'), {'product_variant_id': other_variant.id, 'quantity': 1}, content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
+        self.assertSuccess(self.client.delete(reverse('cart-remove', args=[variant.id])))
+        self.assertEqual(self.client.delete(reverse('cart-remove', args=[variant.id])).status_code, 404)
+        self.assertFalse(CartItem.objects.filter(cart__user=self.user).exists())
+
+    def test_add_returns_the_cart_to_customers(self):
+        variant, = self.create_variants(1)
+
+        response = self.client.post(reverse('cart-add'), {'product_variant_id': variant.id, 'quantity': 2})
+        self.assertSuccess(response)
+        self.assertEqual(response.data, {'message': 'Item added to cart successfully.'})
+
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('cart-add'), {'product_variant_id': variant.id, 'quantity': 3})
+        self.assertSuccess(response)
+        self.assertEqual(set(response.data), {'items', 'total'})
+        item, = response.data['items']
+        self.assertEqual(set(item), {'product_variant', 'quantity', 'subtotal'})
+        self.assertEqual(
+            set(item['product_variant']), {'id', 'alias', 'thumbnail', 'name', 'price', 'stock', 'is_guest'}
+        )
+        self.assertEqual((item['product_variant']['id'], item['quantity']), (variant.id, 3))
+        self.assertEqual(response.data['total'], '$30.00')
+        self.assertEqual(response.data, self.client.get(reverse('cart-list')).data)
+
+    def test_concurrent_first_add_is_summed(self):
+        variant, = self.create_variants(1)
+        storage = DatabaseCartStorage(self.user)
+        update = QuerySet.update
+        missed = []
+
+        def update_after_concurrent_add(queryset, **kwargs):
+            if not missed:
+                # Another request inserts the item right after this UPDATE found nothing to change
+                missed.append(True)
+                CartItem.objects.create(cart=storage.cart, variant=variant, quantity=1)
+                return 0
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', autospec=True, side_effect=update_after_concurrent_add):
+            self.assertEqual(storage.add(variant.id, 2), 3)
+        self.assertEqual(CartItem.objects.get(cart__user=self.user, variant=variant).quantity, 3)
+
+
+class MergeCartsTest(CartFixtureTestCase):
+
+    def setUp(self):
+        super().setUp()
+        EmailAddress.objects.create(user=self.user, email=self.user.email, verified=True, primary=True)
+
+    def login(self):
+        # The dashboard login view is registered under the same url name
+        response = self.client.post('/user/storefront/api/login/', {'email': 'johndoe@example.com', 'password': 'testpass'})
+        self.assertSuccess(response)
+
+    def test_guest_cart_is_merged_on_login(self):
+        shared_variant, guest_variant = self.create_variants(2)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, variant=shared_variant, quantity=3)
+
+        self.client.post(reverse('cart-add'), {'product_variant_id': shared_variant.id, 'quantity': 2})
+        self.client.post(reverse('cart-add'), {'product_variant_id': guest_variant.id, 'quantity': 1})
+        session = self.client.session
+        session['cart']['999999'] = {'quantity': 1}  # variant deleted since it was added
+        session.save()
+
+        self.login()
+
+        self.assertEqual(
+            dict(cart.items.values_list('variant_id', 'quantity')),
+            {shared_variant.id: 5, guest_variant.id: 1},
+        )
+        self.assertEqual(self.client.session['cart'], {})
+
+    @override_settings(CART_MERGE_ASYNC_THRESHOLD=1)
+    def test_large_guest_cart_is_merged_by_task(self):
+        variants = self.create_variants(3)
+        for variant in variants:
+            self.client.post(reverse('cart-add'), {'product_variant_id': variant.id, 'quantity': 1})
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.login()
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(CartItem.objects.filter(cart__user=self.user).count(), 3)
+
+
+class RemoveOrderedItemsTest(CartFixtureTestCase):
+
+    def test_ordered_items_are_removed_after_commit(self):
+        ordered_variant, kept_variant = self.create_variants(2)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, variant=ordered_variant, quantity=1),
+            CartItem(cart=cart, variant=kept_variant, quantity=1),
+        ])
+
+        request = SimpleNamespace(user=self.user, currency='USD', META={})
+        validated_data = {'variants': [{'alias': str(ordered_variant.alias), 'quantity': 1}]}
+        order = OrderCalculation(validated_data, order_source='storefront', create_order=True, request=request).create_order_instance()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            remove_ordered_items_from_cart(order, request=request)
+        self.assertEqual(cart.items.count(), 2)  # nothing is deleted before the order is committed
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(list(cart.items.values_list('variant_id', flat=True)), [kept_variant.id])
@@ -1,21 +1,285 @@
+import uuid
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
 
 from nxtbn.product.models import ProductVariant
 from nxtbn.cart.models import Cart, CartItem
 
-from django.shortcuts import get_object_or_404
+
+class CartStorage(ABC):
+    """
+    Interface of a cart store. Items are kept as {variant_id: quantity}.
+
+    Every mutation is a single atomic operation of the backend, so concurrent requests
+    (e.g. a double-clicked "add to cart") never lose an update.
+    """
+
+    @abstractmethod
+    def get_items(self):
+        """Returns {variant_id: quantity} of every item in the cart."""
+
+    @abstractmethod
+    def add(self, variant_id, quantity):
+        """Adds `quantity` to the item, creating it if needed."""
+
+    @abstractmethod
+    def update(self, variant_id, quantity):
+        """Sets the quantity of an existing item. Returns False if the item is not in the cart."""
+
+    @abstractmethod
+    def remove(self, variant_id):
+        """Removes an item. Returns False if the item was not in the cart."""
+
+    def remove_many(self, variant_ids):
+        for variant_id in variant_ids:
+            self.remove(variant_id)
+
+    @abstractmethod
+    def clear(self):
+        """Removes every item."""
+
+
+class SessionCartStorage(CartStorage):
+    """
+    Guest cart stored in the Django session as {"<variant_id>": {"quantity": n}}.
+    """
+
+    def __init__(self, request):
+        self.request = request
+
+    def get_cart(self):
+        return self.request.session.get('cart', {})
+
+    def save_cart(self, cart):
+        save_guest_cart(self.request, cart)
+
+    def get_items(self):
+        return {int(variant_id): item['quantity'] for variant_id, item in self.get_cart().items()}
+
+    def add(self, variant_id, quantity):
+        cart = self.get_cart()
+        item = cart.setdefault(str(variant_id), {'quantity': 0})
+        item['quantity'] += quantity
+        self.save_cart(cart)
+        return item['quantity']
+
+    def update(self, variant_id, quantity):
+        cart = self.get_cart()
+        if str(variant_id) not in cart:
+            return False
+        cart[str(variant_id)]['quantity'] = quantity
+        self.save_cart(cart)
+        return True
+
+    def remove(self, variant_id):
+        return self.remove_many([variant_id]) > 0
+
+    def remove_many(self, variant_ids):
+        cart = self.get_cart()
+        removed = [cart.pop(str(variant_id)) for variant_id in variant_ids if str(variant_id) in cart]
+        if removed:
+            self.save_cart(cart)
+        return len(removed)
+
+    def clear(self):
+        self.save_cart({})
+
+
+class DatabaseCartStorage(CartStorage):
+    """
+    Customer cart stored as Cart/CartItem rows. Quantities are changed with conditional
+    UPDATEs on the row instead of read-modify-save.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._cart = None
+
+    @property
+    def cart(self):
+        if self._cart is None:
+            self._cart, created = Cart.objects.get_or_create(user=self.user)
+        return self._cart
+
+    def get_items(self):
+        return dict(CartItem.objects.filter(cart__user=self.user).values_list('variant_id', 'quantity'))
+
+    def add(self, variant_id, quantity):
+        items = CartItem.objects.filter(cart=self.cart, variant_id=variant_id)
+        if not items.update(quantity=F('quantity') + quantity):
+            try:
+                with transaction.atomic():
+                    CartItem.objects.create(cart=self.cart, variant_id=variant_id, quantity=quantity)
+            except IntegrityError:
+                # Added by a concurrent request in the meantime
+                items.update(quantity=F('quantity') + quantity)
+        return items.values_list('quantity', flat=True).first()
+
+    def update(self, variant_id, quantity):
+        return CartItem.objects.filter(cart__user=self.user, variant_id=variant_id).update(quantity=quantity) > 0
+
+    def remove(self, variant_id):
+        return self.remove_many([variant_id]) > 0
+
+    def remove_many(self, variant_ids):
+        deleted, _ = CartItem.objects.filter(cart__user=self.user, variant_id__in=variant_ids).delete()
+        return deleted
+
+    def clear(self):
+        CartItem.objects.filter(cart__user=self.user).delete()
+
+
+_redis_client = None
+
+
+def get_redis_client():
+    global _redis_client
+    if _redis_client is None:
+        import redis
+        _redis_client = redis.Redis.from_url(settings.REDIS_URL)
+    return _redis_client
+
+
+class RedisCartStorage(CartStorage):
+    """
+    Cart stored as a Redis hash {variant_id: quantity} that expires after `CART_TTL` seconds of inactivity.
+
+    Every change is a single HINCRBY/HSET/HDEL, so nothing is rewritten as a whole and concurrent
+    changes cannot overwrite each other. Customer carts are written to the database only on
+    login merge and checkout (see `persist_cart`); if their hash expired, it is reloaded from there.
+    """
+
+    # Sets the quantity only if the item is already in the cart, in one round trip
+    UPDATE_SCRIPT = """
+    if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 1 then
+        redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+        redis.call('EXPIRE', KEYS[1], ARGV[3])
+        return 1
+    end
+    return 0
+    """
+
+    def __init__(self, key, user=None, client=None, ttl=None):
+        self.key = f"cart:{key}"
+        self.user = user
+        self.client = client or get_redis_client()
+        self.ttl = ttl or settings.CART_TTL
+
+    @classmethod
+    def for_user(cls, user, **kwargs):
+        return cls(f"user:{user.pk}", user=user, **kwargs)
+
+    @classmethod
+    def for_guest(cls, request, **kwargs):
+        # The session only holds a random cart token, written once when the guest first gets a cart
+        token = request.session.get('cart_token')
+        if token is None:
+            token = uuid.uuid4().hex
+            request.session['cart_token'] = token
+        return cls.for_guest_token(token, **kwargs)
+
+    @classmethod
+    def for_guest_token(cls, token, **kwargs):
+        storage = cls(f"guest:{token}", **kwargs)
+        storage.guest_token = token
+        return storage
+
+    def get_items(self):
+        items = self.client.hgetall(self.key)
+        if not items and self.user is not None:
+            items = self.load_persisted_items()
+        return {int(variant_id): int(quantity) for variant_id, quantity in items.items()}
+
+    def load_persisted_items(self):
+        items = dict(CartItem.objects.filter(cart__user=self.user).values_list('variant_id', 'quantity'))
+        if items:
+            pipeline = self.client.pipeline()
+            pipeline.hset(self.key, mapping=items)
+            pipeline.expire(self.key, self.ttl)
+            pipeline.execute()
+        return items
+
+    def ensure_loaded(self):
+        """Reloads an expired customer cart from the database before it is changed."""
+        if self.user is not None and not self.client.exists(self.key):
+            self.load_persisted_items()
+
+    def add(self, variant_id, quantity):
+        self.ensure_loaded()
+        pipeline = self.client.pipeline()
+        pipeline.hincrby(self.key, variant_id, quantity)
+        pipeline.expire(self.key, self.ttl)
+        new_quantity, _ = pipeline.execute()
+        return new_quantity
+
+    def add_many(self, items):
+        if not items:
+            return
+        self.ensure_loaded()
+        pipeline = self.client.pipeline()
+        for variant_id, quantity in items.items():
+            pipeline.hincrby(self.key, variant_id, quantity)
+        pipeline.expire(self.key, self.ttl)
+        pipeline.execute()
+
+    def update(self, variant_id, quantity):
+        self.ensure_loaded()
+        return bool(self.client.eval(self.UPDATE_SCRIPT, 1, self.key, variant_id, quantity, self.ttl))
+
+    def remove(self, variant_id):
+        return self.remove_many([variant_id]) > 0
+
+    def remove_many(self, variant_ids):
+        variant_ids = list(variant_ids)
+        if not variant_ids:
+            return 0
+        self.ensure_loaded()
+        return self.client.hdel(self.key, *variant_ids)
+
+    def clear(self):
+        self.client.delete(self.key)
+
 
 def get_or_create_cart(request):
     """
-    Retrieves the cart for the authenticated user or creates a new guest cart.
-    Returns a tuple: (cart_object, is_guest)
+    Returns the cart storage of the current shopper as a tuple: (cart_storage, is_guest).
+    With `CART_STORAGE = 'redis'` both guest and customer carts live in Redis; otherwise guest
+    carts live in the session and customer carts in the database.
     """
     if request.user.is_authenticated:
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        return cart, False
-    else:
-        # For guest users, retrieve the cart from the session
-        cart = request.session.get('cart', {})
-        return cart, True
+        return get_user_cart_storage(request.user), False
+
+    if settings.CART_STORAGE == 'redis':
+        return RedisCartStorage.for_guest(request), True
+    return SessionCartStorage(request), True
+
+
+def get_user_cart_storage(user):
+    if settings.CART_STORAGE == 'redis':
+        return RedisCartStorage.for_user(user)
+    return DatabaseCartStorage(user)
+
+
+def persist_cart(user, storage):
+    """
+    Writes a customer's Redis cart to the database, replacing the stored items.
+    No-op for the database storage, which is always persisted.
+    """
+    if not isinstance(storage, RedisCartStorage):
+        return
+
+    items = storage.get_items()
+    with transaction.atomic():
+        cart, created = Cart.objects.get_or_create(user=user)
+        CartItem.objects.filter(cart=cart).delete()
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, variant_id=variant_id, quantity=quantity)
+            for variant_id, quantity in items.items()
+        ])
+
 
 def save_guest_cart(request, cart):
     """
@@ -26,57 +290,104 @@ def save_guest_cart(request, cart):
 
 def merge_carts(request, user):
     """
-    Merges the guest cart stored in the session with the authenticated user's cart.
+    Merges the guest cart of the request into the authenticated user's cart.
+
+    Unknown variants are dropped with a single query. Carts larger than `CART_MERGE_ASYNC_THRESHOLD`
+    items are merged by a Celery task, so a big guest cart does not slow down the login request.
     """
-    session_cart = request.session.get('cart', {})
-    if not session_cart:
+    if settings.CART_STORAGE == 'redis':
+        guest_storage = RedisCartStorage.for_guest(request)
+    else:
+        guest_storage = SessionCartStorage(request)
+
+    guest_items = guest_storage.get_items()
+    if not guest_items:
         return
 
-    cart, created = Cart.objects.get_or_create(user=user)
+    existing_variant_ids = set(ProductVariant.objects.filter(id__in=guest_items).values_list('id', flat=True))
+    items = {
+        variant_id: quantity for variant_id, quantity in guest_items.items()
+        if variant_id in existing_variant_ids and quantity > 0
+    }
+
+    # Clear the guest cart after merging
+    guest_storage.clear()
+
+    if len(items) > settings.CART_MERGE_ASYNC_THRESHOLD:
+        from nxtbn.cart.tasks import merge_cart_items_task
+        transaction.on_commit(lambda: merge_cart_items_task.delay(user.pk, items))
+    else:
+        merge_cart_items(user, items)
 
-    for product_variant_id, item in session_cart.items():
-        product_variant = get_object_or_404(ProductVariant, id=product_variant_id)
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product_variant=product_variant
-        )
-        if not created:
-            cart_item.quantity += item.get('quantity', 1)
-            cart_item.save()
-        else:
-            cart_item.quantity = item.get('quantity', 1)
-            cart_item.save()
 
-    # Clear the session cart after merging
-    request.session['cart'] = {}
+def merge_cart_items(user, items):
+    """
+    Adds {variant_id: quantity} to the user's cart, summing quantities with the items already in it.
+    The items are expected to reference existing variants.
+    """
+    if not items:
+        return
 
+    storage = get_user_cart_storage(user)
+    if isinstance(storage, RedisCartStorage):
+        storage.add_many(items)
+        persist_cart(user, storage)
+        return
+
+    with transaction.atomic():
+        # Locking the cart row serializes concurrent merges into the same cart
+        cart, created = Cart.objects.get_or_create(user=user)
+        cart = Cart.objects.select_for_update().get(pk=cart.pk)
+        existing = dict(
+            CartItem.objects.filter(cart=cart, variant_id__in=items).values_list('variant_id', 'quantity')
+        )
+        CartItem.objects.bulk_create(
+            [
+                CartItem(cart=cart, variant_id=variant_id, quantity=existing.get(variant_id, 0) + quantity)
+                for variant_id, quantity in items.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['cart', 'variant'],
+            update_fields=['quantity'],
+        )
 
 
 def remove_ordered_items_from_cart(order, request=None):
     """
     Remove items from the cart that have been ordered.
-    If is_guest is True, cart is from the session, and request is required to modify the session.
+    The cart is resolved from the request, which is required to reach a guest cart.
+
+    Session carts are updated in place, as the session is saved with the response anyway.
+    Database and Redis carts are cleaned up by a Celery task once the order is committed,
+    so checkout does not wait for the cart bookkeeping.
     """
-    if request is None: # If request is not provided, we can't modify the session cart
+    if request is None: # If request is not provided, we can't find the cart
+        return
+
+    storage, is_guest = get_or_create_cart(request)
+    if isinstance(storage, SessionCartStorage):
+        storage.remove_many(order.line_items.values_list('variant_id', flat=True))
         return
-    
-    cart, is_guest = get_or_create_cart(request)
-    if is_guest and request:
-        # Guest user: Handle session cart
-        for item in order.line_items.all():
-            product_variant_id = str(item.variant.id)
-            if product_variant_id in cart:
-                del cart[product_variant_id]  # Remove ordered item from session cart
-        
-        # Save updated guest cart back to the session
-        request.session['cart'] = cart
-        request.session.modified = True
 
+    from nxtbn.cart.tasks import remove_ordered_items_task
+    if is_guest:
+        kwargs = {'guest_token': storage.guest_token}
     else:
-        # Authenticated user: Handle cart stored in the database
-        for item in order.line_items.all():  # Assuming 'order.items' gives you the ordered items
-            try:
-                cart_item = CartItem.objects.get(cart=cart, variant=item.variant)
-                cart_item.delete()  # Remove the cart item corresponding to the ordered product
-            except CartItem.DoesNotExist:
-                continue  # Ignore if the item is not in the cart (already removed or wasn't added)
\ No newline at end of file
+        kwargs = {'user_id': request.user.pk}
+    transaction.on_commit(lambda: remove_ordered_items_task.delay(order.pk, **kwargs))
+
+
+def remove_ordered_items(order_id, user=None, guest_token=None):
+    """
+    Removes the variants of an order from the customer's or the guest's cart, in one statement.
+    """
+    from nxtbn.order.models import OrderLineItem
+
+    if user is not None:
+        storage = get_user_cart_storage(user)
+    else:
+        storage = RedisCartStorage.for_guest_token(guest_token)
+
+    storage.remove_many(OrderLineItem.objects.filter(order_id=order_id).values_list('variant_id', flat=True))
+    if user is not None:
+        persist_cart(user, storage)
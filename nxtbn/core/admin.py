@@ -5,7 +5,7 @@ from django.urls import path
 from django.contrib import messages
 
 from nxtbn.core.models import CurrencyExchange, SiteSettings
-from nxtbn.core.currency.backend import currency_Backend
+from nxtbn.core.currency.backend import get_currency_backend
 
 admin.site.register(SiteSettings)
 
@@ -26,7 +26,7 @@ class CurrencyExchangeAdmin(admin.ModelAdmin):
 
     def refresh_rates(self, request):
         if settings.DEBUG:  # Only allow refresh in DEBUG mode
-            backend = currency_Backend()
+            backend = get_currency_backend()
             backend.refresh_rate()
             messages.success(request, "Currency rates refreshed successfully.")
         else:
@@ -2,11 +2,18 @@ from abc import ABC, abstractmethod
 from decimal import Decimal
 from typing import Dict, List
 from django.conf import settings
+from nxtbn.core.local_cache import LocalVersionedCache
 from nxtbn.core.models import CurrencyExchange
+from nxtbn.core.signal_initiators import exchange_rates_updated
 from django.core.cache import caches
 from babel.numbers import format_currency
 
 
+# Process-local (L1) exchange rate table in front of the shared `generic` cache (L2) and the database.
+# `refresh_rate` and CurrencyExchange saves bump its generation, which every worker picks up within seconds.
+exchange_rates = LocalVersionedCache('exchange_rates', timeout=60, cache_backend='generic')
+
+
 class CurrencyBackend(ABC):
     def __init__(self):
         self.base_currency = settings.BASE_CURRENCY
@@ -25,27 +32,81 @@ class CurrencyBackend(ABC):
         pass
 
     def refresh_rate(self):
-        cache = caches[self.cache_backend]
+        """
+        Fetches the latest rates and stores them with one bulk upsert and one `cache.set_many`,
+        instead of a query and a cache call per target currency.
+
+        Returns:
+            int: The number of rates refreshed.
+        """
+        rates = {
+            data['target_currency']: Decimal(str(data['exchange_rate'])).quantize(Decimal('0.0001'))
+            for data in (self.fetch_data() or [])
+        }
+        if not rates:
+            return 0
+
+        CurrencyExchange.objects.bulk_create(
+            [
+                CurrencyExchange(
+                    base_currency=self.base_currency,
+                    target_currency=target_currency,
+                    exchange_rate=exchange_rate,
+                )
+                for target_currency, exchange_rate in rates.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['base_currency', 'target_currency'],
+            update_fields=['exchange_rate', 'last_modified'],
+        )
+        self.cache_rates(rates)
+        exchange_rates_updated.send(sender=self.__class__, currencies=list(rates))
+        return len(rates)
+
+    def warm_cache(self):
+        """
+        Loads every stored rate of the base currency into the shared cache with a single `cache.set_many`.
+        """
+        rates = dict(
+            CurrencyExchange.objects.filter(base_currency=self.base_currency).values_list('target_currency', 'exchange_rate')
+        )
+        if rates:
+            self.cache_rates(rates)
+        return len(rates)
 
-        for fetch_data in self.fetch_data():
-            CurrencyExchange.objects.update_or_create(
-                base_currency=self.base_currency,
-                target_currency=fetch_data['target_currency'],
-                defaults={'exchange_rate': fetch_data['exchange_rate']}
-            )
-            key = f"{self.cache_key_prefix}_{fetch_data['target_currency']}"
-            cache.set(key, fetch_data['exchange_rate'], timeout=self.timeout)
+    def cache_rates(self, rates):
+        caches[self.cache_backend].set_many(
+            {f"{self.cache_key_prefix}_{target_currency}": rate for target_currency, rate in rates.items()},
+            timeout=self.timeout,
+        )
+        exchange_rates.invalidate()
 
 
     def get_exchange_rate(self, target_currency: str) -> float:
         if target_currency == self.base_currency:
             return 1.0
-        
-        
+
+        return exchange_rates.get(
+            (self.base_currency, target_currency),
+            lambda: self.load_exchange_rate(target_currency),
+        )
+
+    def clear_cached_rate(self, target_currency: str):
+        """
+        Drops a rate from the shared cache and the process-local tables, e.g. after it was edited by hand.
+        """
+        caches[self.cache_backend].delete(f"{self.cache_key_prefix}_{target_currency}")
+        exchange_rates.invalidate()
+
+    def load_exchange_rate(self, target_currency: str) -> float:
+        """
+        Reads the rate from the shared cache, falling back to the database.
+        Called by `get_exchange_rate` only when the process-local table misses.
+        """
         cache = caches[self.cache_backend]
         key = f"{self.cache_key_prefix}_{target_currency}"
         rate = cache.get(key)
-        if rate:
+        if rate is not None:
             return rate
        
         
@@ -6,3 +6,17 @@ except (ImportError, ModuleNotFoundError):
 
 if not currency_Backend:
     raise ImportError("Currency backend could not be initialized. Please check your plugin.")
+
+
+_backend = None
+
+
+def get_currency_backend():
+    """
+    Returns the shared instance of the configured currency backend.
+    The backend is stateless apart from its settings, so one instance serves every request.
+    """
+    global _backend
+    if _backend is None:
+        _backend = currency_Backend()
+    return _backend
@@ -0,0 +1,103 @@
+import threading
+import time
+import uuid
+
+from django.core.cache import caches
+from django.db import transaction
+
+
+class LocalVersionedCache:
+    """
+    Process-local cache for small, rarely changing lookup tables.
+
+    Values live in the worker's memory, so a hit costs no network or database round trip.
+    Every instance is tied to a generation token stored in a shared cache backend. Calling
+    `invalidate()` replaces that token, and every other worker notices the change the next
+    time it checks the token (at most once per `check_interval` seconds) and drops its
+    local entries. `timeout` bounds staleness when no shared cache is configured
+    (e.g. DummyCache in development).
+
+    Example:
+        rate_tables = LocalVersionedCache('shipping_rate_tables', timeout=300)
+        table = rate_tables.get(method_id, lambda: build_table(method_id))
+        rate_tables.invalidate()  # from a post_save/post_delete receiver
+    """
+
+    def __init__(self, namespace: str, timeout: int = 300, check_interval: int = 5, cache_backend: str = 'default'):
+        self.namespace = namespace
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self.cache_backend = cache_backend
+        self.generation_key = f"{namespace}_generation"
+
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._generation = None
+        self._checked_at = None
+
+    def get(self, key, loader):
+        """
+        Returns the value stored under `key`, calling `loader()` to build it on a miss
+        or when the entry is older than `timeout` seconds.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._sync_generation(now)
+
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] < self.timeout:
+                return entry[0]
+
+            value = loader()
+            self._entries[key] = (value, now)
+            return value
+
+    def get_generation(self):
+        """Returns the generation token the local entries were built against."""
+        with self._lock:
+            self._sync_generation(time.monotonic())
+            return self._generation
+
+    def invalidate(self):
+        """
+        Drops the local entries and publishes a new generation for the other workers.
+        Inside a transaction the invalidation is repeated after commit, so no worker
+        caches rows that were read before the change became visible.
+        """
+        self._invalidate()
+        transaction.on_commit(self._invalidate)
+
+    def clear(self):
+        """Drops the local entries of this process only."""
+        with self._lock:
+            self._entries.clear()
+
+    def _invalidate(self):
+        generation = uuid.uuid4().hex
+        try:
+            caches[self.cache_backend].set(self.generation_key, generation, timeout=None)
+        except Exception:
+            pass  # Shared cache unavailable; other workers fall back to `timeout`.
+
+        with self._lock:
+            self._entries.clear()
+            self._generation = generation
+            self._checked_at = time.monotonic()
+
+    def _sync_generation(self, now):
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+
+        try:
+            generation = caches[self.cache_backend].get(self.generation_key)
+        except Exception:
+            return  # Shared cache unavailable; rely on `timeout`.
+
+        if generation is None:
+            # Nothing published yet (or DummyCache); keep our own token.
+            return
+
+        if generation != self._generation:
+            self._entries.clear()
+            self._generation = generation
@@ -0,0 +1,56 @@
+import timeit
+from decimal import Decimal, ROUND_HALF_UP
+
+from babel.numbers import format_currency, get_currency_precision
+from django.core.management.base import BaseCommand
+from money.money import Currency, Money
+
+from nxtbn.core.utils import format_currency_amounts, get_currency_formatter
+
+
+def format_uncompiled(amount, currency_code, locale):
+    """
+    The per-call path the currency helpers used before the formatter registry:
+    validate the currency, look up its precision, quantize, build Money and run babel.
+    """
+    currency = Currency(currency_code)
+    decimal_places = get_currency_precision(currency_code)
+    amount = Decimal(amount).quantize(Decimal(f'1.{"0" * decimal_places}'), rounding=ROUND_HALF_UP)
+    money = Money(amount, currency)
+    return format_currency(money.amount, currency_code, locale=locale)
+
+
+class Command(BaseCommand):
+    help = 'Compares uncompiled currency formatting with the precompiled formatter registry'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--currency', default='USD', help='Currency code to format amounts in')
+        parser.add_argument('--locale', default='en_US', help='Locale to format amounts with')
+        parser.add_argument('--amounts', type=int, default=30, help='Amounts formatted per round, e.g. the variants of a product page')
+        parser.add_argument('--rounds', type=int, default=1000, help='Number of rounds to time')
+
+    def handle(self, *args, **options):
+        currency = options['currency']
+        locale = options['locale']
+        rounds = options['rounds']
+        amounts = [Decimal(index * 137 + 99) / 100 for index in range(options['amounts'])]
+
+        formatter = get_currency_formatter(currency, locale)
+        expected = [format_uncompiled(amount, currency, locale) for amount in amounts]
+        if format_currency_amounts(amounts, currency, locale) != expected:
+            self.stderr.write(self.style.ERROR('The formatter registry output differs from babel.'))
+            return
+
+        timings = [
+            ('uncompiled (babel per call)', lambda: [format_uncompiled(amount, currency, locale) for amount in amounts]),
+            ('formatter.format per amount', lambda: [formatter.format(formatter.quantize(amount)) for amount in amounts]),
+            ('format_currency_amounts batch', lambda: format_currency_amounts(amounts, currency, locale)),
+        ]
+
+        self.stdout.write(f"Formatting {len(amounts)} {currency} amounts ({locale}), {rounds} rounds")
+        baseline = None
+        for label, func in timings:
+            seconds = timeit.timeit(func, number=rounds)
+            per_amount = seconds / (rounds * len(amounts)) * 1e6
+            baseline = baseline or seconds
+            self.stdout.write(f"  {label:<32} {per_amount:8.2f} µs/amount  {baseline / seconds:5.1f}x")
@@ -1,20 +1,149 @@
+import base64
+import hashlib
+import json
+import logging
+
 from django.conf import settings
+from django.core.cache import caches
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db import DatabaseError, connections
 from django.db.models.aggregates import Count
 from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from collections import OrderedDict
 
 
+logger = logging.getLogger(__name__)
+
+
+class ExactCount:
+    """
+    Counts the rows with a plain `COUNT(*)`.
+    """
+
+    def count(self, queryset, request, view):
+        return queryset.count(), False
+
+
+class CachedCount(ExactCount):
+    """
+    Caches the exact count for `timeout` seconds, keyed by the endpoint, its normalized
+    filter params (pagination params are ignored, param order does not matter) and a scope.
+
+    The scope is the requesting user by default, so querysets filtered by `request.user`
+    never share a count. A view whose queryset does not depend on the user can share one
+    count between users by returning a constant from `get_count_cache_scope(request)`.
+    """
+
+    ignored_params = ('page', 'page_size', 'pagination', 'cursor', 'with_count')
+
+    def __init__(self, timeout=60, cache_backend='default'):
+        self.timeout = timeout
+        self.cache_backend = cache_backend
+
+    def get_cache_scope(self, request, view):
+        if hasattr(view, 'get_count_cache_scope'):
+            return view.get_count_cache_scope(request)
+        user = getattr(request, 'user', None)
+        return user.pk if user is not None and user.is_authenticated else None
+
+    def get_cache_key(self, queryset, request, view=None):
+        params = sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+            if key not in self.ignored_params
+        )
+        scope = self.get_cache_scope(request, view)
+        digest = hashlib.md5(json.dumps([request.path, params, scope], default=str).encode('utf-8')).hexdigest()
+        return f'paginator_count:{queryset.model._meta.label_lower}:{digest}'
+
+    def count(self, queryset, request, view):
+        cache = caches[self.cache_backend]
+        key = self.get_cache_key(queryset, request, view)
+        total = cache.get(key)
+        if total is None:
+            total = queryset.count()
+            cache.set(key, total, self.timeout)
+        return total, False
+
+
+class EstimatedCount(ExactCount):
+    """
+    Uses the PostgreSQL planner's row estimate instead of counting.
+
+    Unfiltered querysets read `pg_class.reltuples`, filtered ones the top row estimate of
+    `EXPLAIN`. Estimates below `threshold` are cheap to verify and are replaced by an exact
+    count, as is everything on databases other than PostgreSQL.
+    """
+
+    def __init__(self, threshold=10000):
+        self.threshold = threshold
+
+    def count(self, queryset, request, view):
+        estimate = None
+        if connections[queryset.db].vendor == 'postgresql':
+            try:
+                estimate = self.estimate(queryset)
+            except DatabaseError:
+                logger.exception("Could not estimate the row count of %s", queryset.model._meta.label)
+
+        if estimate is None or estimate < self.threshold:
+            return super().count(queryset, request, view)
+        return estimate, True
+
+    def estimate(self, queryset):
+        if not queryset.query.where and not queryset.query.distinct:
+            with connections[queryset.db].cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            # reltuples is -1 for tables that were never analyzed
+            if row and row[0] >= 0:
+                return row[0]
+            return None
+
+        plan = json.loads(queryset.order_by().explain(format='json'))
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+COUNT_STRATEGIES = {
+    'exact': ExactCount,
+    'cached': CachedCount,
+    'estimated': EstimatedCount,
+}
+
+
 class NxtbnPagination(PageNumberPagination):
     """
     Custom pagination class for Django REST Framework that allows for configurable
     page sizes. The page size can be set at the view level, and it defaults to `default_page_size`.
+
+    Besides page numbers, it supports a cursor (keyset) mode over (`created_at`, `id`) that
+    never counts or OFFSET-scans the table, so deep pages cost the same as the first one.
+    A view makes cursor mode its default with `pagination_mode = 'cursor'`; clients can pick
+    the mode per request with `?pagination=cursor` or `?pagination=page`. In cursor mode the
+    total count is only computed when asked for with `?with_count=true`.
     """
 
     default_page_size = 20  # Default number of items per page
 
+    pagination_mode = 'page'  # 'page' or 'cursor', may be overridden by the view
+    pagination_mode_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+    count_query_param = 'with_count'
+    cursor_fields = ('created_at', 'id')
+    invalid_cursor_message = 'Invalid cursor.'
+
+    # 'exact', 'cached' or 'estimated' (see COUNT_STRATEGIES), or a strategy instance; may be overridden by the view
+    count_strategy = 'exact'
+
     def __init__(self, page_size=None):
         """
         Initialize the pagination class with an optional page size.
@@ -25,6 +154,32 @@ class NxtbnPagination(PageNumberPagination):
         self.page_size = page_size or self.default_page_size
         super().__init__()
 
+    def get_count_strategy(self, view):
+        strategy = getattr(view, 'count_strategy', self.count_strategy)
+        if isinstance(strategy, str):
+            strategy = COUNT_STRATEGIES[strategy]()
+        return strategy
+
+    def django_paginator_class(self, queryset, page_size):
+        """
+        Builds the Django paginator with its count delegated to the view's count strategy.
+        """
+        paginator = DjangoPaginator(queryset, page_size)
+        count, self.count_estimated = self.count_strategy_instance.count(queryset, self.request, self.view)
+        # `Paginator.count` is a cached_property, so seeding it skips the COUNT(*) query.
+        paginator.__dict__['count'] = count
+        return paginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.view = view
+        self.count_estimated = False
+        self.count_strategy_instance = self.get_count_strategy(view)
+        self.cursor_mode = self.is_cursor_mode(queryset, request, view)
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        return self.paginate_queryset_by_cursor(queryset, request)
+
     def get_paginated_response(self, data):
         """
         Returns a paginated response with the given data.
@@ -32,8 +187,12 @@ class NxtbnPagination(PageNumberPagination):
         :param data: The paginated data to be returned in the response.
         :return: A `Response` object containing pagination details and the results.
         """
+        if self.cursor_mode:
+            return self.get_cursor_paginated_response(data)
+
         return Response(OrderedDict([
             ('count', self.page.paginator.count),
+            ('count_estimated', self.count_estimated),
             ('current_pagination_step', self.get_html_context()),
             ('current_page', self.page.number),
             ('next_page_url', self.get_next_link()),
@@ -65,3 +224,132 @@ class NxtbnPagination(PageNumberPagination):
             return None
         next_number = self.page.next_page_number()
         return next_number if next_number >= 1 else None
+
+
+    # ==========================
+    # Cursor (keyset) pagination
+    # ==========================
+
+    def is_cursor_mode(self, queryset, request, view):
+        """
+        Decides whether the request is served in cursor mode.
+        An explicit `?pagination=` wins, then `?cursor=` / `?page=`, then the view's `pagination_mode`.
+        Cursor mode needs the model to have the cursor fields and the list to be ordered by `created_at`.
+        """
+        model_fields = {field.name for field in queryset.model._meta.get_fields()}
+        if not all(field in model_fields for field in self.cursor_fields):
+            return False
+
+        if request.query_params.get('ordering', 'created_at').lstrip('-') != 'created_at':
+            return False
+
+        mode = request.query_params.get(self.pagination_mode_query_param)
+        if mode in ('page', 'cursor'):
+            return mode == 'cursor'
+        if self.cursor_query_param in request.query_params:
+            return True
+        if self.page_query_param in request.query_params:
+            return False
+        return getattr(view, 'pagination_mode', self.pagination_mode) == 'cursor'
+
+    def paginate_queryset_by_cursor(self, queryset, request):
+        self.descending = request.query_params.get('ordering', '-created_at').startswith('-')
+        self.cursor = self.decode_cursor(request)
+
+        self.count = None
+        if request.query_params.get(self.count_query_param, '').lower() in ['true', '1', 'yes']:
+            self.count, self.count_estimated = self.count_strategy_instance.count(queryset, request, self.view)
+
+        # Walking backwards means querying in the opposite direction and flipping the page afterwards
+        reverse = self.cursor['reverse'] if self.cursor else False
+        descending = self.descending != reverse
+
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(*[prefix + field for field in self.cursor_fields])
+
+        if self.cursor:
+            created_at, pk = self.cursor['created_at'], self.cursor['id']
+            lookup = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'created_at__{lookup}': created_at}) |
+                Q(created_at=created_at, **{f'id__{lookup}': pk})
+            )
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        self.page_results = results
+        return results
+
+    def get_cursor_paginated_response(self, data):
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+            response['count_estimated'] = self.count_estimated
+        response['next_page_url'] = self.get_next_cursor_link()
+        response['previous_page_url'] = self.get_previous_cursor_link()
+        response['next_cursor'] = self.get_next_cursor()
+        response['previous_cursor'] = self.get_previous_cursor()
+        response['results'] = data
+        return Response(response)
+
+    def get_next_cursor(self):
+        if not self.has_next or not self.page_results:
+            return None
+        return self.encode_cursor(self.page_results[-1], reverse=False)
+
+    def get_previous_cursor(self):
+        if not self.has_previous or not self.page_results:
+            return None
+        return self.encode_cursor(self.page_results[0], reverse=True)
+
+    def get_next_cursor_link(self):
+        return self.build_cursor_link(self.get_next_cursor())
+
+    def get_previous_cursor_link(self):
+        return self.build_cursor_link(self.get_previous_cursor())
+
+    def build_cursor_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        url = replace_query_param(url, self.pagination_mode_query_param, 'cursor')
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def encode_cursor(self, instance, reverse):
+        payload = {
+            'created_at': instance.created_at.isoformat(),
+            'id': instance.id,
+            'reverse': reverse,
+        }
+        return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            created_at = parse_datetime(payload['created_at'])
+            cursor = {
+                'created_at': created_at,
+                'id': int(payload['id']),
+                'reverse': bool(payload.get('reverse', False)),
+            }
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if cursor['created_at'] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
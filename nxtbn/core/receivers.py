@@ -1,6 +1,9 @@
-from django.db.models.signals import post_migrate
+from django.conf import settings
+from django.db.models.signals import post_delete, post_migrate, post_save
 from django.dispatch import receiver
-from nxtbn.core.models import SiteSettings
+from django_celery_beat.models import IntervalSchedule, PeriodicTask
+from nxtbn.core.currency.backend import get_currency_backend
+from nxtbn.core.models import CurrencyExchange, SiteSettings
 from django.contrib.sites.models import Site
 
 
@@ -19,4 +22,35 @@ def create_default_site_settings(sender, **kwargs):
             contact_phone="123456789",
             address="Default Address",
         )
-        print("SiteSettings instance created.")
\ No newline at end of file
+        print("SiteSettings instance created.")
+
+
+@receiver(post_save, sender=CurrencyExchange)
+@receiver(post_delete, sender=CurrencyExchange)
+def invalidate_exchange_rates(sender, instance, **kwargs):
+    backend = get_currency_backend()
+    if instance.base_currency == backend.base_currency:
+        backend.clear_cached_rate(instance.target_currency)
+
+
+@receiver(post_migrate)
+def register_exchange_rate_refresh(sender, **kwargs):
+    if sender.name != 'nxtbn.core':
+        return
+
+    schedule, created = IntervalSchedule.objects.get_or_create(
+        every=settings.EXCHANGE_RATE_REFRESH_INTERVAL,
+        period=IntervalSchedule.SECONDS,
+    )
+    # Created once; later runs only follow interval changes, so enabling/disabling it in the admin sticks.
+    task, created = PeriodicTask.objects.get_or_create(
+        name='Refresh exchange rates',
+        defaults={
+            'task': 'nxtbn.core.tasks.refresh_exchange_rates',
+            'interval': schedule,
+            'enabled': settings.IS_MULTI_CURRENCY,
+        },
+    )
+    if not created and task.interval_id != schedule.id:
+        task.interval = schedule
+        task.save(update_fields=['interval'])
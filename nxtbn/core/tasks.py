@@ -0,0 +1,76 @@
+import logging
+import random
+import uuid
+
+from celery import shared_task
+from celery.signals import worker_ready
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from nxtbn.core.currency.backend import get_currency_backend
+
+
+logger = logging.getLogger(__name__)
+
+EXCHANGE_RATE_REFRESH_LOCK = 'exchange_rate_refresh_lock'
+
+# Cache backends that are not shared between workers, so a lock taken in them excludes no one.
+PROCESS_LOCAL_CACHES = (DummyCache, LocMemCache)
+
+
+@shared_task(bind=True, ignore_result=True)
+def refresh_exchange_rates(self, jitter=None):
+    """
+    Refreshes the exchange rates from the currency backend.
+
+    Scheduled by django_celery_beat. The scheduled run only re-enqueues itself after a random
+    delay of up to `EXCHANGE_RATE_REFRESH_JITTER` seconds, so deployments sharing a provider do
+    not all call it at the same second. A lock in the shared `default` cache makes sure only one
+    worker refreshes at a time; without a shared cache (REDIS_URL unset) the refresh runs unlocked
+    and a warning is logged, as concurrent refreshes only repeat the same upsert.
+    """
+    if jitter is None:
+        jitter = settings.EXCHANGE_RATE_REFRESH_JITTER
+    if jitter > 0:
+        self.apply_async(kwargs={'jitter': 0}, countdown=random.uniform(0, jitter))
+        return
+
+    cache = caches['default']
+    if isinstance(cache, PROCESS_LOCAL_CACHES):
+        logger.warning(
+            "Exchange rate refresh is not locked: the default cache (%s) is not shared between workers. "
+            "Set REDIS_URL so that only one worker refreshes at a time.",
+            type(cache).__name__,
+        )
+        refreshed = get_currency_backend().refresh_rate()
+        logger.info("Refreshed %s exchange rates.", refreshed)
+        return
+
+    token = uuid.uuid4().hex
+    if not cache.add(EXCHANGE_RATE_REFRESH_LOCK, token, timeout=600):
+        logger.info("Exchange rate refresh skipped, another worker holds the lock.")
+        return
+
+    try:
+        refreshed = get_currency_backend().refresh_rate()
+        logger.info("Refreshed %s exchange rates.", refreshed)
+    finally:
+        if cache.get(EXCHANGE_RATE_REFRESH_LOCK) == token:
+            cache.delete(EXCHANGE_RATE_REFRESH_LOCK)
+
+
+@shared_task(ignore_result=True)
+def warm_exchange_rates():
+    """
+    Loads the stored exchange rates into the shared cache, and fetches them if none are stored yet.
+    """
+    if not get_currency_backend().warm_cache():
+        refresh_exchange_rates.delay(jitter=0)
+
+
+@worker_ready.connect
+def warm_exchange_rates_on_worker_start(sender, **kwargs):
+    if settings.IS_MULTI_CURRENCY:
+        warm_exchange_rates.delay()
@@ -1,3 +1,193 @@
-from django.test import TestCase
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from babel.numbers import format_currency
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from nxtbn.core.currency.abstract_base_currency import exchange_rates
+from nxtbn.core.currency.backend import get_currency_backend
+from nxtbn.core.models import CurrencyExchange
+from nxtbn.core.paginator import CachedCount, EstimatedCount, NxtbnPagination
+from nxtbn.core.tasks import refresh_exchange_rates
+from nxtbn.users.models import User
+from nxtbn.users.tests import UserFactory
+
+from nxtbn.core.utils import (
+    SubunitMoney,
+    build_currency_amount,
+    format_currency_amounts,
+    get_currency_formatter,
+    to_currency_subunit,
+    to_currency_unit,
+)
+
+
+class CurrencyFormatterTest(SimpleTestCase):
+
+    def test_matches_babel(self):
+        amounts = [Decimal('0'), Decimal('1.005'), Decimal('-42.5'), Decimal('1234567.891')]
+        for currency, locale in [('USD', 'en_US'), ('KWD', 'ar_KW'), ('JPY', 'ja_JP'), ('EUR', 'de_DE')]:
+            formatter = get_currency_formatter(currency, locale)
+            expected = [format_currency(formatter.quantize(amount), currency, locale=locale) for amount in amounts]
+            self.assertEqual(format_currency_amounts(amounts, currency, locale), expected)
+
+    def test_registry_reuses_formatters(self):
+        self.assertIs(get_currency_formatter('USD', 'en_US'), get_currency_formatter('USD', 'en_US'))
+        self.assertIsNot(get_currency_formatter('USD', 'en_US'), get_currency_formatter('USD', 'de_DE'))
+
+    def test_currency_precision(self):
+        self.assertEqual(build_currency_amount(204.170, 'KWD'), '204.170')
+        self.assertEqual(build_currency_amount(204.4, 'JPY'), '204')
+        self.assertEqual(to_currency_subunit(Decimal('204.17'), 'KWD'), 204170)
+        self.assertEqual(to_currency_unit(20456, 'JPY'), '20456')
+
+    def test_invalid_currency(self):
+        with self.assertRaises(ValueError):
+            build_currency_amount(1, 'XXXX')
+
+
+class SubunitMoneyTest(SimpleTestCase):
+
+    def test_rounds_to_currency_precision(self):
+        self.assertEqual(SubunitMoney.from_decimal(Decimal('1.2345'), 'KWD').subunits, 1235)
+        self.assertEqual(SubunitMoney.from_decimal(Decimal('1.5'), 'JPY').subunits, 2)
+        self.assertEqual(SubunitMoney(1999, 'USD').to_decimal(), Decimal('19.99'))
+
+    def test_arithmetic(self):
+        price = SubunitMoney(1999, 'USD')
+        self.assertEqual(price * 3 - SubunitMoney(500, 'USD'), SubunitMoney(5497, 'USD'))
+        self.assertEqual(sum([price, price]), SubunitMoney(3998, 'USD'))
+        self.assertEqual(price.multiply(Decimal('0.0725')), SubunitMoney(145, 'USD'))
+        with self.assertRaises(ValueError):
+            price + SubunitMoney(1, 'EUR')
+
+    def test_allocate_adds_up(self):
+        parts = SubunitMoney(100, 'USD').allocate([1, 1, 1])
+        self.assertEqual([part.subunits for part in parts], [34, 33, 33])
+        self.assertEqual(sum(parts), SubunitMoney(100, 'USD'))
+
+
+class RefreshExchangeRatesTest(SimpleTestCase):
+
+    @mock.patch('nxtbn.core.tasks.get_currency_backend')
+    def test_warns_without_a_shared_cache(self, get_currency_backend):
+        get_currency_backend.return_value.refresh_rate.return_value = 2
+
+        # The test settings use a DummyCache, in which the lock would always be granted
+        with self.assertLogs('nxtbn.core.tasks', level='WARNING') as logs:
+            refresh_exchange_rates.apply(kwargs={'jitter': 0})
+
+        self.assertIn("not locked", logs.output[0])
+        get_currency_backend.return_value.refresh_rate.assert_called_once_with()
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'generic': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'generic'},
+})
+class ExchangeRateCacheTest(TestCase):
+
+    def setUp(self):
+        exchange_rates.clear()
+        self.backend = get_currency_backend()
+        self.rate = CurrencyExchange.objects.create(
+            base_currency=self.backend.base_currency, target_currency='EUR', exchange_rate=Decimal('0.9000'),
+        )
+
+    def test_rates_are_served_from_the_process_local_table(self):
+        self.assertEqual(self.backend.get_exchange_rate('EUR'), Decimal('0.9000'))
+
+        with self.assertNumQueries(0), mock.patch.object(self.backend, 'load_exchange_rate') as load_exchange_rate:
+            self.assertEqual(self.backend.get_exchange_rate('EUR'), Decimal('0.9000'))
+        load_exchange_rate.assert_not_called()
+
+    def test_refresh_rate_invalidates_the_table(self):
+        self.assertEqual(self.backend.get_exchange_rate('EUR'), Decimal('0.9000'))
+
+        fetched = [{'target_currency': 'EUR', 'exchange_rate': 0.95}]
+        with mock.patch.object(self.backend, 'fetch_data', return_value=fetched):
+            self.assertEqual(self.backend.refresh_rate(), 1)
+
+        self.assertEqual(self.backend.get_exchange_rate('EUR'), Decimal('0.9500'))
+
+    def test_saving_a_rate_invalidates_the_table(self):
+        self.assertEqual(self.backend.get_exchange_rate('EUR'), Decimal('0.9000'))
+
+        self.rate.exchange_rate = Decimal('0.8000')
+        self.rate.save()
+        self.assertEqual(self.backend.get_exchange_rate('EUR'), Decimal('0.8000'))
+
+        self.rate.delete()
+        with self.assertRaises(ValueError):
+            self.backend.get_exchange_rate('EUR')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CountStrategyTest(TestCase):
+
+    def setUp(self):
+        self.user = UserFactory(email='first@example.com', username='first')
+        self.other_user = UserFactory(email='second@example.com', username='second')
+
+    def request(self, params, user=None):
+        request = Request(APIRequestFactory().get('/users/', params))
+        request.user = user or self.user
+        return request
+
+    def test_cached_count_hits_the_cache(self):
+        strategy = CachedCount()
+        queryset = User.objects.all()
+        self.assertEqual(strategy.count(queryset, self.request({'role': 'x'}), None), (2, False))
+
+        UserFactory(email='third@example.com', username='third')
+        with self.assertNumQueries(0):
+            self.assertEqual(strategy.count(queryset, self.request({'role': 'x', 'page': '3'}), None), (2, False))
+        self.assertEqual(strategy.count(queryset, self.request({'role': 'y'}), None), (3, False))
+
+    def test_cache_key_ignores_pagination_params_and_param_order(self):
+        strategy = CachedCount()
+        queryset = User.objects.all()
+        key = strategy.get_cache_key(queryset, self.request({'role': 'x', 'status': 'a'}))
+        self.assertEqual(key, strategy.get_cache_key(queryset, self.request({'status': 'a', 'role': 'x', 'page': '2', 'page_size': '5', 'cursor': 'c', 'with_count': 'true'})))
+        self.assertNotEqual(key, strategy.get_cache_key(queryset, self.request({'role': 'x'})))
+
+    def test_cache_key_is_scoped_to_the_user_unless_the_view_shares_it(self):
+        strategy = CachedCount()
+        queryset = User.objects.all()
+        key = strategy.get_cache_key(queryset, self.request({}))
+        self.assertNotEqual(key, strategy.get_cache_key(queryset, self.request({}, user=self.other_user)))
+
+        view = SimpleNamespace(get_count_cache_scope=lambda request: 'everyone')
+        self.assertEqual(
+            strategy.get_cache_key(queryset, self.request({}), view),
+            strategy.get_cache_key(queryset, self.request({}, user=self.other_user), view),
+        )
+
+    def test_estimated_count_falls_back_to_exact_count(self):
+        strategy = EstimatedCount(threshold=100)
+        queryset = User.objects.all()
+
+        # Not PostgreSQL
+        self.assertEqual(strategy.count(queryset, self.request({}), None), (2, False))
+
+        postgresql = {queryset.db: SimpleNamespace(vendor='postgresql')}
+        with mock.patch('nxtbn.core.paginator.connections', postgresql):
+            with mock.patch.object(EstimatedCount, 'estimate', return_value=50):
+                self.assertEqual(strategy.count(queryset, self.request({}), None), (2, False))
+            with mock.patch.object(EstimatedCount, 'estimate', return_value=5000):
+                self.assertEqual(strategy.count(queryset, self.request({}), None), (5000, True))
+
+    def test_response_reports_estimated_counts(self):
+        view = SimpleNamespace(count_strategy=EstimatedCount(threshold=100))
+        postgresql = {'default': SimpleNamespace(vendor='postgresql')}
+
+        for estimate, expected in [(50, (2, False)), (5000, (5000, True))]:
+            pagination = NxtbnPagination()
+            with mock.patch('nxtbn.core.paginator.connections', postgresql):
+                with mock.patch.object(EstimatedCount, 'estimate', return_value=estimate):
+                    page = pagination.paginate_queryset(User.objects.order_by('pk'), self.request({}), view)
+            data = pagination.get_paginated_response([user.pk for user in page]).data
+            self.assertEqual((data['count'], data['count_estimated']), expected)
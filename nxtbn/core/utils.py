@@ -1,14 +1,273 @@
+import copy
 import os
+import threading
 from django.conf import settings
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 from money.money import Currency, Money
-from babel.numbers import get_currency_precision, format_currency
+from money.currency import CurrencyHelper
+from babel import Locale
+from babel.numbers import get_currency_precision
 from money.exceptions import InvalidAmountError
-from nxtbn.core.currency.backend import currency_Backend
+from nxtbn.core.currency.backend import get_currency_backend
 
 def make_path(module_path):
     return os.path.join(*module_path.split('.')) + '/'
-    
+
+
+class CurrencyFormatter:
+    """
+    Precompiled formatting rules of a single (currency, locale) pair.
+
+    The currency is validated, its precision looked up and its babel pattern compiled once,
+    so formatting an amount is a quantize plus a pattern apply. Use `get_currency_formatter`
+    instead of instantiating it, the registry keeps one formatter per pair.
+
+    Example usage:
+        formatter = get_currency_formatter('USD', 'en_US')
+        formatter.format(Decimal('204.17'))  # "$204.17"
+        formatter.format_many([Decimal('1'), Decimal('2.5')])  # ["$1.00", "$2.50"]
+    """
+
+    def __init__(self, currency_code: str, locale: str = ''):
+        try:
+            self.currency = Currency(currency_code)
+        except ValueError:
+            # Still usable for plain formatting; amount conversions reject it (see `check_currency`).
+            self.currency = None
+
+        try:
+            self.decimal_places = get_currency_precision(currency_code)
+        except KeyError:
+            raise ValueError(f"Currency precision not found for: {currency_code}")
+
+        self.currency_code = currency_code
+        self.locale = Locale.parse(locale) if locale else None
+        self.exponent = Decimal(f'1.{"0" * self.decimal_places}')
+        self.subunit_factor = 10 ** self.decimal_places
+
+        # Amounts quantized to the babel precision always pass py-money's validation unless
+        # py-money knows the currency with fewer digits; only then is a Money object built.
+        self.needs_money_check = False
+        if self.currency is not None:
+            money_places = CurrencyHelper.decimal_precision_for_currency(self.currency)
+            self.needs_money_check = (
+                self.decimal_places > money_places
+                or CurrencyHelper.sub_unit_for_currency(self.currency) != 10 ** money_places
+            )
+
+        self.pattern = None
+        if self.locale:
+            # Same pattern babel's format_currency would pick, with the currency digits fixed up front.
+            self.pattern = copy.copy(self.locale.currency_formats['standard'])
+            self.pattern.frac_prec = (self.decimal_places, self.decimal_places)
+
+    def check_currency(self):
+        if self.currency is None:
+            raise ValueError(f"Invalid currency code: {self.currency_code}")
+
+    def quantize(self, amount) -> Decimal:
+        self.check_currency()
+        try:
+            amount = Decimal(amount).quantize(self.exponent, rounding=ROUND_HALF_UP)
+        except (InvalidOperation, ValueError, TypeError):
+            raise ValueError(f"Invalid amount: {amount} for currency '{self.currency_code}'")
+
+        if self.needs_money_check:
+            try:
+                Money(amount, self.currency)
+            except InvalidAmountError:
+                raise ValueError(f"Invalid amount '{amount}' for currency '{self.currency_code}'")
+        return amount
+
+    def apply_pattern(self, amount) -> str:
+        return self.pattern.apply(amount, self.locale, currency=self.currency_code, currency_digits=False)
+
+    def format(self, amount) -> str:
+        """
+        Formats an amount with the currency symbol when a locale is set, otherwise as a plain
+        number with the currency's number of decimal places.
+        """
+        if self.pattern is None:
+            return f"{amount:.{self.decimal_places}f}"
+        return self.apply_pattern(amount)
+
+    def format_many(self, amounts) -> list:
+        """Formats a list of Decimals in one call."""
+        if self.pattern is None:
+            return [f"{amount:.{self.decimal_places}f}" for amount in amounts]
+        return [self.apply_pattern(amount) for amount in amounts]
+
+    def to_subunit(self, amount) -> int:
+        self.check_currency()
+        try:
+            subunit_amount = Decimal(amount) * self.subunit_factor
+            subunit_amount = subunit_amount.quantize(Decimal('1'), rounding=ROUND_HALF_UP)
+        except (InvalidOperation, ValueError, TypeError):
+            raise ValueError(f"Invalid amount: {amount} for currency '{self.currency_code}'")
+        return int(subunit_amount)
+
+    def from_subunit(self, subunit: int) -> Decimal:
+        self.check_currency()
+        try:
+            unit_amount = Decimal(subunit) / self.subunit_factor
+            return unit_amount.quantize(self.exponent, rounding=ROUND_HALF_UP)
+        except (InvalidOperation, ValueError, TypeError):
+            raise ValueError(f"Invalid subunit amount: {subunit} for currency '{self.currency_code}'")
+
+
+_currency_formatters = {}
+_currency_formatters_lock = threading.Lock()
+
+
+def get_currency_formatter(currency_code: str, locale: str = '') -> CurrencyFormatter:
+    """
+    Returns the CurrencyFormatter of a (currency, locale) pair, compiling it on first use.
+    """
+    key = (currency_code, locale or '')
+    formatter = _currency_formatters.get(key)
+    if formatter is None:
+        with _currency_formatters_lock:
+            formatter = _currency_formatters.get(key)
+            if formatter is None:
+                formatter = _currency_formatters[key] = CurrencyFormatter(currency_code, locale)
+    return formatter
+
+
+def format_currency_amounts(amounts, currency_code: str, locale: str = '') -> list:
+    """
+    Batch version of `build_currency_amount`: rounds and formats every amount in `amounts`.
+
+    Example usage:
+        format_currency_amounts([Decimal('10'), Decimal('2.345')], 'USD', 'en_US')  # ["$10.00", "$2.35"]
+    """
+    formatter = get_currency_formatter(currency_code, locale)
+    return formatter.format_many([formatter.quantize(amount) for amount in amounts])
+
+
+
+class SubunitMoney:
+    """
+    Immutable amount of money stored as an integer number of subunits (cents for USD, fils for KWD, yen for JPY).
+
+    Sums and differences are plain integer arithmetic, so they are exact and allocate no Decimals.
+    Rounding only happens where a fractional factor is applied (`multiply`, `from_decimal`), always
+    half up to the currency's precision, which is taken from the formatter registry.
+
+    Example usage:
+        price = SubunitMoney.from_decimal(Decimal('19.99'), 'USD')  # 1999 cents
+        total = price * 3 - SubunitMoney(500, 'USD')  # 5497 cents
+        total.to_decimal()  # Decimal('54.97')
+    """
+    __slots__ = ('subunits', 'currency')
+
+    def __init__(self, subunits: int, currency: str):
+        self.subunits = int(subunits)
+        self.currency = currency
+
+    @classmethod
+    def zero(cls, currency: str) -> 'SubunitMoney':
+        return cls(0, currency)
+
+    @classmethod
+    def from_decimal(cls, amount, currency: str) -> 'SubunitMoney':
+        """Converts an amount in units, rounding half up to the currency's precision."""
+        return cls(get_currency_formatter(currency).to_subunit(amount), currency)
+
+    def to_decimal(self) -> Decimal:
+        return get_currency_formatter(self.currency).from_subunit(self.subunits)
+
+    def multiply(self, factor) -> 'SubunitMoney':
+        """Multiplies by a fractional factor (e.g. a tax rate), rounding half up to whole subunits."""
+        subunits = (self.subunits * Decimal(factor)).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
+        return SubunitMoney(subunits, self.currency)
+
+    def allocate(self, weights) -> list:
+        """
+        Splits the amount proportionally to `weights` (ints, e.g. subunit subtotals) such that the
+        parts add up to exactly this amount; leftover subunits go to the largest remainders.
+        """
+        if self.subunits < 0:
+            raise ValueError("Only non-negative amounts can be allocated")
+        weights = list(weights)
+        total_weight = sum(weights)
+        if not total_weight:
+            return [SubunitMoney.zero(self.currency) for _ in weights]
+
+        parts = []
+        remainders = []
+        for index, weight in enumerate(weights):
+            part, remainder = divmod(self.subunits * weight, total_weight)
+            parts.append(part)
+            remainders.append((-remainder, index))
+
+        leftover = self.subunits - sum(parts)
+        for _, index in sorted(remainders)[:leftover]:
+            parts[index] += 1
+        return [SubunitMoney(part, self.currency) for part in parts]
+
+    def _check_currency(self, other):
+        if not isinstance(other, SubunitMoney):
+            raise TypeError(f"Cannot combine SubunitMoney with {type(other).__name__}")
+        if other.currency != self.currency:
+            raise ValueError(f"Currency mismatch: {self.currency} and {other.currency}")
+
+    def __add__(self, other):
+        if isinstance(other, int) and other == 0:  # lets sum() start from 0
+            return self
+        self._check_currency(other)
+        return SubunitMoney(self.subunits + other.subunits, self.currency)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        self._check_currency(other)
+        return SubunitMoney(self.subunits - other.subunits, self.currency)
+
+    def __mul__(self, quantity: int):
+        if not isinstance(quantity, int):
+            raise TypeError("SubunitMoney can only be multiplied by an int, use multiply() for fractions")
+        return SubunitMoney(self.subunits * quantity, self.currency)
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return SubunitMoney(-self.subunits, self.currency)
+
+    def __bool__(self):
+        return self.subunits != 0
+
+    def __eq__(self, other):
+        if isinstance(other, SubunitMoney):
+            return self.subunits == other.subunits and self.currency == other.currency
+        if isinstance(other, int) and other == 0:
+            return self.subunits == 0
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((self.subunits, self.currency))
+
+    def __lt__(self, other):
+        self._check_currency(other)
+        return self.subunits < other.subunits
+
+    def __le__(self, other):
+        self._check_currency(other)
+        return self.subunits <= other.subunits
+
+    def __gt__(self, other):
+        self._check_currency(other)
+        return self.subunits > other.subunits
+
+    def __ge__(self, other):
+        self._check_currency(other)
+        return self.subunits >= other.subunits
+
+    def __str__(self):
+        return str(self.to_decimal())
+
+    def __repr__(self):
+        return f"SubunitMoney({self.subunits}, '{self.currency}')"
+
 
 
 def build_currency_amount(amount: float, currency_code: str, locale: str = ''):
@@ -31,37 +290,8 @@ def build_currency_amount(amount: float, currency_code: str, locale: str = ''):
     print(build_currency_amount(204.170, 'KWD'))  # Output: "د.ك 204.170"
     print(build_currency_amount(204.000, 'JPY'))  # Output: "¥ 204" (JPY has 0 decimal places)
     """
-    # Ensure the currency is valid
-    try:
-        currency = Currency(currency_code)
-    except ValueError:
-        raise ValueError(f"Invalid currency code: {currency_code}")
-
-    # Determine the precision for the currency
-    try:
-        decimal_places = get_currency_precision(currency_code)
-    except KeyError:
-        raise ValueError(f"Currency precision not found for: {currency_code}")
-
-    # Round the amount to the correct number of decimal places
-    try:
-        formatted_amount = Decimal(amount).quantize(Decimal(f'1.{"0" * decimal_places}'), rounding=ROUND_HALF_UP)
-    except (InvalidOperation, ValueError):
-        raise ValueError(f"Invalid amount: {amount} for currency '{currency_code}'")
-
-    # Create Money object (optional)
-    try:
-        money = Money(formatted_amount, currency)
-    except InvalidAmountError:
-        raise ValueError(f"Invalid amount '{formatted_amount}' for currency '{currency_code}'")
-
-    # Format the currency for output
-    if locale:
-        formatted_currency = format_currency(money.amount, currency_code, locale=locale)
-    else:
-        formatted_currency = f"{formatted_amount:.{decimal_places}f}"
-
-    return formatted_currency
+    formatter = get_currency_formatter(currency_code, locale)
+    return formatter.format(formatter.quantize(amount))
 
 
 def to_currency_subunit(amount: float, currency_code: str) -> int:
@@ -80,26 +310,7 @@ def to_currency_subunit(amount: float, currency_code: str) -> int:
     print(to_currency_subunit(204.170, 'KWD'))  # Output: 204170 (in fils)
     print(to_currency_subunit(204.000, 'JPY'))  # Output: 204 (no subunits for JPY)
     """
-    # Ensure the currency is valid
-    try:
-        currency = Currency(currency_code)
-    except ValueError:
-        raise ValueError(f"Invalid currency code: {currency_code}")
-
-    # Get the correct number of decimal places for the currency (subunit factor)
-    try:
-        decimal_places = get_currency_precision(currency_code)
-    except KeyError:
-        raise ValueError(f"Currency precision not found for: {currency_code}")
-
-    # Multiply the amount by 10^decimal_places to convert it into subunits (e.g., 20.45 USD -> 2045 cents)
-    try:
-        subunit_amount = Decimal(amount) * (10 ** decimal_places)
-        subunit_amount = subunit_amount.quantize(Decimal('1'), rounding=ROUND_HALF_UP)  # Round to the nearest whole number
-    except (InvalidOperation, ValueError):
-        raise ValueError(f"Invalid amount: {amount} for currency '{currency_code}'")
-
-    return int(subunit_amount)
+    return get_currency_formatter(currency_code).to_subunit(amount)
 
 
 def to_currency_unit(subunit: int, currency_code: str, locale: str = ''):
@@ -123,32 +334,11 @@ def to_currency_unit(subunit: int, currency_code: str, locale: str = ''):
         print(to_currency_unit(204170, 'KWD', locale='en_KW'))  # Output: "د.ك 204.170"
         print(to_currency_unit(20456, 'JPY'))  # Output: "¥ 20456"  # JPY has no decimal places
     """
-   
-    # Ensure the currency is valid
-    try:
-        currency = Currency(currency_code)
-    except ValueError:
-        raise ValueError(f"Invalid currency code: {currency_code}")
-    
-    try:
-        decimal_places = get_currency_precision(currency_code)
-    except KeyError:
-        raise ValueError(f"Currency precision not found for: {currency_code}")
-    
-    # Divide the subunit amount by 10^decimal_places to convert it into units (e.g., 2045 cents -> 20.45 USD)
-    try:
-        unit_amount = Decimal(subunit) / (10 ** decimal_places)
-        unit_amount = unit_amount.quantize(Decimal(f'1.{"0" * decimal_places}'), rounding=ROUND_HALF_UP)
-    except (InvalidOperation, ValueError):
-        raise ValueError(f"Invalid subunit amount: {subunit} for currency '{currency_code}'")
-    
-    # Format the currency for output
+    formatter = get_currency_formatter(currency_code, locale)
+    unit_amount = formatter.from_subunit(subunit)
     if locale:
-        formatted_currency = format_currency(unit_amount, currency_code, locale=locale)
-    else:
-        formatted_currency = f"{unit_amount}"
-
-    return formatted_currency
+        return formatter.format(unit_amount)
+    return f"{unit_amount}"
 
 
 
@@ -169,12 +359,8 @@ def normalize_amount_currencywise(amount: float, currency_code: str) -> Decimal:
     Returns:
     - Decimal: The formatted amount with the appropriate precision.
     """
-    precision = get_currency_precision(currency_code)
-    amount_decimal = Decimal(str(amount))
-    quantize_format = '1.' + '0' * precision
-    formatted_amount = amount_decimal.quantize(Decimal(quantize_format), rounding=ROUND_HALF_UP)
-    
-    return formatted_amount
+    exponent = get_currency_formatter(currency_code).exponent
+    return Decimal(str(amount)).quantize(exponent, rounding=ROUND_HALF_UP)
 
 
 def get_in_user_currency(amount: float, user_currency: str, base_currency: str, locale: str = '') -> str:
@@ -188,7 +374,7 @@ def get_in_user_currency(amount: float, user_currency: str, base_currency: str,
         return build_currency_amount(amount, base_currency, locale)
 
     cleaned_amount = build_currency_amount(amount, base_currency)
-    backend = currency_Backend()
+    backend = get_currency_backend()
     return backend.to_target_currency(user_currency, cleaned_amount, locale)
 
 
@@ -215,12 +401,5 @@ def apply_exchange_rate(amount: str, exchange_rate: str, target_currency: str, l
     except (InvalidOperation, ValueError):
         raise ValueError(f"Invalid amount '{amount}' or exchange rate '{exchange_rate}'")
 
-    # Format the converted amount for output
-    if locale:
-        formatted_currency = format_currency(converted_amount, target_currency, locale=locale)
-    else:
-        # Return unformatted converted amount with the correct precision
-        decimal_places = get_currency_precision(target_currency)
-        formatted_currency = f"{converted_amount:.{decimal_places}f}"
-
-    return formatted_currency
\ No newline at end of file
+    # Format the converted amount for output; without a locale it is returned with the currency's precision
+    return get_currency_formatter(target_currency, locale).format(converted_amount)
\ No newline at end of file
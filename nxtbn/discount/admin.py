@@ -63,7 +63,7 @@ class PromoCodeAdmin(admin.ModelAdmin):
     ]
     fieldsets = (
         (None, {
-            'fields': ('code', 'description', 'code_type', 'value', 'expiration_date', 'is_active')
+            'fields': ('code', 'description', 'code_type', 'value', 'start_date', 'expiration_date', 'is_active')
         }),
         ('Advanced options', {
             'fields': ('min_purchase_amount', 'min_purchase_period', 'redemption_limit', 'new_customers_only', 'usage_limit_per_customer')
@@ -15,7 +15,7 @@ class PromoCodeCountedSerializer(serializers.ModelSerializer):
 class PromoCodeBasicSerializer(serializers.ModelSerializer):
     class Meta:
         model = PromoCode
-        fields = ('id', 'code', 'code_type', 'value', 'is_active', 'expiration_date',)
+        fields = ('id', 'code', 'code_type', 'value', 'is_active', 'start_date', 'expiration_date',)
 
 class AttachPromoCodeEntitiesSerializer(serializers.Serializer):
     promo_code = serializers.CharField()
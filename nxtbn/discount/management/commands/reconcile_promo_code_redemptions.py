@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from tqdm import tqdm
+
+from nxtbn.discount.models import PromoCode
+from nxtbn.discount.utils import reconcile_promo_code_redemptions
+
+
+class Command(BaseCommand):
+    help = 'Recompute promo code redemption counters from the recorded promo code usages'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--code',
+            action='append',
+            dest='codes',
+            help='Only reconcile the given promo code. Can be repeated.',
+        )
+
+    def handle(self, *args, **options):
+        promo_codes = PromoCode.objects.order_by('id')
+        if options['codes']:
+            promo_codes = promo_codes.filter(code__in=[code.upper() for code in options['codes']])
+
+        corrected = 0
+        for promo_code in tqdm(promo_codes.iterator()):
+            if reconcile_promo_code_redemptions(promo_code):
+                corrected += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Reconciled promo code redemptions, {corrected} promo code(s) corrected.'))
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.11 on 2026-10-18 02:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def count_redemptions(apps, schema_editor):
+    PromoCode = apps.get_model('discount', 'PromoCode')
+    PromoCodeUsage = apps.get_model('discount', 'PromoCodeUsage')
+    PromoCodeUserRedemption = apps.get_model('discount', 'PromoCodeUserRedemption')
+
+    total_redemptions = dict(
+        PromoCodeUsage.objects.values_list('promo_code_id').annotate(redemptions=models.Count('id')).order_by()
+    )
+    promo_codes = list(PromoCode.objects.filter(id__in=total_redemptions))
+    for promo_code in promo_codes:
+        promo_code.total_redemptions = total_redemptions[promo_code.id]
+    PromoCode.objects.bulk_update(promo_codes, ['total_redemptions'], batch_size=500)
+
+    user_redemptions = (
+        PromoCodeUsage.objects.filter(user__isnull=False)
+        .values_list('promo_code_id', 'user_id')
+        .annotate(redemptions=models.Count('id'))
+        .order_by()
+    )
+    PromoCodeUserRedemption.objects.bulk_create(
+        [
+            PromoCodeUserRedemption(promo_code_id=promo_code_id, user_id=user_id, redemptions=redemptions)
+            for promo_code_id, user_id, redemptions in user_redemptions
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('discount', '0004_alter_promocodeusage_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='promocode',
+            name='total_redemptions',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of times this promo code has been redeemed, maintained on every redemption.'),
+        ),
+        migrations.CreateModel(
+            name='PromoCodeUserRedemption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('redemptions', models.PositiveIntegerField(default=0, help_text='Number of times the customer has redeemed this promo code.')),
+                ('promo_code', models.ForeignKey(help_text='The promo code that was redeemed.', on_delete=django.db.models.deletion.CASCADE, related_name='user_redemptions', to='discount.promocode')),
+                ('user', models.ForeignKey(help_text='The customer who redeemed the promo code.', on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Promo Code User Redemption',
+                'verbose_name_plural': 'Promo Code User Redemptions',
+                'unique_together': {('promo_code', 'user')},
+            },
+        ),
+        migrations.RunPython(count_redemptions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 03:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discount', '0005_promocode_redemption_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='promocode',
+            name='start_date',
+            field=models.DateTimeField(blank=True, help_text='Date from which the promo code can be redeemed. Leave empty to allow it right away.', null=True),
+        ),
+    ]
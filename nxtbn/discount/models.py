@@ -19,6 +19,11 @@ class PromoCode(AbstractBaseModel):
         default=PromoCodeType.PERCENTAGE,
     )
     value = models.DecimalField(max_digits=10, decimal_places=2)  # e.g., 10 for 10%, or 10 for $10
+    start_date = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Date from which the promo code can be redeemed. Leave empty to allow it right away."
+    )
     expiration_date = models.DateTimeField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
     
@@ -62,6 +67,11 @@ class PromoCode(AbstractBaseModel):
         default=1,
         help_text="Maximum number of times a single customer can redeem this promo code."
     )
+    total_redemptions = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Number of times this promo code has been redeemed, maintained on every redemption."
+    )
     
     def save(self, *args, **kwargs):
         # Ensure the code is in uppercase
@@ -116,7 +126,7 @@ class PromoCode(AbstractBaseModel):
 
     
     def get_total_redemptions(self):
-        return PromoCodeUsage.objects.filter(promo_code=self).count()
+        return self.total_redemptions
     
     def get_total_applicable_products(self):
         return self.applicable_products.count()
@@ -125,7 +135,11 @@ class PromoCode(AbstractBaseModel):
         return self.specific_customers.count()
     
     def get_user_redemptions(self, user):
-        return PromoCodeUsage.objects.filter(promo_code=self, user=user).count()
+        if user is None:
+            return 0
+        return PromoCodeUserRedemption.objects.filter(
+            promo_code=self, user=user
+        ).values_list('redemptions', flat=True).first() or 0
     
     def is_new_customer(self, user):
         # Define "new" as registered within the last 30 days
@@ -163,6 +177,8 @@ class PromoCode(AbstractBaseModel):
             raise ValidationError("Cannot specify specific customers and new customers only.")
         if self.min_purchase_amount is not None and self.min_purchase_period is None:
             raise ValidationError("Must specify a time period for the minimum purchase amount.")
+        if self.start_date and self.expiration_date and self.start_date >= self.expiration_date:
+            raise ValidationError("Start date must be before the expiration date.")
         
         super().clean()
     
@@ -179,6 +195,24 @@ class PromoCodeUsage(AbstractBaseModel):
     applied_at = models.DateTimeField(auto_now_add=True, help_text="The timestamp when the promo code was applied.")
     
 
+class PromoCodeUserRedemption(models.Model):
+    """
+    Denormalized per-customer redemption tally of a promo code, so usage limits are enforced
+    with a single conditional UPDATE instead of counting PromoCodeUsage rows.
+    """
+    promo_code = models.ForeignKey(PromoCode, on_delete=models.CASCADE, related_name='user_redemptions', help_text="The promo code that was redeemed.")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', help_text="The customer who redeemed the promo code.")
+    redemptions = models.PositiveIntegerField(default=0, help_text="Number of times the customer has redeemed this promo code.")
+
+    class Meta:
+        unique_together = ('promo_code', 'user')
+        verbose_name = "Promo Code User Redemption"
+        verbose_name_plural = "Promo Code User Redemptions"
+
+    def __str__(self):
+        return f"{self.promo_code.code} - {self.user.username}: {self.redemptions}"
+
+
 class PromoCodeCustomer(models.Model):
     promo_code = models.ForeignKey(PromoCode, on_delete=models.CASCADE, help_text="The promo code that is restricted to specific customers.")
     customer = models.ForeignKey(User, on_delete=models.CASCADE, help_text="The customer who is eligible to use this promo code.")
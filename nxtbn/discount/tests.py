@@ -1,3 +1,160 @@
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.db import transaction
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework import serializers
+
+from nxtbn.discount.models import PromoCode, PromoCodeCustomer, PromoCodeUsage, PromoCodeUserRedemption
+from nxtbn.discount.utils import PromoCodeEvaluator, redeem_promo_code
+from nxtbn.order.models import Order
+from nxtbn.order.proccesor.views import OrderCalculation
+from nxtbn.product.models import Category, Product, ProductType, ProductVariant
+from nxtbn.users import UserRole
+from nxtbn.users.tests import UserFactory
+
+
+class PromoCodeEvaluatorTest(TestCase):
+
+    def setUp(self):
+        self.customer = UserFactory(email='customer@example.com', username='customer')
+        self.evaluator = PromoCodeEvaluator()
+
+    def create_promo_code(self, **kwargs):
+        return PromoCode.objects.create(code='SAVE10', value=Decimal('10.00'), **kwargs)
+
+    def assertRejected(self, code, reason, customer=None):
+        evaluation = self.evaluator.evaluate(code, customer=customer)
+        self.assertFalse(evaluation.is_valid)
+        self.assertEqual([reason.code for reason in evaluation.reasons], [reason])
+
+    def test_valid_code_is_evaluated_with_a_single_query(self):
+        self.create_promo_code()
+
+        with self.assertNumQueries(1):
+            evaluation = self.evaluator.evaluate('save10', customer=self.customer.id)
+        self.assertTrue(evaluation.is_valid)
+
+        # Memoized for the rest of the request
+        with self.assertNumQueries(0):
+            self.evaluator.evaluate('SAVE10', customer=self.customer.id)
+
+    def test_unknown_code(self):
+        evaluation = self.evaluator.evaluate('NOPE')
+        self.assertIsNone(evaluation.promo_code)
+        self.assertEqual(evaluation.reasons[0].code, 'not_found')
+
+    def test_expired(self):
+        self.create_promo_code(expiration_date=timezone.now() - timedelta(days=1))
+        self.assertRejected('SAVE10', 'expired')
+
+    def test_not_started(self):
+        self.create_promo_code(start_date=timezone.now() + timedelta(days=1))
+        self.assertRejected('SAVE10', 'not_started')
+
+    def test_redemption_limit_reached(self):
+        self.create_promo_code(redemption_limit=1, total_redemptions=1)
+        self.assertRejected('SAVE10', 'redemption_limit')
+
+    def test_usage_limit_per_customer_reached(self):
+        promo_code = self.create_promo_code(usage_limit_per_customer=2)
+        PromoCodeUserRedemption.objects.create(promo_code=promo_code, user=self.customer, redemptions=2)
+        self.assertRejected('SAVE10', 'usage_limit', customer=self.customer.id)
+
+    def test_minimum_purchase_not_met(self):
+        self.create_promo_code(min_purchase_amount=Decimal('100.00'), min_purchase_period=timedelta(days=30))
+        self.assertRejected('SAVE10', 'min_purchase', customer=self.customer.id)
+
+    def test_customer_not_eligible(self):
+        promo_code = self.create_promo_code()
+        other_customer = UserFactory(email='other@example.com', username='other')
+        PromoCodeCustomer.objects.create(promo_code=promo_code, customer=other_customer)
+
+        self.assertRejected('SAVE10', 'customer_not_eligible', customer=self.customer.id)
+        self.assertTrue(self.evaluator.evaluate('SAVE10', customer=other_customer.id).is_valid)
+
+
+class RedeemPromoCodeTest(TestCase):
+
+    def setUp(self):
+        self.customer = UserFactory(email='customer@example.com', username='customer', role=UserRole.ADMIN)
+        product = Product.objects.create(
+            created_by=self.customer,
+            name='Promo Product',
+            summary='summary',
+            description='description',
+            category=Category.objects.create(name='Promo Category'),
+            product_type=ProductType.objects.create(name='Promo Type'),
+        )
+        self.variant = ProductVariant.objects.create(
+            product=product,
+            price=Decimal('10.00'),
+            cost_per_unit=Decimal('5.00'),
+            sku='PROMO-SKU',
+            track_inventory=True,
+            stock=5,
+        )
+        self.promo_code = PromoCode.objects.create(code='SAVE10', value=Decimal('10.00'))
+
+    def order_calculation(self):
+        request = SimpleNamespace(user=self.customer, currency='USD', META={})
+        validated_data = {
+            'variants': [{'alias': str(self.variant.alias), 'quantity': 1}],
+            'promocode': self.promo_code.code,
+            'customer_id': self.customer.id,
+        }
+        return OrderCalculation(validated_data, order_source='admin', create_order=True, request=request)
+
+    def redeem(self, user=None):
+        with transaction.atomic():
+            order = Order.objects.create(user_id=user, total_price=1000)
+            return redeem_promo_code(self.promo_code, order, user=user)
+
+    def test_global_redemption_limit(self):
+        PromoCode.objects.filter(pk=self.promo_code.pk).update(redemption_limit=2)
+        self.promo_code.refresh_from_db()
+
+        self.redeem()
+        self.redeem(user=self.customer.id)
+        with self.assertRaisesMessage(serializers.ValidationError, "redemption limit"):
+            self.redeem()
+
+        self.promo_code.refresh_from_db()
+        self.assertEqual(self.promo_code.total_redemptions, 2)
+        self.assertEqual(PromoCodeUsage.objects.count(), 2)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_per_customer_usage_limit(self):
+        PromoCode.objects.filter(pk=self.promo_code.pk).update(usage_limit_per_customer=1)
+        self.promo_code.refresh_from_db()
+
+        self.redeem(user=self.customer.id)
+        with self.assertRaisesMessage(serializers.ValidationError, "usage limit"):
+            self.redeem(user=self.customer.id)
+        # Anonymous orders are not bound by the per-customer limit
+        self.redeem()
+
+        self.promo_code.refresh_from_db()
+        # The failed redemption did not keep its increment of the total
+        self.assertEqual(self.promo_code.total_redemptions, 2)
+        self.assertEqual(
+            PromoCodeUserRedemption.objects.get(promo_code=self.promo_code, user=self.customer).redemptions, 1
+        )
+
+    def test_lost_redemption_rolls_back_the_order(self):
+        PromoCode.objects.filter(pk=self.promo_code.pk).update(redemption_limit=1)
+        calculation = self.order_calculation()
+
+        # Another order takes the last redemption between the estimate and the order creation
+        PromoCode.objects.filter(pk=self.promo_code.pk).update(total_redemptions=1)
+        with self.assertRaisesMessage(serializers.ValidationError, "redemption limit"):
+            calculation.create_order_instance()
 
-# Create your tests here.
+        self.variant.refresh_from_db()
+        self.promo_code.refresh_from_db()
+        self.assertEqual(self.variant.stock, 5)
+        self.assertEqual(self.promo_code.total_redemptions, 1)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(PromoCodeUsage.objects.exists())
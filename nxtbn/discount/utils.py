@@ -0,0 +1,235 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from rest_framework import serializers
+
+from nxtbn.discount.models import PromoCode, PromoCodeCustomer, PromoCodeProduct, PromoCodeUsage, PromoCodeUserRedemption
+from nxtbn.order import OrderStatus
+
+
+@dataclass
+class PromoCodeReason:
+    code: str
+    message: str
+
+
+@dataclass
+class PromoCodeEvaluation:
+    """
+    Result of evaluating a promo code against a cart.
+
+    Attributes:
+        promo_code: The PromoCode instance, or None if the code does not exist.
+        reasons: Every rule the cart failed, in the order they are checked.
+    """
+    promo_code: Optional[PromoCode]
+    reasons: List[PromoCodeReason] = field(default_factory=list)
+
+    @property
+    def is_valid(self):
+        return self.promo_code is not None and not self.reasons
+
+    @property
+    def messages(self):
+        return [reason.message for reason in self.reasons]
+
+
+class PromoCodeEvaluator:
+    """
+    Evaluates every PromoCode rule with a fixed, small number of queries.
+
+    The promo code, its customer restriction, product restriction and redemption counters are
+    loaded with one annotated query. Product eligibility, minimum purchase history and the
+    new-customer check cost at most one query each, and only when the promo code uses them.
+
+    Evaluations are memoized per (code, customer, cart products), so estimating and then creating an order
+    in the same request evaluates a code only once.
+    """
+
+    def __init__(self):
+        self.evaluations = {}
+
+    def evaluate(self, code, customer=None, product_ids=()):
+        """
+        Args:
+            code (str): The promo code entered by the customer (case insensitive).
+            customer (int): Optional id of the customer placing the order.
+            product_ids (iterable): Ids of the products in the cart.
+
+        Returns:
+            PromoCodeEvaluation
+        """
+        product_ids = frozenset(product_ids)
+        key = (code.upper(), customer, product_ids)
+        if key not in self.evaluations:
+            self.evaluations[key] = self._evaluate(code.upper(), customer, product_ids)
+        return self.evaluations[key]
+
+    def _evaluate(self, code, customer, product_ids):
+        promo_code = self.get_promo_code(code, customer)
+        if promo_code is None:
+            return PromoCodeEvaluation(promo_code=None, reasons=[
+                PromoCodeReason('not_found', "Promo code does not exist.")
+            ])
+
+        evaluation = PromoCodeEvaluation(promo_code=promo_code)
+        reasons = evaluation.reasons
+
+        if not promo_code.is_active:
+            reasons.append(PromoCodeReason('inactive', "Promo code is not active."))
+
+        now = timezone.now()
+        if promo_code.start_date and promo_code.start_date > now:
+            reasons.append(PromoCodeReason('not_started', "Promo code is not valid yet."))
+
+        if promo_code.expiration_date and promo_code.expiration_date <= now:
+            reasons.append(PromoCodeReason('expired', "Promo code has expired."))
+
+        if promo_code.has_specific_customers and not promo_code.is_specific_customer:
+            reasons.append(PromoCodeReason(
+                'customer_not_eligible',
+                "This promo code is restricted to specific customers and is not valid for you."
+            ))
+
+        if promo_code.has_applicable_products and not self.covers_products(promo_code, product_ids):
+            reasons.append(PromoCodeReason(
+                'product_not_eligible',
+                "Promo code is not valid for one or more of the products in your cart."
+            ))
+
+        if not self.has_min_purchase(promo_code, customer):
+            reasons.append(PromoCodeReason('min_purchase', "Promo code is not valid for your purchase amount."))
+
+        if promo_code.redemption_limit is not None and promo_code.total_redemptions >= promo_code.redemption_limit:
+            reasons.append(PromoCodeReason('redemption_limit', "Promo code has reached its redemption limit."))
+
+        if promo_code.usage_limit_per_customer is not None and promo_code.customer_redemptions >= promo_code.usage_limit_per_customer:
+            reasons.append(PromoCodeReason('usage_limit', "Promo code has reached its usage limit for you."))
+
+        if promo_code.new_customers_only and not self.is_new_customer(promo_code, customer):
+            reasons.append(PromoCodeReason('new_customers_only', "Promo code is only valid for new customers."))
+
+        return evaluation
+
+    def get_promo_code(self, code, customer):
+        promo_codes = PromoCode.objects.filter(code=code).annotate(
+            has_specific_customers=Exists(PromoCodeCustomer.objects.filter(promo_code=OuterRef('pk'))),
+            is_specific_customer=Exists(
+                PromoCodeCustomer.objects.filter(promo_code=OuterRef('pk'), customer_id=customer)
+            ),
+            has_applicable_products=Exists(PromoCodeProduct.objects.filter(promo_code=OuterRef('pk'))),
+            customer_redemptions=Coalesce(
+                Subquery(
+                    PromoCodeUserRedemption.objects.filter(
+                        promo_code=OuterRef('pk'), user_id=customer
+                    ).values('redemptions')[:1],
+                    output_field=IntegerField(),
+                ),
+                Value(0),
+            ),
+        )
+        return promo_codes.first()
+
+    def covers_products(self, promo_code, product_ids):
+        applicable = set(
+            PromoCodeProduct.objects.filter(
+                promo_code=promo_code,
+                product_id__in=product_ids,
+            ).values_list('product_id', flat=True)
+        )
+        return applicable == set(product_ids)
+
+    def has_min_purchase(self, promo_code, customer):
+        from nxtbn.order.models import Order
+
+        if not promo_code.min_purchase_amount or not promo_code.min_purchase_period:
+            return True
+        cutoff_date = timezone.now() - promo_code.min_purchase_period
+        total = Order.objects.filter(
+            user_id=customer,
+            created_at__gte=cutoff_date,
+            status__in=[OrderStatus.SHIPPED, OrderStatus.DELIVERED]
+        ).aggregate(total=Sum('total_price_in_customer_currency'))['total'] or 0
+        return total >= promo_code.min_purchase_amount
+
+    def is_new_customer(self, promo_code, customer):
+        from nxtbn.users.models import User
+
+        if customer is None:
+            return False
+        user = User.objects.only('date_joined').filter(id=customer).first()
+        if user is None:
+            return False
+        return promo_code.is_new_customer(user)
+
+
+def redeem_promo_code(promo_code, order, user=None):
+    """
+    Records a redemption of `promo_code` for `order` and enforces its limits atomically.
+
+    The total and per-customer counters are each bumped with a single conditional UPDATE
+    that only matches while the counter is below its limit, so two concurrent orders can
+    never both take the last redemption. Must be called inside `transaction.atomic()`;
+    the raised error rolls back the counters together with the order.
+
+    Raises:
+        serializers.ValidationError: If a redemption limit has been reached.
+    """
+    redeemed = PromoCode.objects.filter(
+        Q(redemption_limit__isnull=True) | Q(total_redemptions__lt=F('redemption_limit')),
+        pk=promo_code.pk,
+    ).update(total_redemptions=F('total_redemptions') + 1)
+    if not redeemed:
+        raise serializers.ValidationError("Promo code has reached its redemption limit.")
+
+    if user is not None:
+        PromoCodeUserRedemption.objects.bulk_create(
+            [PromoCodeUserRedemption(promo_code=promo_code, user_id=user)],
+            ignore_conflicts=True,
+        )
+        user_redemptions = PromoCodeUserRedemption.objects.filter(promo_code=promo_code, user_id=user)
+        if promo_code.usage_limit_per_customer is not None:
+            user_redemptions = user_redemptions.filter(redemptions__lt=promo_code.usage_limit_per_customer)
+        if not user_redemptions.update(redemptions=F('redemptions') + 1):
+            raise serializers.ValidationError("Promo code has reached its usage limit for you.")
+
+    return PromoCodeUsage.objects.create(promo_code=promo_code, order=order, user_id=user)
+
+
+def reconcile_promo_code_redemptions(promo_code):
+    """
+    Recomputes the redemption counters of `promo_code` from its PromoCodeUsage rows.
+
+    The promo code row is locked while recounting, so redemptions that happen at the
+    same time wait instead of being lost.
+
+    Returns:
+        bool: True if any counter was out of sync and has been corrected.
+    """
+    with transaction.atomic():
+        promo_code = PromoCode.objects.select_for_update().get(pk=promo_code.pk)
+        usages = PromoCodeUsage.objects.filter(promo_code=promo_code)
+
+        total_redemptions = usages.count()
+        user_redemptions = dict(
+            usages.filter(user__isnull=False).values_list('user_id').annotate(redemptions=Count('id'))
+        )
+        current_user_redemptions = dict(
+            PromoCodeUserRedemption.objects.filter(promo_code=promo_code).values_list('user_id', 'redemptions')
+        )
+
+        if promo_code.total_redemptions == total_redemptions and current_user_redemptions == user_redemptions:
+            return False
+
+        PromoCode.objects.filter(pk=promo_code.pk).update(total_redemptions=total_redemptions)
+        PromoCodeUserRedemption.objects.filter(promo_code=promo_code).delete()
+        PromoCodeUserRedemption.objects.bulk_create([
+            PromoCodeUserRedemption(promo_code=promo_code, user_id=user_id, redemptions=redemptions)
+            for user_id, redemptions in user_redemptions.items()
+        ])
+        return True
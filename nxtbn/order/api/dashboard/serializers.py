@@ -8,6 +8,7 @@ from nxtbn.discount.api.dashboard.serializers import PromoCodeBasicSerializer
 from nxtbn.order import AddressType, OrderChargeStatus, OrderStatus, PaymentTerms
 from nxtbn.order.api.storefront.serializers import AddressSerializer
 from nxtbn.order.models import Address, Order, OrderDeviceMeta, OrderLineItem, ReturnLineItem, ReturnRequest
+from nxtbn.order.stock import handle_order_status_change
 from nxtbn.payment.api.dashboard.serializers import BasicPaymentSerializer
 from nxtbn.payment.models import Payment
 from nxtbn.product.api.dashboard.serializers import ProductVariantSerializer
@@ -255,6 +256,13 @@ class OrderStatusUpdateSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(_("Order must be shipped before mark it as delivered."))
         
         return attrs
+
+    def update(self, instance, validated_data):
+        previous_status = instance.status
+        with transaction.atomic():
+            order = super().update(instance, validated_data)
+            handle_order_status_change(order, previous_status)
+        return order
     
 
 
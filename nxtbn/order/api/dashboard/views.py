@@ -84,6 +84,8 @@ class OrderListView(generics.ListAPIView):
     queryset = Order.objects.all()
     serializer_class = OrderListSerializer
     pagination_class = NxtbnPagination
+    pagination_mode = 'cursor'
+    count_strategy = 'estimated'
 
     filter_backends = [
         django_filters.rest_framework.DjangoFilterBackend,
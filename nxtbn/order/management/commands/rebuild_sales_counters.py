@@ -0,0 +1,81 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from tqdm import tqdm
+
+from nxtbn.order import ReturnStatus
+from nxtbn.order.models import Order, OrderLineItem, ReturnLineItem, ReturnRequest
+from nxtbn.order.sales import SALES_COUNTING_STATUSES
+from nxtbn.product.models import Product, ProductVariantDailySales, ProductVariantSales
+from nxtbn.product.utils import refresh_windowed_sales
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the product sales counters and their daily buckets from the order history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows written per query')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # Orders and returns must not change status meanwhile, or their sales could be counted twice
+        with transaction.atomic():
+            Order.objects.filter(status__in=SALES_COUNTING_STATUSES).update(sales_counted=True)
+            Order.objects.exclude(status__in=SALES_COUNTING_STATUSES).update(sales_counted=False)
+            ReturnRequest.objects.filter(status=ReturnStatus.COMPLETED).update(sales_deducted=True)
+            ReturnRequest.objects.exclude(status=ReturnStatus.COMPLETED).update(sales_deducted=False)
+
+            sales = defaultdict(int)
+            sold = OrderLineItem.objects.filter(order__sales_counted=True).annotate(
+                day=TruncDate('order__created_at'),
+            ).values('variant_id', 'variant__product_id', 'day').annotate(quantity=Sum('quantity')).order_by()
+            for line in sold.iterator():
+                sales[(line['variant_id'], line['variant__product_id'], line['day'])] += line['quantity']
+
+            returned = ReturnLineItem.objects.filter(
+                return_request__sales_deducted=True, return_request__order__sales_counted=True,
+            ).annotate(
+                day=TruncDate('return_request__order__created_at'),
+            ).values(
+                'order_line_item__variant_id', 'order_line_item__variant__product_id', 'day',
+            ).annotate(quantity=Sum('quantity')).order_by()
+            for line in returned.iterator():
+                key = (line['order_line_item__variant_id'], line['order_line_item__variant__product_id'], line['day'])
+                sales[key] -= line['quantity']
+
+            variant_sales = defaultdict(int)
+            product_sales = defaultdict(int)
+            for (variant_id, product_id, day), quantity in sales.items():
+                variant_sales[variant_id] += quantity
+                product_sales[product_id] += quantity
+
+            ProductVariantDailySales.objects.all().delete()
+            ProductVariantSales.objects.all().delete()
+            Product.objects.update(**{field: 0 for field in Product.SALES_FIELDS})
+
+            ProductVariantDailySales.objects.bulk_create(
+                (
+                    ProductVariantDailySales(variant_id=variant_id, product_id=product_id, day=day, quantity=quantity)
+                    for (variant_id, product_id, day), quantity in tqdm(sales.items(), desc='Daily sales')
+                    if quantity
+                ),
+                batch_size=batch_size,
+            )
+            ProductVariantSales.objects.bulk_create(
+                (ProductVariantSales(variant_id=variant_id, total_sales=quantity) for variant_id, quantity in variant_sales.items()),
+                batch_size=batch_size,
+            )
+            Product.objects.bulk_update(
+                [Product(pk=product_id, total_sales=quantity) for product_id, quantity in tqdm(product_sales.items(), desc='Products')],
+                ['total_sales'],
+                batch_size=batch_size,
+            )
+            refresh_windowed_sales()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Sales counters rebuilt for {len(variant_sales)} variants of {len(product_sales)} products."
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 02:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0014_returnlineitem_reason_returnrequest_reason'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_reserved',
+            field=models.BooleanField(default=False, help_text="Whether the stock of this order's line items has been deducted from inventory and not released yet."),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.11 on 2026-10-18 03:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0015_order_stock_reserved'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='sales_counted',
+            field=models.BooleanField(default=False, help_text="Whether this order's line items are included in the product sales counters."),
+        ),
+        migrations.AddField(
+            model_name='returnrequest',
+            name='sales_deducted',
+            field=models.BooleanField(default=False, help_text='Whether the returned quantities have been taken off the product sales counters.'),
+        ),
+    ]
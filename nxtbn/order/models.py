@@ -10,7 +10,7 @@ from decimal import Decimal
 from nxtbn.core import CurrencyTypes, MoneyFieldTypes
 from nxtbn.core.mixin import MonetaryMixin
 from nxtbn.core.models import AbstractAddressModels, AbstractBaseModel, AbstractBaseUUIDModel
-from nxtbn.core.utils import build_currency_amount, to_currency_unit
+from nxtbn.core.utils import build_currency_amount, get_currency_formatter, to_currency_unit
 from nxtbn.discount.models import PromoCode
 from nxtbn.gift_card.models import GiftCard
 from nxtbn.order import AddressType, OrderAuthorizationStatus, OrderChargeStatus, OrderStatus, PaymentTerms, ReturnReason, ReturnReceiveStatus, ReturnStatus
@@ -21,7 +21,6 @@ from nxtbn.users.models import User
 from nxtbn.product.models import Supplier
 
 from money.money import Currency, Money
-from babel.numbers import get_currency_precision, format_currency
 
 
 class Address(AbstractAddressModels):
@@ -213,6 +212,15 @@ class Order(MonetaryMixin, AbstractBaseUUIDModel):
         verbose_name="Charge Status",
     )
 
+    stock_reserved = models.BooleanField(
+        default=False,
+        help_text="Whether the stock of this order's line items has been deducted from inventory and not released yet."
+    )
+    sales_counted = models.BooleanField(
+        default=False,
+        help_text="Whether this order's line items are included in the product sales counters."
+    )
+
     promo_code = models.ForeignKey(PromoCode, on_delete=models.SET_NULL, null=True, blank=True)
     gift_card = models.ForeignKey(GiftCard, on_delete=models.SET_NULL, null=True, blank=True)
     payment_term = models.CharField( # incase charge_status is DUE
@@ -259,58 +267,53 @@ class Order(MonetaryMixin, AbstractBaseUUIDModel):
         return 'AWAITING_SELECTION'
     
     def total_piad_amount(self):
-        precision = get_currency_precision(self.currency)
         total_in_subunits = self.payments.filter(is_successful=True).aggregate(models.Sum('payment_amount'))['payment_amount__sum']
         if total_in_subunits is None:
             return 0
-        total_in_unit = total_in_subunits / (10 ** precision)
+        total_in_unit = total_in_subunits / get_currency_formatter(self.currency).subunit_factor
         return total_in_unit
     
     def humanize_total_paid_amount(self, locale='en_US'):
         if locale:
-            return format_currency(self.total_piad_amount(), self.currency, locale=locale)
+            return get_currency_formatter(self.currency, locale).format(self.total_piad_amount())
         return self.total_piad_amount()
        
 
     def total_in_units(self): #subunit -to-unit 
-        precision = get_currency_precision(self.currency)
-        unit = self.total_price / (10 ** precision)
+        unit = self.total_price / get_currency_formatter(self.currency).subunit_factor
         return unit
     
     def total_shipping_cost_in_units(self): #subunit -to-unit
         if self.total_shipping_cost is None:
             return 0
-        precision = get_currency_precision(self.currency)
-        unit = self.total_shipping_cost / (10 ** precision)
+        unit = self.total_shipping_cost / get_currency_formatter(self.currency).subunit_factor
         return unit
     
     def total_discounted_amount_in_units(self): #subunit -to-unit
         if self.total_discounted_amount is None:
             return 0
-        precision = get_currency_precision(self.currency)
-        unit = self.total_discounted_amount / (10 ** precision)
+        unit = self.total_discounted_amount / get_currency_formatter(self.currency).subunit_factor
         return unit
     
     def total_tax_in_units(self): #subunit -to-unit
         if self.total_tax is None:
             return 0
-        precision = get_currency_precision(self.currency)
-        unit = self.total_tax / (10 ** precision)
+        unit = self.total_tax / get_currency_formatter(self.currency).subunit_factor
         return unit
     
     def humanize_total_price(self, locale='en_US'):
         if locale:
-            return format_currency(self.total_in_units(), self.currency, locale=locale)
+            return get_currency_formatter(self.currency, locale).format(self.total_in_units())
         return self.total_in_units()
     
     def humanize_total_shipping_cost(self):
-        return format_currency(self.total_shipping_cost_in_units(), self.currency, locale='en_US')
+        return get_currency_formatter(self.currency, 'en_US').format(self.total_shipping_cost_in_units())
     
     def humanize_total_discounted_amount(self):
-        return format_currency(self.total_discounted_amount_in_units(), self.currency, locale='en_US')
+        return get_currency_formatter(self.currency, 'en_US').format(self.total_discounted_amount_in_units())
     
     def humanize_total_tax(self):
-        return format_currency(self.total_tax_in_units(), self.currency, locale='en_US')
+        return get_currency_formatter(self.currency, 'en_US').format(self.total_tax_in_units())
     
     def get_due(self):
         if self.charge_status == OrderChargeStatus.DUE:
@@ -374,8 +377,7 @@ class OrderLineItem(MonetaryMixin, models.Model):
     tax_rate = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, help_text=_("Tax rate at the time of the order"))
 
     def total_in_units(self): #subunit -to-unit 
-        precision = get_currency_precision(self.currency)
-        unit = self.total_price / (10 ** precision)
+        unit = self.total_price / get_currency_formatter(self.currency).subunit_factor
         return unit
 
     def humanize_total_price(self, locale='en_US'):
@@ -387,7 +389,7 @@ class OrderLineItem(MonetaryMixin, models.Model):
             str: The formatted total price with the currency symbol.
         """
         if locale:
-            return format_currency(self.total_in_units(), self.currency, locale='en_US')
+            return get_currency_formatter(self.currency, 'en_US').format(self.total_in_units())
         return self.total_in_units()
         
     
@@ -399,7 +401,7 @@ class OrderLineItem(MonetaryMixin, models.Model):
         Returns:
             str: The formatted price per unit with the currency symbol.
         """
-        return format_currency(self.price_per_unit, self.currency, locale='en_US')
+        return get_currency_formatter(self.currency, 'en_US').format(self.price_per_unit)
 
 
     def __str__(self):
@@ -429,6 +431,10 @@ class ReturnRequest(AbstractBaseUUIDModel):
     rejected_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     cancelled_at = models.DateTimeField(null=True, blank=True)
+    sales_deducted = models.BooleanField(
+        default=False,
+        help_text="Whether the returned quantities have been taken off the product sales counters."
+    )
 
 class ReturnLineItem(models.Model):
     return_request = models.ForeignKey(ReturnRequest, on_delete=models.CASCADE, related_name="line_items")
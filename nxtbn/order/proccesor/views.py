@@ -5,91 +5,54 @@ from rest_framework import status
 from django.db import transaction
 
 from nxtbn.core import CurrencyTypes
-from nxtbn.core.utils import apply_exchange_rate, build_currency_amount
+from nxtbn.core.utils import SubunitMoney, apply_exchange_rate, build_currency_amount
 from nxtbn.discount import PromoCodeType
 from nxtbn.discount.models import PromoCode
+from nxtbn.discount.utils import PromoCodeEvaluator, redeem_promo_code
 from nxtbn.order import AddressType, OrderAuthorizationStatus, OrderChargeStatus, OrderStatus
 from nxtbn.order.proccesor.serializers import OrderEstimateSerializer
 from nxtbn.order.models import Address, Order, OrderDeviceMeta, OrderLineItem
 from nxtbn.product.models import Product, ProductVariant
 from decimal import Decimal, InvalidOperation
+import uuid
 
-from nxtbn.shipping.models import ShippingRate
-from nxtbn.tax.models import TaxRate
+from nxtbn.shipping.utils import get_shipping_rate_table
+from nxtbn.tax.utils import get_tax_rate_table
 
 from django.db.models import Q
 from rest_framework import serializers
-from nxtbn.core.currency.backend import currency_Backend
+from nxtbn.core.currency.backend import get_currency_backend
 
 from nxtbn.core.signal_initiators import order_created
 from nxtbn.users import UserRole
 
+from nxtbn.order.stock import reserve_stock
 from nxtbn.order.utils import parse_user_agent
 class ShippingFeeCalculator:
-    def get_shipping_rate_instance(self, shipping_method_id, address):
+    def get_shipping_rate_instance(self, shipping_method_id, address, total_weight=None):
+        """
+        Resolves the ShippingRate from the in-memory rate table of the shipping method.
+        Hierarchy: City > State > Country > Global, restricted to the weight band that contains total_weight.
+        """
         if not shipping_method_id:
             return None
 
         if not address:
             raise ValueError("Address is required when a shipping method ID is provided.")
 
-        shipping_rate_qs = ShippingRate.objects.filter(shipping_method__id=shipping_method_id)
-
-        # Check for a rate defined at the city level
-        if address.get('city'):
-            rate = shipping_rate_qs.filter(
-                city=address['city'].lower(),
-                country=address['country'].upper(),
-                region=address['state'].lower() if address.get('state') else None,
-            ).first()
-            if rate:
-                return rate
-
-        # Check for a rate defined at the state level
-        if address.get('state'):
-            if rate:
-                rate = shipping_rate_qs.filter(
-                    region=address['state'].lower(),
-                    city__isnull=True,
-                    country=address['country'].upper(),
-                ).first()
-                return rate
-
-        # Check for a rate at the country level if no state rate is found, nationwide
-        if address.get('country'):
-            rate = shipping_rate_qs.filter(country=address['country']).first()
-            if rate:
-                rate = shipping_rate_qs.filter(
-                    country=address['country'].upper(),
-                    region__isnull=True,
-                    city__isnull=True
-                ).first()
-                return rate
-            
-        # Global
-        if not address.get('country'):
-            rate = shipping_rate_qs.filter(country=address['country']).first()
-            if rate:
-                rate = shipping_rate_qs.filter(
-                    country__isnull=True,
-                    region__isnull=True,
-                    city__isnull=True
-                ).first()
-                return rate
-        else:
+        rate = get_shipping_rate_table(shipping_method_id).resolve(address, total_weight)
+        if rate is None:
             raise serializers.ValidationError({"details": "We don't ship to this location."})
-
-        # If no rate is found for the address, raise an exception
-        raise ValueError("No shipping rate available for the provided location.")
+        return rate
 
     def get_shipping_fee_by_rate(self, shipping_method_id, address, total_weight):
-        rate_instance = self.get_shipping_rate_instance(shipping_method_id, address)
+        rate_instance = self.get_shipping_rate_instance(shipping_method_id, address, total_weight)
         if not rate_instance:
             custom_shipping_amount = self.validated_data.get('custom_shipping_amount', {})
             if custom_shipping_amount:
-                return Decimal(custom_shipping_amount['price']), custom_shipping_amount.get('name', '-')
+                return SubunitMoney.from_decimal(custom_shipping_amount['price'], self.currency), custom_shipping_amount.get('name', '-')
             else:
-                return Decimal('0.00'), '-'
+                return SubunitMoney.zero(self.currency), '-'
 
         # Calculate shipping fee based on weight
         base_weight = rate_instance.weight_min
@@ -104,7 +67,7 @@ class ShippingFeeCalculator:
 
         shipping_name = rate_instance.name if hasattr(rate_instance, 'name') else 'Standard Shipping'
 
-        return shipping_fee, shipping_name
+        return SubunitMoney.from_decimal(shipping_fee, self.currency), shipping_name
 
     def get_total_shipping_fee(self, variants, shipping_method_id, address):
         total_weight = self.get_total_weight(variants)
@@ -121,25 +84,28 @@ class TaxCalculator:
         """
         Calculate tax based on each product's tax_class and the applicable TaxRate.
         Hierarchy for TaxRate: State > Country
-        """
-        from collections import defaultdict
 
+        The resolved rate is stored on every variant as 'tax_rate', so creating the order
+        reuses it instead of resolving it again per line item.
+
+        Amounts are SubunitMoney; the discount is split across tax classes so that the parts
+        add up to the discount exactly, and each class's tax is rounded once to the currency's precision.
+        """
         # Group subtotal by tax_class
-        tax_class_subtotals = defaultdict(Decimal)
+        tax_class_subtotals = {}
         for variant in variants:
             tax_class = variant['tax_class']
-            variant_subtotal = variant['quantity'] * variant['price']
-            tax_class_subtotals[tax_class] += variant_subtotal
+            tax_class_subtotals[tax_class] = tax_class_subtotals.get(tax_class, SubunitMoney.zero(self.currency)) + variant['line_total']
 
-        # Calculate total subtotal for proportional discount allocation
-        total_subtotal = sum(tax_class_subtotals.values())
-        if total_subtotal > 0 and discount > 0:
-            for tax_class in tax_class_subtotals:
-                # Allocate discount proportionally based on subtotal
-                tax_class_subtotals[tax_class] -= (tax_class_subtotals[tax_class] / total_subtotal) * discount
+        # Allocate discount proportionally based on subtotal
+        if discount:
+            allocations = discount.allocate(subtotal.subunits for subtotal in tax_class_subtotals.values())
+            for tax_class, allocation in zip(list(tax_class_subtotals), allocations):
+                tax_class_subtotals[tax_class] -= allocation
 
-        estimated_tax = Decimal('0.00')
+        estimated_tax = SubunitMoney.zero(self.currency)
         tax_details = []
+        resolved_rates = {}
 
         for tax_class, class_subtotal in tax_class_subtotals.items():
             tax_rate_instance = self.get_tax_rate(tax_class, shipping_address)
@@ -149,8 +115,9 @@ class TaxCalculator:
             else:
                 tax_rate = Decimal('0.00')
                 tax_type = 'No Tax'
+            resolved_rates[tax_class] = tax_rate_instance.rate if tax_rate_instance else Decimal('0.00')
 
-            class_tax = (class_subtotal * tax_rate).quantize(Decimal('0.01'))
+            class_tax = class_subtotal.multiply(tax_rate)
             estimated_tax += class_tax
 
             tax_details.append({
@@ -159,30 +126,25 @@ class TaxCalculator:
                 'tax_amount': str(class_tax),
             })
 
+        for variant in variants:
+            variant['tax_rate'] = resolved_rates[variant['tax_class']]
+
         return estimated_tax, tax_details
 
     def get_tax_rate(self, tax_class, shipping_address):
         """
-        Retrieve the applicable TaxRate for a given tax_class and shipping_address.
+        Retrieve the applicable TaxRate for a given tax_class and shipping_address
+        from the process-local tax rate table.
         Hierarchy: State > Country
         """
-        tax_rate_instance = None
-
-        if 'state' in shipping_address and shipping_address['state']:
-            tax_rate_instance = TaxRate.objects.filter(
-                tax_class=tax_class,
-                state=shipping_address['state'],
-                is_active=True
-            ).first()
-
-        if not tax_rate_instance and 'country' in shipping_address and shipping_address['country']:
-            tax_rate_instance = TaxRate.objects.filter(
-                tax_class=tax_class,
-                country=shipping_address['country'],
-                is_active=True
-            ).first()
+        if not shipping_address:
+            return None
 
-        return tax_rate_instance
+        return get_tax_rate_table().resolve(
+            tax_class,
+            shipping_address.get('country'),
+            shipping_address.get('state'),
+        )
 
 
 class DiscountCalculator:
@@ -190,17 +152,19 @@ class DiscountCalculator:
         """
         Calculate discount based on custom discount amount and/or promo code.
         Priority can be given to promo code over custom discount or vice versa based on business logic.
+
+        `subtotal` and the returned discount are SubunitMoney.
         """
-        discount = Decimal('0.00')
+        discount = SubunitMoney.zero(subtotal.currency)
         discount_name = 'No Discount'
 
         # Apply Promo Code Discount if available
         if promocode:
             if promocode.code_type == PromoCodeType.FIXED_AMOUNT:
-                discount = promocode.value
+                discount = SubunitMoney.from_decimal(promocode.value, subtotal.currency)
                 discount_name = f"Promo Code {promocode.code}"
             elif promocode.code_type == PromoCodeType.PERCENTAGE:
-                discount = (subtotal * promocode.value) / Decimal('100')
+                discount = subtotal.multiply(promocode.value / Decimal('100'))
                 discount_name = f"Promo Code {promocode.code} ({promocode.value}%)"
             # Ensure discount does not exceed subtotal
             discount = min(discount, subtotal)
@@ -208,10 +172,10 @@ class DiscountCalculator:
         # Apply Custom Discount if available and no Promo Code is used
         elif custom_discount_amount:
             try:
-                discount = Decimal(custom_discount_amount['price'])
+                discount = SubunitMoney.from_decimal(custom_discount_amount['price'], subtotal.currency)
                 discount_name = custom_discount_amount.get('name', 'Custom Discount')
                 discount = min(discount, subtotal)
-            except (KeyError, InvalidOperation):
+            except (KeyError, InvalidOperation, ValueError):
                 raise serializers.ValidationError({"custom_discount_amount": "Invalid discount amount."})
 
         return discount, discount_name
@@ -226,29 +190,19 @@ class DiscountCalculator:
         return promocode
     
     def get_promocode_instance(self, promocode):
+        """
+        Returns the PromoCode for the given code if every rule passes for this cart.
+        The evaluation is memoized, so the estimate and the order creation share it.
+        """
         if promocode:
-            variant_aliases = [v['alias'] for v in self.validated_data['variants']]
-            try:
-                promocode = PromoCode.objects.get(code=promocode.upper())
-                if not promocode.is_active:
-                    raise serializers.ValidationError("Promo code is not active.")
-                if not promocode.is_valid_customer(self.customer):
-                    raise serializers.ValidationError("This promo code is restricted to specific customers and is not valid for you.")
-                if not promocode.is_valid_product(variant_aliases):
-                    raise serializers.ValidationError("Promo code is not valid for one or more of the products in your cart.")
-                if not promocode.is_valid_min_purchase(self.customer):
-                    raise serializers.ValidationError("Promo code is not valid for your purchase amount.")
-                if not promocode.is_valid_redemption_limit(self.customer):
-                    raise serializers.ValidationError("Promo code has reached its redemption limit.")
-                if not promocode.is_valid_usage_limit_per_customer(self.customer):
-                    raise serializers.ValidationError("Promo code has reached its usage limit for you.")
-                if not promocode.is_valid_new_customer(self.customer):
-                    raise serializers.ValidationError("Promo code is only valid for new customers.")
-                
-                
-                return promocode
-            except PromoCode.DoesNotExist:
-                raise serializers.ValidationError("Promo code does not exist.")
+            evaluation = self.promocode_evaluator.evaluate(
+                promocode,
+                customer=self.customer,
+                product_ids=[variant['variant'].product_id for variant in self.variants],
+            )
+            if not evaluation.is_valid:
+                raise serializers.ValidationError(evaluation.messages[0])
+            return evaluation.promo_code
         return None
 
 
@@ -257,14 +211,15 @@ class OrderCreator:
         """
         Creates and saves an Order instance based on the pre-calculated data.
         Also creates corresponding OrderLineItems.
+
+        The number of statements is fixed regardless of the number of line items:
+        each distinct address is resolved once and line items are written with a single bulk insert.
         """
         with transaction.atomic():
             shipping_address = self.validated_data.get('shipping_address', {})
             billing_address = self.validated_data.get('billing_address', {})
         
-            custom_discount_amount = self.validated_data.get('custom_discount_amount')
             promocode = self.get_promocode_instance(self.validated_data.get('promocode'))
-            shipping_method_id = self.validated_data.get('shipping_method_id', '')
 
             shipping_address_id = self.validated_data.get('shipping_address_id', None)
             billing_address_id = self.validated_data.get('billing_address_id', None)
@@ -284,8 +239,8 @@ class OrderCreator:
                 else:
                     billing_address_id = shipping_address_id
 
-            shipping_address = self.validated_data.get('shipping_address', {})
-            billing_address = self.validated_data.get('billing_address', {})
+            # Deduct stock before writing anything, so an oversold line aborts the whole order
+            reserve_stock((variant['variant'], variant['quantity']) for variant in self.variants)
 
             # Prepare Order data
             customer_currency = self.validated_data.get('customer_currency', CurrencyTypes.USD)
@@ -293,20 +248,21 @@ class OrderCreator:
                 "user_id": self.customer,
                 "supplier": self.validated_data.get('supplier'),
 
-                "shipping_address": self.get_or_create_address(shipping_address),
-                "billing_address": self.get_or_create_address(billing_address),
+                "shipping_address_id": shipping_address_id,
+                "billing_address_id": billing_address_id,
 
-                "currency": self.validated_data.get('currency', CurrencyTypes.USD),
-                "total_price": int(self.total * 100),  #  total is in units, convert to cents/subunits
+                "currency": self.currency,
+                "total_price": self.total.subunits,
                 "customer_currency": self.validated_data.get('customer_currency', CurrencyTypes.USD),
-                "total_price_in_customer_currency": build_currency_amount(self.total, customer_currency),
+                "total_price_in_customer_currency": build_currency_amount(self.total.to_decimal(), customer_currency),
                 "status": OrderStatus.PENDING,
                 "authorize_status": OrderAuthorizationStatus.NONE,
                 "charge_status": OrderChargeStatus.DUE,
+                "stock_reserved": True,
                 "promo_code": promocode,
-                "total_shipping_cost": int(self.shipping_fee * 100),  # Convert to cents
-                "total_discounted_amount": int(self.discount * 100),  # Convert to cents
-                "total_tax": int(self.estimated_tax * 100),  # Convert to cents
+                "total_shipping_cost": self.shipping_fee.subunits,
+                "total_discounted_amount": self.discount.subunits,
+                "total_tax": self.estimated_tax.subunits,
                 'order_source': self.order_source,
                 'note': self.validated_data.get('note', ''),
             }
@@ -314,21 +270,25 @@ class OrderCreator:
             # Create Order instance
             order = Order.objects.create(**order_data)
 
-            # Create OrderLineItems
-            for variant in self.variants:
-                OrderLineItem.objects.create(
+            if promocode:
+                # Enforces the redemption limits with conditional UPDATEs; a race lost here rolls back the order
+                redeem_promo_code(promocode, order, user=self.customer)
+
+            # Create OrderLineItems in one statement
+            OrderLineItem.objects.bulk_create([
+                OrderLineItem(
                     order=order,
                     variant=variant['variant'],
                     quantity=variant['quantity'],
                     price_per_unit=variant['price'],
                     currency=order.currency,
-                    total_price=int(variant['quantity'] * variant['price'] * 100),  # Convert to cents
+                    total_price=variant['line_total'].subunits,
                     customer_currency=order.customer_currency,
-                    total_price_in_customer_currency=variant['quantity'] * variant['price'],
-                    tax_rate=self.get_tax_rate(variant['tax_class'], shipping_address).rate if self.get_tax_rate(variant['tax_class'], shipping_address) else Decimal('0.00'),
+                    total_price_in_customer_currency=variant['line_total'].to_decimal(),
+                    tax_rate=variant['tax_rate'],
                 )
-
-            print(self.collect_user_agent, self.request.user.username)
+                for variant in self.variants
+            ])
 
             if self.collect_user_agent:
                 try:
@@ -342,25 +302,31 @@ class OrderCreator:
     def get_or_create_address(self, address_data):
         """
         Retrieves an existing Address or creates a new one based on the provided data.
+        Addresses are memoized per calculation, so identical payloads (e.g. the same shipping
+        and billing address) hit the database only once.
         """
         if not address_data:
             return None
 
         # Assuming address_data contains enough information to uniquely identify an address
-        address, created = Address.objects.get_or_create(
-            user_id=self.customer,
-            first_name=address_data.get('first_name', ''),
-            last_name=address_data.get('last_name', ''),
-            phone_number=address_data.get('phone_number', ''),
-            email_address=address_data.get('email_address', ''),
-            address_type=address_data.get('address_type', AddressType.DSA_DBA),
-            street_address=address_data.get('street_address', ''),
-            city=address_data.get('city', ''),
-            state=address_data.get('state', ''),
-            country=address_data.get('country', ''),
-            defaults=address_data
-        )
-        return address
+        lookup = {
+            'user_id': self.customer,
+            'first_name': address_data.get('first_name', ''),
+            'last_name': address_data.get('last_name', ''),
+            'phone_number': address_data.get('phone_number', ''),
+            'email_address': address_data.get('email_address', ''),
+            'address_type': address_data.get('address_type', AddressType.DSA_DBA),
+            'street_address': address_data.get('street_address', ''),
+            'city': address_data.get('city', ''),
+            'state': address_data.get('state', ''),
+            'country': address_data.get('country', ''),
+        }
+        key = (tuple(lookup.items()), tuple(sorted(address_data.items())))
+
+        if key not in self.resolved_addresses:
+            address, created = Address.objects.get_or_create(**lookup, defaults=address_data)
+            self.resolved_addresses[key] = address
+        return self.resolved_addresses[key]
 
 class OrderCalculation(ShippingFeeCalculator, TaxCalculator, DiscountCalculator, OrderCreator):
     def __init__(self, validated_data, order_source, create_order=False, collect_user_agent=False, request=None):
@@ -370,6 +336,10 @@ class OrderCalculation(ShippingFeeCalculator, TaxCalculator, DiscountCalculator,
         self.collect_user_agent = collect_user_agent
         self.request = request
         self.customer = self.validated_data.get('customer_id', None)
+        # Every amount below is a SubunitMoney in this currency, from the line totals to the order total
+        self.currency = self.validated_data.get('currency', CurrencyTypes.USD)
+        self.resolved_addresses = {}
+        self.promocode_evaluator = PromoCodeEvaluator()
         self.variants = self.get_variants()
         self.total_subtotal = self.get_subtotal(self.variants)
         self.total_items = self.get_total_items(self.variants)
@@ -378,7 +348,9 @@ class OrderCalculation(ShippingFeeCalculator, TaxCalculator, DiscountCalculator,
             self.validated_data.get('custom_discount_amount'),
             self.get_promocode_instance(self.validated_data.get('promocode'))
         )
-        self.discount_percentage = (self.discount / self.total_subtotal * 100) if self.total_subtotal > 0 else 0
+        self.discount_percentage = (
+            Decimal(self.discount.subunits) / self.total_subtotal.subunits * 100
+        ) if self.total_subtotal.subunits > 0 else 0
         self.shipping_fee, self.shipping_name = self.get_total_shipping_fee(
             self.variants,
             self.validated_data.get('shipping_method_id', ''),
@@ -392,18 +364,18 @@ class OrderCalculation(ShippingFeeCalculator, TaxCalculator, DiscountCalculator,
         self.total = self.total_subtotal - self.discount + self.shipping_fee + self.estimated_tax
 
     def get_response(self):
-        exchange_rate = currency_Backend().get_exchange_rate(self.request.currency)
+        exchange_rate = get_currency_backend().get_exchange_rate(self.request.currency)
         response_data = {
-            "subtotal":  apply_exchange_rate(self.total_subtotal, exchange_rate, self.request.currency, 'en_US'),
+            "subtotal":  apply_exchange_rate(self.total_subtotal.to_decimal(), exchange_rate, self.request.currency, 'en_US'),
             "total_items": self.total_items,
-            "discount": apply_exchange_rate(self.discount, exchange_rate, self.request.currency, 'en_US'),
+            "discount": apply_exchange_rate(self.discount.to_decimal(), exchange_rate, self.request.currency, 'en_US'),
             "discount_percentage": self.discount_percentage,
             "discount_name": self.discount_name,
-            "shipping_fee": apply_exchange_rate(self.shipping_fee, exchange_rate, self.request.currency, 'en_US'),
+            "shipping_fee": apply_exchange_rate(self.shipping_fee.to_decimal(), exchange_rate, self.request.currency, 'en_US'),
             "shipping_name": self.shipping_name,
-            "estimated_tax": apply_exchange_rate(self.estimated_tax, exchange_rate, self.request.currency, 'en_US'),
+            "estimated_tax": apply_exchange_rate(self.estimated_tax.to_decimal(), exchange_rate, self.request.currency, 'en_US'),
             "tax_details": self.tax_details,
-            "total": apply_exchange_rate(self.total, exchange_rate, self.request.currency, 'en_US'),
+            "total": apply_exchange_rate(self.total.to_decimal(), exchange_rate, self.request.currency, 'en_US'),
         }
         return response_data
 
@@ -413,43 +385,57 @@ class OrderCalculation(ShippingFeeCalculator, TaxCalculator, DiscountCalculator,
         variants = []
         stock_errors = []
 
-        for variant_data in variants_data:
-            try:
-                variant = ProductVariant.objects.get(alias=variant_data['alias'])
-                quantity = variant_data['quantity']
-                weight = variant.weight_value if variant.weight_value is not None else Decimal('0.00')
-
-                # Stock validation with backorder consideration
-                if variant.track_inventory and not variant.allow_backorder and variant.stock < quantity:
-                # if variant.track_inventory and variant.stock < quantity:
-                    product_name = variant.product.name
-                    # Determine inventory name: prefer variant.name, fallback to sku
-                    inventory_name = variant.name if variant.name else variant.sku
-                    stock_errors.append(
-                        f"Insufficient stock for product '{product_name}', inventory '{inventory_name}'."
-                    )
-
-                variants.append({
-                    'variant': variant,
-                    'quantity': quantity,
-                    'weight': weight,
-                    'price': variant.price,
-                    'tax_class': variant.product.tax_class,
-                })
+        # Load every requested variant, with its product and tax class, in a single query
+        aliases = {self._parse_alias(variant_data['alias']) for variant_data in variants_data} - {None}
+        variants_by_alias = {
+            variant.alias: variant
+            for variant in ProductVariant.objects.filter(alias__in=aliases).select_related('product', 'product__tax_class')
+        }
 
-            except ProductVariant.DoesNotExist:
+        for variant_data in variants_data:
+            variant = variants_by_alias.get(self._parse_alias(variant_data['alias']))
+            if variant is None:
                 raise serializers.ValidationError({
                     "variants": f"Variant with alias '{variant_data['alias']}' not found."
                 })
 
+            quantity = variant_data['quantity']
+            weight = variant.weight_value if variant.weight_value is not None else Decimal('0.00')
+
+            # Stock validation with backorder consideration
+            if variant.track_inventory and not variant.allow_backorder and variant.stock < quantity:
+                product_name = variant.product.name
+                # Determine inventory name: prefer variant.name, fallback to sku
+                inventory_name = variant.name if variant.name else variant.sku
+                stock_errors.append(
+                    f"Insufficient stock for product '{product_name}', inventory '{inventory_name}'."
+                )
+
+            variants.append({
+                'variant': variant,
+                'quantity': quantity,
+                'weight': weight,
+                'price': variant.price,
+                # Rounded once per line, so the line totals always add up to the subtotal
+                'line_total': SubunitMoney.from_decimal(quantity * variant.price, self.currency),
+                'tax_class': variant.product.tax_class,
+            })
+
         if stock_errors:
             # Combine all stock error messages into one response
             raise serializers.ValidationError(stock_errors)
 
         return variants
 
+    @staticmethod
+    def _parse_alias(alias):
+        try:
+            return uuid.UUID(str(alias))
+        except ValueError:
+            return None
+
     def get_subtotal(self, variants):
-        return sum(variant['quantity'] * variant['price'] for variant in variants)
+        return sum((variant['line_total'] for variant in variants), SubunitMoney.zero(self.currency))
 
     def get_total_items(self, variants):
         return sum(variant['quantity'] for variant in variants)
@@ -1,8 +1,17 @@
+from django.db.models.signals import post_save
 from django.dispatch import receiver
 from nxtbn.cart.utils import remove_ordered_items_from_cart
 from nxtbn.core.signal_initiators import order_created
+from nxtbn.order import ReturnStatus
+from nxtbn.order.models import ReturnRequest
+from nxtbn.order.sales import deduct_returned_sales
 
 @receiver(order_created)
 def handle_post_order_create(sender, order, request, **kwargs):
     remove_ordered_items_from_cart(order, request=request)
-   
+
+
+@receiver(post_save, sender=ReturnRequest)
+def handle_completed_return(sender, instance, **kwargs):
+    if instance.status == ReturnStatus.COMPLETED and not instance.sales_deducted:
+        deduct_returned_sales(instance)
@@ -0,0 +1,128 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from nxtbn.order import OrderStatus
+from nxtbn.product.utils import record_sales
+
+
+# Order statuses in which the items of an order count as sold.
+SALES_COUNTING_STATUSES = [
+    OrderStatus.APPROVED,
+    OrderStatus.PROCESSING,
+    OrderStatus.SHIPPED,
+    OrderStatus.DELIVERED,
+    OrderStatus.PENDING_RETURN,
+]
+
+
+def get_order_sales(order):
+    """
+    Returns {(variant_id, product_id, day): quantity} of the items of `order` that were not returned,
+    `day` being the day the order was placed.
+    """
+    from nxtbn.order.models import ReturnLineItem
+
+    day = timezone.localdate(order.created_at)
+    returned = dict(
+        ReturnLineItem.objects.filter(return_request__order=order, return_request__sales_deducted=True)
+        .values('order_line_item__variant_id')
+        .annotate(quantity=Sum('quantity'))
+        .values_list('order_line_item__variant_id', 'quantity')
+    )
+
+    sales = defaultdict(int)
+    lines = order.line_items.values('variant_id', 'variant__product_id').annotate(quantity=Sum('quantity')).order_by()
+    for line in lines:
+        quantity = line['quantity'] - returned.get(line['variant_id'], 0)
+        if quantity > 0:
+            sales[(line['variant_id'], line['variant__product_id'], day)] += quantity
+    return sales
+
+
+def count_order_sales(order):
+    """
+    Adds the items of `order` to the product sales counters.
+
+    The order's `sales_counted` flag is set with a conditional UPDATE first, so an order is counted
+    at most once however many times it moves between counted statuses.
+
+    Returns:
+        bool: True if the order was counted, False if it already was.
+    """
+    from nxtbn.order.models import Order
+
+    with transaction.atomic():
+        if not Order.objects.filter(pk=order.pk, sales_counted=False).update(sales_counted=True):
+            return False
+        order.sales_counted = True
+        record_sales(get_order_sales(order))
+    return True
+
+
+def uncount_order_sales(order):
+    """
+    Takes the items of `order` that were not returned yet off the product sales counters,
+    e.g. when it is cancelled or returned as a whole.
+
+    Returns:
+        bool: True if the order was uncounted, False if it was not counted.
+    """
+    from nxtbn.order.models import Order
+
+    with transaction.atomic():
+        if not Order.objects.filter(pk=order.pk, sales_counted=True).update(sales_counted=False):
+            return False
+        order.sales_counted = False
+        record_sales({key: -quantity for key, quantity in get_order_sales(order).items()})
+    return True
+
+
+def deduct_returned_sales(return_request):
+    """
+    Takes the items of a completed return request off the product sales counters, at most once.
+
+    The order row is locked first, so this cannot interleave with the order being counted or uncounted.
+
+    Returns:
+        bool: True if the returned items were deducted, False if they already were.
+    """
+    from nxtbn.order.models import Order, ReturnRequest
+
+    with transaction.atomic():
+        order = Order.objects.select_for_update().only('sales_counted', 'created_at').get(pk=return_request.order_id)
+        if not ReturnRequest.objects.filter(pk=return_request.pk, sales_deducted=False).update(sales_deducted=True):
+            return False
+        return_request.sales_deducted = True
+
+        # An order that is not counted is recounted without the returned items
+        if not order.sales_counted:
+            return True
+
+        day = timezone.localdate(order.created_at)
+        returned = (
+            return_request.line_items
+            .values('order_line_item__variant_id', 'order_line_item__variant__product_id')
+            .annotate(quantity=Sum('quantity'))
+            .order_by()
+        )
+        record_sales({
+            (line['order_line_item__variant_id'], line['order_line_item__variant__product_id'], day): -line['quantity']
+            for line in returned
+        })
+    return True
+
+
+def handle_order_sales_change(order, previous_status):
+    """
+    Counts an order that entered a counted status, and uncounts it when it leaves them.
+    """
+    if order.status == previous_status:
+        return
+
+    if order.status in SALES_COUNTING_STATUSES:
+        count_order_sales(order)
+    else:
+        uncount_order_sales(order)
@@ -0,0 +1,111 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Sum
+from rest_framework import serializers
+
+from nxtbn.order import OrderStatus
+from nxtbn.order.sales import handle_order_sales_change
+from nxtbn.product.models import ProductVariant
+from nxtbn.product.utils import adjust_product_stock
+
+
+# Order statuses that give the reserved stock of an order back to inventory.
+STOCK_RELEASING_STATUSES = [OrderStatus.CANCELLED]
+
+
+def reserve_stock(lines):
+    """
+    Atomically decrements ProductVariant.stock for every tracked variant of an order.
+
+    Args:
+        lines: An iterable of (variant, quantity) pairs. Repeated variants are summed.
+
+    Each variant is decremented with a single conditional UPDATE (`stock >= quantity`), so two
+    concurrent checkouts can never both take the last unit. Rows are updated in ascending id order,
+    which keeps the lock order consistent across transactions and prevents deadlocks.
+    Variants that allow backorder are decremented unconditionally and may go below zero.
+
+    Must be called inside `transaction.atomic()`; the raised error rolls back every decrement.
+
+    Raises:
+        serializers.ValidationError: Listing every variant that does not have enough stock.
+    """
+    quantities = defaultdict(int)
+    variants = {}
+    for variant, quantity in lines:
+        if not variant.track_inventory:
+            continue
+        quantities[variant.id] += quantity
+        variants[variant.id] = variant
+
+    stock_errors = []
+    stock_changes = defaultdict(int)
+    for variant_id in sorted(quantities):
+        variant = variants[variant_id]
+        quantity = quantities[variant_id]
+
+        variant_qs = ProductVariant.objects.filter(id=variant_id)
+        if not variant.allow_backorder:
+            variant_qs = variant_qs.filter(stock__gte=quantity)
+
+        if not variant_qs.update(stock=F('stock') - quantity):
+            inventory_name = variant.name if variant.name else variant.sku
+            stock_errors.append(
+                f"Insufficient stock for product '{variant.product.name}', inventory '{inventory_name}'."
+            )
+        else:
+            stock_changes[variant.product_id] -= quantity
+
+    if stock_errors:
+        raise serializers.ValidationError(stock_errors)
+
+    adjust_product_stock(stock_changes)
+
+
+def release_stock(order):
+    """
+    Gives the stock reserved by `order` back to inventory.
+
+    The order's `stock_reserved` flag is cleared with a conditional UPDATE first, so the stock of an
+    order is released at most once even if two requests cancel it at the same time.
+
+    Returns:
+        bool: True if stock was released, False if the order held no reservation.
+    """
+    from nxtbn.order.models import Order
+
+    with transaction.atomic():
+        if not Order.objects.filter(pk=order.pk, stock_reserved=True).update(stock_reserved=False):
+            return False
+        order.stock_reserved = False
+
+        quantities = (
+            order.line_items
+            .values('variant_id', 'variant__product_id')
+            .annotate(quantity=Sum('quantity'))
+            .order_by('variant_id')
+        )
+        stock_changes = defaultdict(int)
+        for line in quantities:
+            if ProductVariant.objects.filter(
+                id=line['variant_id'],
+                track_inventory=True,
+            ).update(stock=F('stock') + line['quantity']):
+                stock_changes[line['variant__product_id']] += line['quantity']
+
+        adjust_product_stock(stock_changes)
+
+    return True
+
+
+def handle_order_status_change(order, previous_status):
+    """
+    Applies the stock and sales counter side effects of an order status transition.
+    """
+    if order.status == previous_status:
+        return
+
+    if order.status in STOCK_RELEASING_STATUSES:
+        release_stock(order)
+    handle_order_sales_change(order, previous_status)
@@ -1,3 +1,218 @@
-from django.test import TestCase
+import datetime
+import random
+import threading
+import time
+from decimal import Decimal
+from types import SimpleNamespace
 
-# Create your tests here.
+from django.db import OperationalError, connection
+from django.test.utils import CaptureQueriesContext
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from django_celery_beat.models import PeriodicTask
+from rest_framework import serializers
+
+from nxtbn.order import OrderStatus, ReturnStatus
+from nxtbn.order.models import Order, OrderLineItem, ReturnLineItem, ReturnRequest
+from nxtbn.order.proccesor.views import OrderCalculation
+from nxtbn.order.stock import handle_order_status_change
+from nxtbn.product.models import Category, Product, ProductType, ProductVariant, ProductVariantDailySales
+from nxtbn.product.utils import refresh_windowed_sales
+from nxtbn.users import UserRole
+from nxtbn.users.tests import UserFactory
+
+
+class OrderFixtureMixin:
+    initial_stock = 5
+
+    def setUp(self):
+        self.user = UserFactory(role=UserRole.ADMIN)
+        product = Product.objects.create(
+            created_by=self.user,
+            name='Stress Test Product',
+            summary='summary',
+            description='description',
+            category=Category.objects.create(name='Stress Test Category'),
+            product_type=ProductType.objects.create(name='Stress Test Type'),
+        )
+        self.variant = ProductVariant.objects.create(
+            product=product,
+            price=Decimal('10.00'),
+            cost_per_unit=Decimal('5.00'),
+            sku='STRESS-SKU',
+            track_inventory=True,
+            stock=self.initial_stock,
+        )
+
+    def place_order(self, quantity=1):
+        request = SimpleNamespace(user=self.user, currency='USD', META={})
+        validated_data = {'variants': [{'alias': str(self.variant.alias), 'quantity': quantity}]}
+        return OrderCalculation(validated_data, order_source='admin', create_order=True, request=request).create_order_instance()
+
+
+class OrderQueryCountTest(OrderFixtureMixin, TestCase):
+    address = {
+        'first_name': 'John', 'last_name': 'Doe', 'street_address': '1 Main St', 'city': 'Springfield',
+        'country': 'US', 'email_address': 'john@example.com',
+    }
+
+    def create_lines(self, count, track_inventory=False):
+        lines = []
+        for _ in range(count):
+            variant = ProductVariant.objects.create(
+                product=self.variant.product,
+                price=Decimal('10.00'),
+                cost_per_unit=Decimal('5.00'),
+                sku=f'QC-{ProductVariant.objects.count()}',
+                track_inventory=track_inventory,
+                stock=10,
+            )
+            lines.append({'alias': str(variant.alias), 'quantity': 2})
+        return lines
+
+    def order_calculation(self, lines):
+        request = SimpleNamespace(user=self.user, currency='USD', META={})
+        validated_data = {'variants': lines, 'shipping_address': dict(self.address), 'billing_address': dict(self.address)}
+        return OrderCalculation(validated_data, order_source='admin', create_order=True, request=request)
+
+    def count_order_queries(self, lines):
+        calculation = self.order_calculation(lines)
+        with CaptureQueriesContext(connection) as context:
+            order = calculation.create_order_instance()
+        self.assertEqual(order.line_items.count(), len(lines))
+        return len(context.captured_queries)
+
+    def test_variants_are_loaded_with_one_query(self):
+        for count in (1, 10):
+            calculation = self.order_calculation(self.create_lines(count))
+            with self.assertNumQueries(1):
+                variants = calculation.get_variants()
+            self.assertEqual(len(variants), count)
+            # Product and tax class come with the variant
+            with self.assertNumQueries(0):
+                [(line['variant'].product.name, line['tax_class']) for line in variants]
+
+    def test_order_creation_statements_do_not_grow_with_line_items(self):
+        self.order_calculation(self.create_lines(1)).create_order_instance() # creates the address
+        self.assertEqual(self.count_order_queries(self.create_lines(1)), self.count_order_queries(self.create_lines(10)))
+
+    def test_stock_reservation_costs_one_update_per_tracked_variant(self):
+        self.order_calculation(self.create_lines(1)).create_order_instance() # creates the address
+        one_line = self.count_order_queries(self.create_lines(1, track_inventory=True))
+        ten_lines = self.count_order_queries(self.create_lines(10, track_inventory=True))
+        self.assertEqual(ten_lines - one_line, 9)
+
+
+class StockReservationTest(OrderFixtureMixin, TransactionTestCase):
+    workers = 20
+    lock_retries = 200
+
+    def test_concurrent_orders_never_oversell(self):
+        barrier = threading.Barrier(self.workers)
+        placed = []
+        rejected = []
+        failed = []
+
+        def worker():
+            try:
+                barrier.wait()
+                for attempt in range(self.lock_retries):
+                    try:
+                        placed.append(self.place_order())
+                        return
+                    except serializers.ValidationError:
+                        rejected.append(True)
+                        return
+                    except OperationalError as error:
+                        # SQLite refuses a concurrent writer outright instead of waiting; try again
+                        if 'locked' not in str(error):
+                            raise
+                        time.sleep(random.uniform(0, 0.01))
+                failed.append(f"Still locked after {self.lock_retries} attempts")
+            except Exception as error:
+                failed.append(repr(error))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.variant.refresh_from_db()
+        self.assertEqual(failed, [])
+        self.assertEqual(len(placed) + len(rejected), self.workers)
+        self.assertGreaterEqual(len(placed), 1)
+        self.assertEqual(OrderLineItem.objects.aggregate(quantity=Sum('quantity'))['quantity'], self.initial_stock)
+        self.assertEqual(self.variant.stock, 0)
+        self.assertEqual(Order.objects.count(), len(placed))
+
+    def test_cancel_releases_stock_once(self):
+        order = self.place_order(quantity=3)
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, self.initial_stock - 3)
+
+        with self.assertRaises(serializers.ValidationError):
+            self.place_order(quantity=3)
+
+        order.status = OrderStatus.CANCELLED
+        order.save()
+        handle_order_status_change(order, OrderStatus.PENDING)
+        handle_order_status_change(order, OrderStatus.PENDING)
+
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, self.initial_stock)
+
+
+class SalesCounterTest(OrderFixtureMixin, TestCase):
+
+    def change_status(self, order, status):
+        previous_status = order.status
+        order.status = status
+        order.save()
+        handle_order_status_change(order, previous_status)
+
+    def assertSales(self, total, last_7_days, last_30_days):
+        product = Product.objects.get(pk=self.variant.product_id)
+        self.assertEqual(
+            (product.total_sales, product.sales_last_7_days, product.sales_last_30_days),
+            (total, last_7_days, last_30_days),
+        )
+
+    def test_counters_follow_order_statuses_and_returns(self):
+        order = self.place_order(quantity=3)
+        self.assertSales(0, 0, 0) # pending orders are not sold yet
+
+        self.change_status(order, OrderStatus.APPROVED)
+        self.change_status(order, OrderStatus.PROCESSING)
+        self.assertSales(3, 3, 3)
+        self.assertEqual(self.variant.sales.total_sales, 3)
+
+        return_request = ReturnRequest.objects.create(intiated_by=self.user, order=order, reason_details='damaged')
+        ReturnLineItem.objects.create(return_request=return_request, order_line_item=order.line_items.get(), quantity=1, reason_details='damaged')
+        return_request.status = ReturnStatus.COMPLETED
+        return_request.save()
+        return_request.save()
+        self.assertSales(2, 2, 2)
+
+        self.change_status(order, OrderStatus.RETURNED)
+        self.assertSales(0, 0, 0)
+        self.change_status(order, OrderStatus.DELIVERED)
+        self.assertSales(2, 2, 2)
+
+    def test_windows_drop_old_days(self):
+        order = self.place_order(quantity=2)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - datetime.timedelta(days=10))
+        order.refresh_from_db()
+        self.change_status(order, OrderStatus.APPROVED)
+        self.assertSales(2, 0, 2)
+
+        ProductVariantDailySales.objects.update(day=timezone.localdate() - datetime.timedelta(days=40))
+        refresh_windowed_sales()
+        self.assertSales(2, 0, 0)
+
+    def test_window_refresh_is_scheduled_daily(self):
+        task = PeriodicTask.objects.get(task='nxtbn.product.tasks.refresh_windowed_sales_task')
+        self.assertEqual((task.crontab.hour, task.crontab.minute), ('0', '5'))
@@ -4,6 +4,7 @@ from django. utils import timezone
 from nxtbn.core import CurrencyTypes, MoneyFieldTypes
 from nxtbn.core.mixin import MonetaryMixin
 from nxtbn.core.models import  AbstractBaseUUIDModel
+from nxtbn.core.utils import get_currency_formatter
 from nxtbn.order import OrderStatus
 from nxtbn.order.models import Order, ReturnRequest
 from django.utils.translation import gettext_lazy as _
@@ -18,7 +19,6 @@ from nxtbn.payment.payment_manager import PaymentManager
 from nxtbn.plugins import PluginType
 from nxtbn.plugins.manager import PluginPathManager
 from nxtbn.users.admin import User
-from babel.numbers import get_currency_precision, format_currency
 
 class Payment(MonetaryMixin, AbstractBaseUUIDModel):
     money_validator_map = {
@@ -65,13 +65,12 @@ class Payment(MonetaryMixin, AbstractBaseUUIDModel):
         super(Payment, self).save(*args, **kwargs)
 
     def payment_amount_in_units(self): #subunit -to-unit 
-        precision = get_currency_precision(self.currency)
-        unit = self.payment_amount / (10 ** precision)
+        unit = self.payment_amount / get_currency_formatter(self.currency).subunit_factor
         return unit
     
     def humanize_payment_amount(self, locale='en_US'):
         if locale:
-            return format_currency(self.payment_amount_in_units(), self.currency, locale=locale)
+            return get_currency_formatter(self.currency, locale).format(self.payment_amount_in_units())
         return self.payment_amount_in_units()
 
     def authorize_payment(self, amount: Decimal, **kwargs): # TO DO: Do we still need this method?
@@ -41,3 +41,22 @@ class StockStatus(models.TextChoices):
 
     IN_STOCK = 'IN_STOCK', 'In Stock'
     OUT_OF_STOCK = 'OUT_OF_STOCK', 'Out of Stock'
+
+
+class ImportJobStatus(models.TextChoices):
+    """Defines the stages of a bulk product import.
+
+    - 'PENDING': The file is uploaded and waiting for a worker.
+    - 'RUNNING': Rows are being imported.
+    - 'COMPLETED': Every row was processed; rejected rows are listed as errors.
+    - 'FAILED': The import stopped and can be resumed from the last imported chunk.
+    """
+
+    PENDING = 'PENDING', 'Pending'
+    RUNNING = 'RUNNING', 'Running'
+    COMPLETED = 'COMPLETED', 'Completed'
+    FAILED = 'FAILED', 'Failed'
+
+class ImportFileFormat(models.TextChoices):
+    CSV = 'csv', 'CSV'
+    JSONL = 'jsonl', 'JSON Lines'
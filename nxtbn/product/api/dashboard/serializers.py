@@ -6,7 +6,9 @@ from rest_framework.exceptions import ValidationError
 
 from nxtbn.core import PublishableStatus
 from nxtbn.filemanager.api.dashboard.serializers import ImageSerializer
-from nxtbn.product.models import Color, Product, Category, Collection, ProductTag, ProductType, ProductVariant
+from nxtbn.product import ImportFileFormat
+from nxtbn.product.models import Color, Product, Category, Collection, ProductImportError, ProductImportJob, ProductTag, ProductType, ProductVariant
+from nxtbn.product.utils import build_category_tree
 from nxtbn.tax.models import TaxClass
 from nxtbn.filemanager.models import Image
 
@@ -64,8 +66,10 @@ class RecursiveCategorySerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'description', 'children')
 
     def get_children(self, obj):
-        children = obj.subcategories.all()
-        return RecursiveCategorySerializer(children, many=True).data
+        # The whole subtree is built from one query instead of one query per node
+        if not obj.path:
+            return []
+        return build_category_tree(obj)[0]['children']
 
 class CollectionSerializer(serializers.ModelSerializer):
     images_details = ImageSerializer(read_only=True, source='image')
@@ -311,6 +315,7 @@ class ProductMutationSerializer(serializers.ModelSerializer):
                     instance.tax_class = tax_class_instance
 
         instance.save()
+        instance.refresh_from_db(fields=Product.SUMMARY_FIELDS)
         return instance
     
 
@@ -403,7 +408,8 @@ class ProductCreateSerializer(serializers.ModelSerializer):
                 instance.tax_class = TaxClass.objects.get(id=tax_class.id)
 
             instance.save()
-            
+
+        instance.refresh_from_db(fields=Product.SUMMARY_FIELDS)
         return instance
     
     def validate(self, attrs):
@@ -464,4 +470,71 @@ class ProductWithVariantSerializer(serializers.ModelSerializer):
     def get_product_thumbnail(self, obj):
         # Access the request from the context, if available
         request = self.context.get('request')
-        return obj.product_thumbnail(request) if request else None
\ No newline at end of file
+        return obj.product_thumbnail(request) if request else None
+
+
+class ProductImportJobSerializer(serializers.ModelSerializer):
+    file = serializers.FileField(write_only=True)
+    file_format = serializers.ChoiceField(choices=ImportFileFormat.choices, required=False)
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ProductImportJob
+        ref_name = 'product_import_job_dashboard'
+        fields = (
+            'alias',
+            'file',
+            'file_format',
+            'status',
+            'progress',
+            'total_rows',
+            'processed_rows',
+            'created_count',
+            'updated_count',
+            'error_count',
+            'message',
+            'created_at',
+            'started_at',
+            'finished_at',
+        )
+        read_only_fields = (
+            'alias',
+            'status',
+            'total_rows',
+            'processed_rows',
+            'created_count',
+            'updated_count',
+            'error_count',
+            'message',
+            'created_at',
+            'started_at',
+            'finished_at',
+        )
+
+    def get_progress(self, obj):
+        return obj.get_progress()
+
+    def validate(self, attrs):
+        if 'file_format' not in attrs:
+            extension = attrs['file'].name.rsplit('.', 1)[-1].lower()
+            if extension in ('jsonl', 'ndjson'):
+                attrs['file_format'] = ImportFileFormat.JSONL
+            elif extension == 'csv':
+                attrs['file_format'] = ImportFileFormat.CSV
+            else:
+                raise ValidationError({'file_format': _("Could not tell the format from the file name, please provide it.")})
+        return attrs
+
+    def create(self, validated_data):
+        from nxtbn.product.tasks import import_products_task
+
+        job = ProductImportJob.objects.create(created_by=self.context['request'].user, **validated_data)
+        transaction.on_commit(lambda: import_products_task.delay(job.pk))
+        return job
+
+
+class ProductImportErrorSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProductImportError
+        ref_name = 'product_import_error_dashboard'
+        fields = ('row', 'sku', 'errors')
@@ -18,6 +18,7 @@ from nxtbn.product.api.dashboard.views import (
     ProductWithVariantView,
     ProductMinimalListView,
     ProductListDetailVariantView,
+    ProductImportJobViewSet,
     TaxClassView
 
 )
@@ -30,6 +31,7 @@ router.register(r'colors', ColorViewSet)
 router.register(r'product-types', ProductTypeViewSet)
 router.register(r'product-tags', ProductTagViewSet)
 router.register(r'collections', CollectionViewSet)
+router.register(r'product-imports', ProductImportJobViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,12 +1,13 @@
 from django.forms import ValidationError
-from django.db.models import Sum, F
 
 from rest_framework import generics, status
 from rest_framework.response import Response
 from django.utils.translation import gettext_lazy as _
 from rest_framework.permissions  import AllowAny
 from rest_framework.exceptions import APIException
-from rest_framework import viewsets
+from rest_framework import mixins, viewsets
+from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 
 from rest_framework import filters as drf_filters
 import django_filters
@@ -14,12 +15,14 @@ from django_filters import rest_framework as filters
 
 from nxtbn.core import PublishableStatus
 from nxtbn.core.paginator import NxtbnPagination
-from nxtbn.product.models import Color, Product, Category, Collection, ProductTag, ProductType, ProductVariant
+from nxtbn.product.models import Color, Product, Category, Collection, ProductImportJob, ProductTag, ProductType, ProductVariant
 from nxtbn.product.api.dashboard.serializers import (
     BasicCategorySerializer,
     ColorSerializer,
     ProductCreateSerializer,
     ProductMinimalSerializer,
+    ProductImportErrorSerializer,
+    ProductImportJobSerializer,
     ProductMutationSerializer,
     ProductSerializer,
     CategorySerializer,
@@ -32,6 +35,10 @@ from nxtbn.product.api.dashboard.serializers import (
 )
 from nxtbn.core.admin_permissions import NxtbnAdminPermission
 from nxtbn.tax.models import TaxClass
+from nxtbn.product.importer import is_resumable
+from nxtbn.product.search import ProductSearchMatchFilter
+from nxtbn.product.tasks import import_products_task
+from nxtbn.product.utils import get_category_tree
 
 
 class ProductFilter(filters.FilterSet):
@@ -40,6 +47,9 @@ class ProductFilter(filters.FilterSet):
     variant_sku = filters.CharFilter(field_name='variants__sku', lookup_expr='iexact')
     created_at = filters.DateFromToRangeFilter(field_name='created_at') # eg. ?created_at_after=2023-09-01&created_at_before=2023-09-12
     promo_code = filters.CharFilter(field_name='promo_codes__code', lookup_expr='iexact')
+    in_stock = filters.BooleanFilter(method='filter_in_stock')
+    min_price = filters.NumberFilter(field_name='max_price', lookup_expr='gte') # has a variant priced at least this
+    max_price = filters.NumberFilter(field_name='min_price', lookup_expr='lte') # has a variant priced at most this
 
     class Meta:
         model = Product
@@ -58,37 +68,43 @@ class ProductFilter(filters.FilterSet):
             'tags',
             'created_at',
             'promo_code',
+            'in_stock',
+            'min_price',
+            'max_price',
         ]
 
+    def filter_in_stock(self, queryset, name, value):
+        if value:
+            return queryset.filter(total_stock__gt=0)
+        return queryset.filter(total_stock__lte=0)
+
 
 
 class ProductFilterMixin:
     filter_backends = [
         django_filters.rest_framework.DjangoFilterBackend,
-        drf_filters.SearchFilter,
+        ProductSearchMatchFilter, # the product search index, unranked so the ordering and cursor are kept
         drf_filters.OrderingFilter
     ] 
-    search_fields = ['name', 'brand']
     ordering_fields = [
         'name',
         'created_at',
         'status',
         'default_variant__price',
-        'total_sales'
+        'total_sales', # maintained counters, see nxtbn.order.sales
+        'sales_last_7_days',
+        'sales_last_30_days',
     ]
     filterset_class = ProductFilter
 
     def get_queryset(self):
-        if self.request.query_params.get('ordering', '') in ['total_sales', '-total_sales']:
-            return Product.objects.all().annotate(
-                total_sales=Sum(F('variants__orderlineitems__quantity'))
-            )
         return Product.objects.all()
 
 class ProductListView(ProductFilterMixin, generics.ListCreateAPIView):
     permission_classes = (NxtbnAdminPermission,)
     serializer_class = ProductSerializer
     pagination_class = NxtbnPagination
+    pagination_mode = 'cursor' # newest first unless `ordering` is given; `?pagination=page` keeps the Meta ordering by name
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -145,6 +161,9 @@ class RecursiveCategoryListView(generics.ListCreateAPIView):
     serializer_class = RecursiveCategorySerializer
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        return Response(get_category_tree())
+
 class CategoryByParentView(generics.ListAPIView):
     pagination_class = None
     permission_classes = (NxtbnAdminPermission,)
@@ -223,4 +242,45 @@ class TaxClassView(generics.ListCreateAPIView):
     queryset = TaxClass.objects.all()
     serializer_class = TaxClassSerializer
     permission_classes = (NxtbnAdminPermission,)
-    pagination_class = None
\ No newline at end of file
+    pagination_class = None
+
+
+class ProductImportJobViewSet(
+    mixins.CreateModelMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    Bulk catalog imports. POST a CSV or JSON Lines file (multipart, field `file`) to start one;
+    it runs in the background, so poll the job for its progress and list its rejected rows.
+    """
+    permission_classes = (NxtbnAdminPermission,)
+    queryset = ProductImportJob.objects.all()
+    serializer_class = ProductImportJobSerializer
+    pagination_class = NxtbnPagination
+    parser_classes = (MultiPartParser, FormParser, JSONParser)
+    lookup_field = 'alias'
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
+    @action(detail=True, methods=['post'])
+    def resume(self, request, alias=None):
+        job = self.get_object()
+        if not is_resumable(job):
+            return Response(
+                {'detail': _("Only pending, failed or stalled imports can be resumed.")},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        import_products_task.delay(job.pk)
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def errors(self, request, alias=None):
+        errors = self.get_object().errors.all()
+        page = self.paginate_queryset(errors)
+        serializer = ProductImportErrorSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
@@ -4,12 +4,11 @@ from rest_framework import serializers
 from django.db import transaction
 
 from nxtbn.core.models import CurrencyExchange
-from nxtbn.core.utils import apply_exchange_rate, get_in_user_currency
+from nxtbn.core.utils import apply_exchange_rate, get_currency_formatter, get_in_user_currency
 from nxtbn.product.api.dashboard.serializers import RecursiveCategorySerializer
 from nxtbn.filemanager.api.dashboard.serializers import ImageSerializer
 from nxtbn.product.models import Product, Collection, Category, ProductVariant
 
-from nxtbn.core.currency.backend import currency_Backend
 
 class CategorySerializer(RecursiveCategorySerializer):
     pass
@@ -29,6 +28,14 @@ class ProductVariantSerializer(serializers.ModelSerializer):
  
     def get_price(self, obj):
         target_currency = self.context['request'].currency
+
+        # Converted price from the price book, prefetched by the view
+        shopper_prices = getattr(obj, 'shopper_prices', None)
+        if shopper_prices:
+            shopper_price = shopper_prices[0]
+            amount = get_currency_formatter(shopper_price.currency).from_subunit(shopper_price.price)
+            return get_currency_formatter(target_currency, 'en_US').format(amount)
+
         converted_price = apply_exchange_rate(obj.price, self.context['exchange_rate'], target_currency, 'en_US')
         return converted_price
 
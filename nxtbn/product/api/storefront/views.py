@@ -6,6 +6,7 @@ from rest_framework.response import Response
 from django.utils.translation import gettext_lazy as _
 from rest_framework.permissions  import AllowAny
 from rest_framework.exceptions import APIException
+from django.db.models import OuterRef, Prefetch, Subquery
 
 from rest_framework import filters as drf_filters
 import django_filters
@@ -14,9 +15,13 @@ from django_filters import rest_framework as filters
 
 from nxtbn.core.paginator import NxtbnPagination
 from nxtbn.product.api.storefront.serializers import CategorySerializer, CollectionSerializer, ProductDetailSerializer, ProductWithDefaultVariantSerializer, ProductWithVariantSerializer
-from nxtbn.product.models import Category, Collection, Product
+from nxtbn.product.models import Category, Collection, Product, ProductType, ProductVariant, ProductVariantPrice
 from nxtbn.product.models import Supplier
-from nxtbn.core.currency.backend import currency_Backend
+from nxtbn.product.facets import get_facet_index
+from nxtbn.product.search import ProductSearchFilter
+from nxtbn.product.utils import get_category_subtrees, get_price_book_currency
+from nxtbn.core.currency.backend import get_currency_backend
+from nxtbn.core.utils import get_currency_formatter
 
 
 class ProductFilter(filters.FilterSet):
@@ -26,13 +31,33 @@ class ProductFilter(filters.FilterSet):
     category = filters.ModelChoiceFilter(field_name='category', queryset=Category.objects.all())
     supplier = filters.ModelChoiceFilter(field_name='supplier', queryset=Supplier.objects.all())
     brand = filters.CharFilter(lookup_expr='icontains')
-    type = filters.CharFilter(field_name='type', lookup_expr='exact')
+    type = filters.ModelChoiceFilter(field_name='product_type', queryset=ProductType.objects.all())
     related_to = filters.CharFilter(field_name='related_to__name', lookup_expr='icontains')
     collection = filters.ModelChoiceFilter(field_name='collections', queryset=Collection.objects.all())
+    min_price = filters.NumberFilter(method='filter_price')
+    max_price = filters.NumberFilter(method='filter_price')
+    in_stock = filters.BooleanFilter(method='filter_in_stock')
 
     class Meta:
         model = Product
-        fields = ('name', 'summary', 'description', 'category', 'supplier', 'brand', 'type', 'related_to', 'collection')
+        fields = ('name', 'summary', 'description', 'category', 'supplier', 'brand', 'type', 'related_to', 'collection', 'min_price', 'max_price', 'in_stock')
+
+    def filter_in_stock(self, queryset, name, value):
+        """Filters on the stock summary kept on the product, without joining its variants."""
+        if value:
+            return queryset.filter(total_stock__gt=0)
+        return queryset.filter(total_stock__lte=0)
+
+    def filter_price(self, queryset, name, value):
+        """
+        Filters on the default variant's price in the shopper's currency, given in units (e.g. 19.99).
+        Relies on the `price` annotation added by ProductViewSet.get_queryset.
+        """
+        currency = get_price_book_currency(self.request)
+        subunits = get_currency_formatter(currency).to_subunit(value)
+        if name == 'min_price':
+            return queryset.filter(price__gte=subunits)
+        return queryset.filter(price__lte=subunits)
 
 
 class ProductViewSet(viewsets.ReadOnlyModelViewSet):
@@ -41,16 +66,48 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Product.objects.all()
     filter_backends = [
         django_filters.rest_framework.DjangoFilterBackend,
-        drf_filters.SearchFilter,
+        ProductSearchFilter,
         drf_filters.OrderingFilter,
     ]
     filterset_class = ProductFilter
-    ordering_fields = ['name', 'created_at']
+    ordering_fields = ['name', 'created_at', 'price']
+
+    def get_queryset(self):
+        """
+        Plans related loading per action, so a page costs a fixed number of queries
+        regardless of its size.
+
+        Prices come from the price book in the shopper's currency: `price` (the default variant's
+        price in subunits) is annotated for filtering and ordering, and every serialized variant
+        gets its converted price prefetched as `shopper_prices`.
+        """
+        currency = get_price_book_currency(self.request)
+        currency_prices = ProductVariantPrice.objects.filter(currency=currency)
+
+        queryset = super().get_queryset().prefetch_related(Product.prefetch_first_image()).annotate(
+            price=Subquery(
+                currency_prices.filter(variant_id=OuterRef('default_variant_id')).values('price')[:1]
+            )
+        )
+
+        if self.action == 'default':
+            return queryset.select_related('default_variant__variant_image').prefetch_related(
+                Prefetch('default_variant__currency_prices', queryset=currency_prices, to_attr='shopper_prices')
+            )
+
+        return queryset.prefetch_related(
+            Prefetch(
+                'variants',
+                queryset=ProductVariant.objects.select_related('variant_image').prefetch_related(
+                    Prefetch('currency_prices', queryset=currency_prices, to_attr='shopper_prices')
+                ),
+            )
+        )
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         if settings.IS_MULTI_CURRENCY:
-            context['exchange_rate'] = currency_Backend().get_exchange_rate(self.request.currency)
+            context['exchange_rate'] = get_currency_backend().get_exchange_rate(self.request.currency)
         else:
             context['exchange_rate'] = 1.0
         
@@ -74,14 +131,32 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
 
     @action(detail=False, methods=['get'], url_path='default')
     def default(self, request):
-        queryset = self.filter_queryset(self.queryset)
+        queryset = self.filter_queryset(self.get_queryset())
         return self.paginate_and_serialize(queryset)
         
 
     @action(detail=False, methods=['get'], url_path='withvariant')
     def list_products_with_variant(self, request):
-        queryset = self.filter_queryset(self.queryset)
+        queryset = self.filter_queryset(self.get_queryset())
         return self.paginate_and_serialize(queryset)
+
+    @action(detail=False, methods=['get'], url_path='facets')
+    def facets(self, request):
+        """
+        Facet counts (category, brand, supplier, type, collection) of the products matching the
+        same filters and search as the list. Counted in memory from the facet index; the database
+        is only asked for the ids of the matching products, and not at all when nothing is filtered.
+        """
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        index = get_facet_index()
+        if queryset.query.where:
+            product_ids = list(queryset.order_by().values_list('pk', flat=True))
+            facets = index.count(product_ids)
+            count = len(product_ids)
+        else:
+            facets = index.count()
+            count = index.all_products.bit_count()
+        return Response({'count': count, 'facets': facets})
     
 
 class CollectionListView(generics.ListAPIView):
@@ -96,6 +171,8 @@ class CategoryListView(generics.ListAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
+    def list(self, request, *args, **kwargs):
+        return Response(get_category_subtrees())
 
 class ProductDetailView(generics.RetrieveAPIView):
     permission_classes = (AllowAny,)
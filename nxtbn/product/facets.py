@@ -0,0 +1,136 @@
+import datetime
+import threading
+import time
+
+from django.db.models import Max
+
+from nxtbn.core.local_cache import LocalVersionedCache
+from nxtbn.product.models import Category, Collection, Product, ProductType, Supplier
+
+
+# facet name: (Product field, model holding the labels); brand values are their own labels
+FACET_FIELDS = {
+    'category': ('category_id', Category),
+    'brand': ('brand', None),
+    'supplier': ('supplier_id', Supplier),
+    'type': ('product_type_id', ProductType),
+}
+COLLECTION_FACET = 'collection'
+
+# Products saved on another server may carry a slightly earlier `last_modified`
+CLOCK_SKEW = datetime.timedelta(seconds=60)
+
+
+def to_bitmap(product_ids):
+    """Packs product ids into an int with bit `id` set for each of them."""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return 0
+    bits = bytearray(max(product_ids) // 8 + 1)
+    for product_id in product_ids:
+        bits[product_id >> 3] |= 1 << (product_id & 7)
+    return int.from_bytes(bits, 'little')
+
+
+class FacetIndex:
+    """
+    Posting lists of the storefront facets, kept in memory as bitmaps: for every facet value,
+    an int whose bit `product.id` is set when the product has that value.
+
+    Counting the facets of any result set is then a bitwise AND and a popcount per value,
+    with no GROUP BY. The index follows product saves incrementally by re-reading the
+    products modified since the last sync; deletes and label changes rebuild it (see
+    `facet_indexes`).
+    """
+    check_interval = 5
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.postings = {facet: {} for facet in [*FACET_FIELDS, COLLECTION_FACET]}
+        self.labels = {}
+        self.all_products = 0
+        self.watermark = None
+        self.synced_at = None
+
+    @classmethod
+    def build(cls):
+        index = cls()
+        index.labels = {
+            facet: dict(model.objects.values_list('id', 'name'))
+            for facet, (field, model) in FACET_FIELDS.items() if model is not None
+        }
+        index.labels[COLLECTION_FACET] = dict(Collection.objects.filter(is_active=True).values_list('id', 'name'))
+        index.sync(force=True)
+        return index
+
+    def sync(self, force=False):
+        """Applies the products modified since the last sync, at most once per `check_interval` seconds."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self.synced_at is not None and now - self.synced_at < self.check_interval:
+                return
+            self.synced_at = now
+
+            products = Product.objects.all()
+            if self.watermark is not None:
+                products = products.filter(last_modified__gte=self.watermark - CLOCK_SKEW)
+            watermark = products.aggregate(watermark=Max('last_modified'))['watermark']
+            if watermark is None:
+                return
+
+            fields = [field for field, model in FACET_FIELDS.values()]
+            rows = list(products.values_list('pk', *fields))
+            collections = Product.collections.through.objects.filter(
+                product_id__in=products.values('pk')
+            ).values_list('product_id', 'collection_id')
+            self.apply(rows, collections)
+            self.watermark = watermark
+
+    def apply(self, rows, collections):
+        changed = to_bitmap(row[0] for row in rows)
+        self.all_products |= changed
+
+        values = {facet: {} for facet in self.postings}
+        for product_id, *facet_values in rows:
+            for facet, value in zip(FACET_FIELDS, facet_values):
+                if value is not None and value != '':
+                    values[facet].setdefault(value, []).append(product_id)
+        for product_id, collection_id in collections:
+            values[COLLECTION_FACET].setdefault(collection_id, []).append(product_id)
+
+        for facet, postings in self.postings.items():
+            # Drop the changed products from every value, then add them back where they belong
+            for value in list(postings):
+                postings[value] &= ~changed
+                if not postings[value]:
+                    del postings[value]
+            for value, product_ids in values[facet].items():
+                postings[value] = postings.get(value, 0) | to_bitmap(product_ids)
+
+    def count(self, product_ids=None):
+        """
+        Returns {facet: [{'value', 'label', 'count'}]} for the given products, or the whole
+        catalog when `product_ids` is None. Values are ordered by count, most frequent first.
+        """
+        with self._lock:
+            result = self.all_products if product_ids is None else to_bitmap(product_ids)
+            facets = {}
+            for facet, postings in self.postings.items():
+                labels = self.labels.get(facet)
+                counts = []
+                for value, posting in postings.items():
+                    count = (posting & result).bit_count()
+                    if count and (labels is None or value in labels):
+                        counts.append({'value': value, 'label': value if labels is None else labels[value], 'count': count})
+                counts.sort(key=lambda item: (-item['count'], str(item['label'])))
+                facets[facet] = counts
+            return facets
+
+
+facet_indexes = LocalVersionedCache('product_facets', timeout=3600)
+
+
+def get_facet_index():
+    index = facet_indexes.get('products', FacetIndex.build)
+    index.sync()
+    return index
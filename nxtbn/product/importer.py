@@ -0,0 +1,426 @@
+import codecs
+import csv
+import datetime
+import itertools
+import json
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.text import slugify
+from rest_framework import serializers
+
+from nxtbn.core import PublishableStatus
+from nxtbn.product import ImportFileFormat, ImportJobStatus, WeightUnits
+from nxtbn.product.models import (
+    Category,
+    Collection,
+    Product,
+    ProductImportError,
+    ProductImportJob,
+    ProductTag,
+    ProductType,
+    ProductVariant,
+    Supplier,
+)
+from nxtbn.product.search import get_search_backend
+from nxtbn.product.utils import preset_slugs, rebuild_variant_prices, refresh_product_summaries
+
+
+logger = logging.getLogger(__name__)
+
+LIST_SEPARATOR = '|' # separates the tags and collections of a CSV cell
+SLUG_MAX_LENGTH = Product._meta.get_field('slug').max_length
+
+# Columns of an existing product or variant that a row overwrites: always, or only when the row has the field
+PRODUCT_UPDATE_FIELDS = ['last_modified_by', 'last_modified']
+PRODUCT_OPTIONAL_UPDATE_FIELDS = {
+    'name': ['name'],
+    'summary': ['summary'],
+    'description': ['description'],
+    'category': ['category'],
+    'product_type': ['product_type'],
+    'supplier': ['supplier'],
+    'brand': ['brand'],
+    'status': ['status', 'is_live'],
+}
+VARIANT_UPDATE_FIELDS = ['product']
+VARIANT_OPTIONAL_UPDATE_FIELDS = {
+    'variant_name': ['name'],
+    'price': ['price'],
+    'compare_at_price': ['compare_at_price'],
+    'cost_per_unit': ['cost_per_unit'],
+    'currency': ['currency'],
+    'track_inventory': ['track_inventory'],
+    'stock': ['stock'],
+    'color_code': ['color_code'],
+    'weight_unit': ['weight_unit'],
+    'weight_value': ['weight_value'],
+}
+
+
+def get_update_fields(data, fields, optional_fields):
+    """The columns a row overwrites on an existing row, as a tuple to group rows by."""
+    return tuple(fields + [
+        column for field, columns in optional_fields.items() if field in data['provided_fields'] for column in columns
+    ])
+
+
+def bulk_upsert(model, rows, unique_fields):
+    """
+    Upserts (instance, update_fields) pairs with one `bulk_create(update_conflicts=True)` per distinct
+    set of update fields, so an existing row keeps the columns its import row left out.
+    """
+    groups = defaultdict(list)
+    for instance, update_fields in rows:
+        groups[update_fields].append(instance)
+    for update_fields, instances in groups.items():
+        model.objects.bulk_create(
+            instances, update_conflicts=True, unique_fields=unique_fields, update_fields=list(update_fields),
+        )
+
+
+class SeparatedListField(serializers.ListField):
+    """A list, also accepted as a `LIST_SEPARATOR` separated string as found in CSV cells."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = [item for item in data.split(LIST_SEPARATOR) if item.strip()]
+        return super().to_internal_value(data)
+
+
+class ProductImportRowSerializer(serializers.Serializer):
+    """
+    A row of a product feed: one variant, matched by `sku`, and the product it belongs to.
+
+    Rows with the same `product_slug` (or, without one, the same name) are variants of one
+    product; when they disagree, the product fields of the last row win. Category, product type,
+    supplier and collections are referenced by name and must exist. Tags are created as needed.
+    Tags and collections are added to the product, never removed from it.
+
+    Defaults only apply to new products and variants: a field missing from the row (or an empty
+    CSV cell) leaves an existing product or variant unchanged.
+    """
+    sku = serializers.CharField(max_length=50)
+    product_slug = serializers.SlugField(max_length=SLUG_MAX_LENGTH, required=False)
+    name = serializers.CharField(max_length=255)
+    summary = serializers.CharField(max_length=500, required=False, default='')
+    description = serializers.CharField(max_length=5000, required=False, default='')
+    category = serializers.CharField(max_length=255)
+    product_type = serializers.CharField(max_length=50)
+    supplier = serializers.CharField(max_length=255, required=False)
+    brand = serializers.CharField(max_length=100, required=False)
+    status = serializers.ChoiceField(choices=PublishableStatus.choices, default=PublishableStatus.DRAFT)
+    tags = SeparatedListField(child=serializers.CharField(max_length=50), required=False, default=list)
+    collections = SeparatedListField(child=serializers.CharField(max_length=255), required=False, default=list)
+
+    variant_name = serializers.CharField(max_length=255, required=False)
+    price = serializers.DecimalField(max_digits=12, decimal_places=3, min_value=Decimal('0.01'))
+    cost_per_unit = serializers.DecimalField(max_digits=12, decimal_places=3, min_value=Decimal('0.01'))
+    compare_at_price = serializers.DecimalField(max_digits=12, decimal_places=3, min_value=Decimal('0.01'), required=False)
+    currency = serializers.CharField(max_length=3, required=False)
+    track_inventory = serializers.BooleanField(default=False)
+    stock = serializers.IntegerField(default=0)
+    color_code = serializers.CharField(max_length=7, required=False)
+    weight_unit = serializers.ChoiceField(choices=WeightUnits.choices, required=False)
+    weight_value = serializers.DecimalField(max_digits=5, decimal_places=2, required=False)
+
+    def validate_currency(self, value):
+        if value.upper() != settings.BASE_CURRENCY:
+            raise serializers.ValidationError(f"Prices must be in the base currency '{settings.BASE_CURRENCY}'.")
+        return value.upper()
+
+    def validate(self, attrs):
+        attrs['slug'] = attrs.get('product_slug') or slugify(attrs['name'])[:SLUG_MAX_LENGTH]
+        if not attrs['slug']:
+            raise serializers.ValidationError({'product_slug': ["Required when the name has no letters or digits."]})
+        return attrs
+
+
+def read_records(file, file_format):
+    """
+    Yields the records of a feed one at a time, as dicts. A JSON Lines record that cannot be
+    parsed is yielded as a `serializers.ValidationError`, so it is reported with its row number.
+    """
+    stream = codecs.getreader('utf-8-sig')(file)
+    if file_format == ImportFileFormat.CSV:
+        for record in csv.DictReader(stream):
+            record.pop(None, None) # cells beyond the header
+            yield record
+        return
+
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            yield serializers.ValidationError({'non_field_errors': [f"Invalid JSON: {error}"]})
+            continue
+        if not isinstance(record, dict):
+            yield serializers.ValidationError({'non_field_errors': ["Expected a JSON object."]})
+            continue
+        yield record
+
+
+class ProductImporter:
+    """
+    Imports the rows of a `ProductImportJob` file into the catalog, `chunk_size` rows at a time.
+
+    The file is streamed, never loaded as a whole. Each chunk is validated with a handful of
+    queries, then upserted in one transaction: products by slug and variants by SKU with
+    `bulk_create(update_conflicts=True)`, tags and collections with `ignore_conflicts`. The
+    transaction also records the chunk's rejected rows and advances `processed_rows`, so
+    an interrupted import resumes right after the last committed chunk.
+
+    Bulk writes bypass model signals, so the importer refreshes what they maintain itself:
+    product summaries, the price book and the search index.
+    """
+
+    def __init__(self, job, chunk_size=None, on_chunk=None):
+        # `on_chunk(job)` is called after every committed chunk, e.g. to report progress
+        self.job = job
+        self.chunk_size = chunk_size or settings.PRODUCT_IMPORT_CHUNK_SIZE
+        self.on_chunk = on_chunk
+        # One instance validates every row; DRF copies the declared fields for each new serializer
+        self.row_serializer = ProductImportRowSerializer()
+
+    def read_rows(self):
+        with self.job.file.storage.open(self.job.file.name, 'rb') as file:
+            yield from enumerate(read_records(file, self.job.file_format), start=1)
+
+    def run(self):
+        job = self.job
+        if job.total_rows is None:
+            job.total_rows = sum(1 for _ in self.read_rows())
+            ProductImportJob.objects.filter(pk=job.pk).update(total_rows=job.total_rows)
+
+        rows = itertools.islice(self.read_rows(), job.processed_rows, None)
+        while True:
+            chunk = list(itertools.islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            self.import_chunk(chunk)
+            if self.on_chunk is not None:
+                self.on_chunk(job)
+
+    def import_chunk(self, chunk):
+        rows, errors = self.validate(chunk)
+        with transaction.atomic():
+            created, updated = self.write(rows) if rows else (0, 0)
+            ProductImportError.objects.bulk_create(errors)
+            ProductImportJob.objects.filter(pk=self.job.pk).update(
+                processed_rows=F('processed_rows') + len(chunk),
+                created_count=F('created_count') + created,
+                updated_count=F('updated_count') + updated,
+                error_count=F('error_count') + len(errors),
+                last_modified=timezone.now(),
+            )
+        self.job.refresh_from_db(fields=['processed_rows', 'created_count', 'updated_count', 'error_count', 'last_modified'])
+
+    def validate(self, chunk):
+        """Returns the valid rows of a chunk as (row number, data), and the errors of the others."""
+        rows = []
+        errors = []
+
+        def reject(row_number, record, detail):
+            sku = record.get('sku') if isinstance(record, dict) else None
+            errors.append(ProductImportError(job=self.job, row=row_number, sku=str(sku or '')[:255], errors=detail))
+
+        for row_number, record in chunk:
+            if isinstance(record, serializers.ValidationError):
+                reject(row_number, None, record.detail)
+                continue
+            # Empty cells are missing values, so defaults apply
+            values = {key: value for key, value in record.items() if value is not None and value != ''}
+            try:
+                data = self.row_serializer.run_validation(values)
+            except serializers.ValidationError as error:
+                reject(row_number, record, error.detail)
+                continue
+            data['provided_fields'] = set(values)
+            rows.append((row_number, record, data))
+
+        lookups = {
+            'category': (Category, {data['category'] for _, _, data in rows}),
+            'product_type': (ProductType, {data['product_type'] for _, _, data in rows}),
+            'supplier': (Supplier, {data['supplier'] for _, _, data in rows if 'supplier' in data}),
+            'collections': (Collection, {name for _, _, data in rows for name in data['collections']}),
+        }
+        ids = {
+            field: dict(model.objects.filter(name__in=names).values_list('name', 'id')) if names else {}
+            for field, (model, names) in lookups.items()
+        }
+
+        valid_rows = []
+        for row_number, record, data in rows:
+            unknown = {}
+            for field in ('category', 'product_type', 'supplier'):
+                if field in data and data[field] not in ids[field]:
+                    unknown[field] = [f"Unknown {field.replace('_', ' ')} '{data[field]}'."]
+            missing_collections = [name for name in data['collections'] if name not in ids['collections']]
+            if missing_collections:
+                unknown['collections'] = [f"Unknown collection '{name}'." for name in missing_collections]
+            if unknown:
+                reject(row_number, record, unknown)
+                continue
+
+            data['category_id'] = ids['category'][data['category']]
+            data['product_type_id'] = ids['product_type'][data['product_type']]
+            data['supplier_id'] = ids['supplier'].get(data.get('supplier'))
+            data['collection_ids'] = [ids['collections'][name] for name in data['collections']]
+            valid_rows.append((row_number, data))
+        return valid_rows, errors
+
+    def write(self, rows):
+        """Upserts valid rows; returns the number of variants (created, updated)."""
+        user = self.job.created_by
+        # Later rows win, as they would in a later chunk
+        variants = {data['sku']: data for row_number, data in rows}
+        products = {data['slug']: data for row_number, data in rows if variants[data['sku']] is data}
+        tags = defaultdict(set)
+        collections = defaultdict(set)
+        for data in variants.values():
+            tags[data['slug']].update(data['tags'])
+            collections[data['slug']].update(data['collection_ids'])
+
+        with preset_slugs():
+            bulk_upsert(
+                Product,
+                [
+                    (
+                        Product(
+                            slug=slug,
+                            name=data['name'],
+                            summary=data['summary'],
+                            description=data['description'],
+                            category_id=data['category_id'],
+                            product_type_id=data['product_type_id'],
+                            supplier_id=data['supplier_id'],
+                            brand=data.get('brand'),
+                            status=data['status'],
+                            is_live=data['status'] == PublishableStatus.PUBLISHED,
+                            created_by=user,
+                            last_modified_by=user,
+                        ),
+                        get_update_fields(data, PRODUCT_UPDATE_FIELDS, PRODUCT_OPTIONAL_UPDATE_FIELDS),
+                    )
+                    for slug, data in products.items()
+                ],
+                unique_fields=['slug'],
+            )
+        product_ids = dict(Product.objects.filter(slug__in=products).values_list('slug', 'id'))
+
+        # Variants may move to another product; that product's summary changes too
+        previous_products = dict(ProductVariant.objects.filter(sku__in=variants).values_list('sku', 'product_id'))
+        bulk_upsert(
+            ProductVariant,
+            [
+                (
+                    ProductVariant(
+                        product_id=product_ids[data['slug']],
+                        sku=sku,
+                        name=data.get('variant_name'),
+                        price=data['price'],
+                        compare_at_price=data.get('compare_at_price'),
+                        cost_per_unit=data['cost_per_unit'],
+                        currency=settings.BASE_CURRENCY,
+                        track_inventory=data['track_inventory'],
+                        stock=data['stock'],
+                        color_code=data.get('color_code'),
+                        weight_unit=data.get('weight_unit'),
+                        weight_value=data.get('weight_value'),
+                    ),
+                    get_update_fields(data, VARIANT_UPDATE_FIELDS, VARIANT_OPTIONAL_UPDATE_FIELDS),
+                )
+                for sku, data in variants.items()
+            ],
+            unique_fields=['sku'],
+        )
+
+        tag_names = set().union(*tags.values())
+        if tag_names:
+            ProductTag.objects.bulk_create([ProductTag(name=name) for name in tag_names], ignore_conflicts=True)
+            tag_ids = dict(ProductTag.objects.filter(name__in=tag_names).values_list('name', 'id'))
+            Product.tags.through.objects.bulk_create(
+                [
+                    Product.tags.through(product_id=product_ids[slug], producttag_id=tag_ids[name])
+                    for slug, names in tags.items() for name in names
+                ],
+                ignore_conflicts=True,
+            )
+        Product.collections.through.objects.bulk_create(
+            [
+                Product.collections.through(product_id=product_ids[slug], collection_id=collection_id)
+                for slug, collection_ids in collections.items() for collection_id in collection_ids
+            ],
+            ignore_conflicts=True,
+        )
+
+        affected_ids = set(product_ids.values()) | set(previous_products.values())
+        self.update_default_variants(affected_ids)
+        refresh_product_summaries(affected_ids)
+        rebuild_variant_prices(list(ProductVariant.objects.filter(sku__in=variants).values_list('id', flat=True)))
+        get_search_backend().update(list(product_ids.values()))
+
+        updated = len(previous_products)
+        return len(variants) - updated, updated
+
+    def update_default_variants(self, product_ids):
+        """Gives products without a default variant (or whose default moved away) their first variant."""
+        Product.objects.filter(pk__in=product_ids).exclude(default_variant__isnull=True).exclude(
+            default_variant__product_id=F('pk'),
+        ).update(default_variant=None)
+        Product.objects.filter(pk__in=product_ids, default_variant__isnull=True).update(
+            default_variant=Subquery(
+                ProductVariant.objects.filter(product_id=OuterRef('pk')).order_by('pk').values('pk')[:1]
+            ),
+        )
+
+
+def is_resumable(job):
+    """Whether a job may be (re)started: it is waiting, failed, or running without progress for too long."""
+    if job.status in (ImportJobStatus.PENDING, ImportJobStatus.FAILED):
+        return True
+    stale_before = timezone.now() - datetime.timedelta(seconds=settings.PRODUCT_IMPORT_STALE_AFTER)
+    return job.status == ImportJobStatus.RUNNING and job.last_modified < stale_before
+
+
+def run_product_import(job_id, chunk_size=None, on_chunk=None):
+    """
+    Runs or resumes an import job. The job is claimed with a conditional UPDATE first, so two
+    workers never import the same file at once; a running job is only taken over once it
+    made no progress for `PRODUCT_IMPORT_STALE_AFTER` seconds (e.g. its worker died).
+
+    Returns:
+        The finished job, or None if it could not be claimed.
+    """
+    now = timezone.now()
+    stale_before = now - datetime.timedelta(seconds=settings.PRODUCT_IMPORT_STALE_AFTER)
+    claimed = ProductImportJob.objects.filter(pk=job_id).filter(
+        Q(status__in=[ImportJobStatus.PENDING, ImportJobStatus.FAILED])
+        | Q(status=ImportJobStatus.RUNNING, last_modified__lt=stale_before)
+    ).update(status=ImportJobStatus.RUNNING, message='', started_at=Coalesce('started_at', now), last_modified=now)
+    if not claimed:
+        return None
+
+    job = ProductImportJob.objects.select_related('created_by').get(pk=job_id)
+    try:
+        ProductImporter(job, chunk_size=chunk_size, on_chunk=on_chunk).run()
+    except Exception as error:
+        logger.exception("Product import %s failed after %s rows.", job.alias, job.processed_rows)
+        ProductImportJob.objects.filter(pk=job.pk).update(
+            status=ImportJobStatus.FAILED, message=str(error), last_modified=timezone.now(),
+        )
+        raise
+
+    ProductImportJob.objects.filter(pk=job.pk).update(
+        status=ImportJobStatus.COMPLETED, finished_at=timezone.now(), last_modified=timezone.now(),
+    )
+    job.refresh_from_db()
+    return job
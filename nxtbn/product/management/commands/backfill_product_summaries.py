@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from tqdm import tqdm
+
+from nxtbn.product.models import Product
+from nxtbn.product.utils import refresh_product_summaries
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the stock, price, color and variant count summaries of every product from its variants'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Products summarized per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+
+        for start in tqdm(range(0, len(product_ids), batch_size)):
+            refresh_product_summaries(product_ids[start:start + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(f"Summaries refreshed for {len(product_ids)} products."))
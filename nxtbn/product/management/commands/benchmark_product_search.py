@@ -0,0 +1,116 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from tqdm import tqdm
+
+from nxtbn.product.models import Category, Product, ProductType
+from nxtbn.product.search import get_search_backend
+from nxtbn.product.utils import preset_slugs
+from nxtbn.users.models import User
+
+
+ADJECTIVES = [
+    'classic', 'vintage', 'organic', 'wireless', 'portable', 'leather', 'cotton', 'waterproof', 'ceramic', 'wooden',
+    'stainless', 'compact', 'premium', 'handmade', 'lightweight', 'ergonomic', 'bamboo', 'magnetic', 'insulated', 'foldable',
+]
+NOUNS = [
+    'backpack', 'headphones', 'keyboard', 'blender', 'lantern', 'notebook', 'sneakers', 'umbrella', 'kettle', 'jacket',
+    'speaker', 'wallet', 'bottle', 'monitor', 'pillow', 'skillet', 'charger', 'sunglasses', 'tripod', 'thermos',
+]
+FILLER = [
+    'designed', 'for', 'everyday', 'use', 'with', 'durable', 'materials', 'and', 'a', 'modern', 'finish', 'easy', 'to',
+    'clean', 'perfect', 'gift', 'travel', 'home', 'office', 'outdoor', 'comfortable', 'reliable', 'quality', 'warranty',
+]
+BRANDS = ['Acme', 'Northwind', 'Contoso', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Vandelay']
+
+PAGE_SIZE = 20
+
+
+class Rollback(Exception):
+    pass
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(FILLER) for _ in range(words))
+
+
+def misspell(rng, word):
+    index = rng.randrange(1, len(word) - 1)
+    return word[:index] + word[index + 1:]
+
+
+class Command(BaseCommand):
+    help = 'Generates products and compares search backend queries with ILIKE scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=500000, help='Number of products to generate')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Products inserted per batch')
+        parser.add_argument('--rounds', type=int, default=5, help='Times each query is run')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--keep', action='store_true', help='Keep the generated products instead of rolling back')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                if not options['keep']:
+                    raise Rollback
+        except Rollback:
+            self.stdout.write('Generated products rolled back.')
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        self.generate(rng, options['products'], options['batch_size'])
+
+        backend = get_search_backend()
+        started = time.perf_counter()
+        backend.rebuild()
+        self.stdout.write(f"Indexed {options['products']} products with {type(backend).__name__} in {time.perf_counter() - started:.1f}s")
+
+        adjective, noun = rng.choice(ADJECTIVES), rng.choice(NOUNS)
+        queries = [
+            ('single word', noun),
+            ('two words', f'{adjective} {noun}'),
+            ('prefix', noun[:4]),
+            ('typo', misspell(rng, noun)),
+        ]
+
+        self.stdout.write(f"{'query':<28} {'ILIKE ms':>10} {'hits':>8} {'search ms':>10} {'hits':>8}")
+        for label, query in queries:
+            ilike = Product.objects.filter(Q(name__icontains=query) | Q(summary__icontains=query) | Q(description__icontains=query))
+            ilike_ms, ilike_hits = self.time_page(ilike, options['rounds'])
+            search_ms, search_hits = self.time_page(backend.search(Product.objects.all(), query), options['rounds'])
+            self.stdout.write(f"{label + ' ' + repr(query):<28} {ilike_ms:>10.1f} {ilike_hits:>8} {search_ms:>10.1f} {search_hits:>8}")
+
+    def time_page(self, queryset, rounds):
+        """Average milliseconds to fetch the first page and the total count, as the storefront does."""
+        started = time.perf_counter()
+        for _ in range(rounds):
+            list(queryset[:PAGE_SIZE])
+            hits = queryset.count()
+        return (time.perf_counter() - started) / rounds * 1000, hits
+
+    def generate(self, rng, count, batch_size):
+        user = User.objects.filter(is_superuser=True).first() or User.objects.create(username='search-benchmark', email='search-benchmark@example.com')
+        category, created = Category.objects.get_or_create(name='Search Benchmark')
+        product_type, created = ProductType.objects.get_or_create(name='Search Benchmark')
+        offset = Product.objects.count()
+
+        with preset_slugs():
+            for start in tqdm(range(0, count, batch_size), desc='Generating products'):
+                Product.objects.bulk_create([
+                    Product(
+                        created_by=user,
+                        category=category,
+                        product_type=product_type,
+                        name=f'{rng.choice(ADJECTIVES)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}'.title(),
+                        slug=f'search-benchmark-{offset + index}',
+                        brand=rng.choice(BRANDS),
+                        summary=sentence(rng, 12),
+                        description=sentence(rng, 40),
+                    )
+                    for index in range(start, min(start + batch_size, count))
+                ])
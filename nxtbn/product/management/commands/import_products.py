@@ -0,0 +1,81 @@
+import os
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from tqdm import tqdm
+
+from nxtbn.product import ImportFileFormat
+from nxtbn.product.importer import is_resumable, run_product_import
+from nxtbn.product.models import ProductImportJob
+from nxtbn.product.tasks import import_products_task
+from nxtbn.users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Imports products and variants from a CSV or JSON Lines feed, upserting variants by SKU. '
+        'Rejected rows are listed on the import job; an interrupted import can be resumed with --resume.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='CSV or JSON Lines file to import')
+        parser.add_argument('--format', choices=ImportFileFormat.values, help='File format, guessed from the extension by default')
+        parser.add_argument('--user', help='Email of the user the products are created by (default: first superuser)')
+        parser.add_argument('--resume', metavar='ALIAS', help='Resume the import job with this alias instead of starting one')
+        parser.add_argument('--chunk-size', type=int, help='Rows validated and written per transaction')
+        parser.add_argument('--async', action='store_true', dest='run_async', help='Run the import on a Celery worker')
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            job = ProductImportJob.objects.filter(alias=options['resume']).first()
+            if job is None:
+                raise CommandError(f"No import job {options['resume']}.")
+            if not is_resumable(job):
+                raise CommandError(f"Import job {job.alias} is {job.status.lower()} and cannot be resumed.")
+        elif options['path']:
+            job = self.create_job(options)
+        else:
+            raise CommandError("Give the file to import, or --resume a job.")
+
+        if options['run_async']:
+            import_products_task.delay(job.pk)
+            self.stdout.write(f"Import job {job.alias} queued.")
+            return
+
+        with tqdm(total=job.total_rows, initial=job.processed_rows, unit='rows') as progress:
+            def report(job):
+                progress.total = job.total_rows
+                progress.update(job.processed_rows - progress.n)
+
+            job = run_product_import(job.pk, chunk_size=options['chunk_size'], on_chunk=report)
+        if job is None:
+            raise CommandError("The import job is already being run by another worker.")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Import job {job.alias}: {job.created_count} variants created, {job.updated_count} updated, "
+            f"{job.error_count} rows rejected."
+        ))
+
+    def create_job(self, options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f"No such file: {path}")
+
+        file_format = options['format']
+        if file_format is None:
+            file_format = ImportFileFormat.JSONL if path.lower().endswith(('.jsonl', '.ndjson')) else ImportFileFormat.CSV
+
+        if options['user']:
+            user = User.objects.filter(email=options['user']).first()
+        else:
+            user = User.objects.filter(is_superuser=True).order_by('pk').first()
+        if user is None:
+            raise CommandError("No user to create the products as; pass --user.")
+
+        # The file is copied to the media storage, where Celery workers and resumed runs can read it
+        job = ProductImportJob(created_by=user, file_format=file_format)
+        with open(path, 'rb') as file:
+            job.file.save(os.path.basename(path), File(file), save=False)
+        job.save()
+        self.stdout.write(f"Import job {job.alias} created.")
+        return job
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from nxtbn.product.models import ProductVariantPrice
+from nxtbn.product.utils import get_price_book_rates, rebuild_currency_prices, rebuild_price_book
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the per-currency price book of every product variant'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--currency',
+            action='append',
+            dest='currencies',
+            help='Only rebuild the given currency. Can be repeated.',
+        )
+
+    def handle(self, *args, **options):
+        currencies = options['currencies']
+        if currencies:
+            rebuild_currency_prices(currencies)
+        else:
+            currencies = sorted(get_price_book_rates())
+            rebuild_price_book()
+
+        rows = ProductVariantPrice.objects.filter(currency__in=currencies).count()
+        self.stdout.write(self.style.SUCCESS(f"Price book rebuilt for {', '.join(currencies)}: {rows} prices."))
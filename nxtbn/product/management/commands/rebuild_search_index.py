@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from nxtbn.product.models import Product
+from nxtbn.product.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the product search index'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Search index rebuilt with {type(backend).__name__} for {Product.objects.count()} products."
+        ))
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.11 on 2026-10-18 03:07
+
+from django.db import migrations, models
+
+
+def build_category_paths(apps, schema_editor):
+    Category = apps.get_model('product', 'Category')
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+
+    def ancestry(category_id):
+        chain = []
+        while category_id is not None and category_id not in chain:
+            chain.insert(0, category_id)
+            category_id = parents.get(category_id)
+        return chain
+
+    categories = list(Category.objects.all())
+    for category in categories:
+        chain = ancestry(category.id)
+        category.path = ''.join(f"{category_id}/" for category_id in chain)
+        category.depth = len(chain) - 1
+    Category.objects.bulk_update(categories, ['path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0005_productvariantprice'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(build_category_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 4.2.11 on 2026-10-18 03:10
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+
+
+# Frozen copy of the index settings and tokenizer of nxtbn.product.search at the time of this migration
+SEARCH_CONFIG = 'english'
+SEARCH_FIELDS = (
+    ('name', 'A', 1.0),
+    ('brand', 'A', 0.8),
+    ('summary', 'B', 0.4),
+    ('description', 'C', 0.2),
+)
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TERM_LENGTH = 64
+
+
+def tokenize(text):
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall((text or '').lower()) if len(token) > 1]
+
+
+def weigh_terms(values):
+    weights = {}
+    for value, (field, weight, score) in zip(values, SEARCH_FIELDS):
+        for token in tokenize(value):
+            weights[token] = max(weights.get(token, 0), score)
+    return weights
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE INDEX product_product_search_vector_gin ON product_product USING gin (search_vector)"
+    )
+    schema_editor.execute(
+        "CREATE INDEX product_product_name_trgm ON product_product USING gin (name gin_trgm_ops)"
+    )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS product_product_search_vector_gin")
+    schema_editor.execute("DROP INDEX IF EXISTS product_product_name_trgm")
+
+
+def index_existing_products(apps, schema_editor):
+    Product = apps.get_model('product', 'Product')
+    ProductSearchTerm = apps.get_model('product', 'ProductSearchTerm')
+
+    if schema_editor.connection.vendor == 'postgresql':
+        vector = " || ".join(
+            f"setweight(to_tsvector(%s, coalesce({field}, '')), '{weight}')"
+            for field, weight, score in SEARCH_FIELDS
+        )
+        schema_editor.execute(
+            f"UPDATE product_product SET search_vector = {vector}",
+            [SEARCH_CONFIG] * len(SEARCH_FIELDS),
+        )
+        return
+
+    fields = [field for field, weight, score in SEARCH_FIELDS]
+    terms = []
+    for product_id, *values in Product.objects.values_list('pk', *fields).iterator(chunk_size=1000):
+        terms += [
+            ProductSearchTerm(product_id=product_id, term=term, weight=weight)
+            for term, weight in weigh_terms(values).items()
+        ]
+        if len(terms) >= 10000:
+            ProductSearchTerm.objects.bulk_create(terms, batch_size=1000)
+            terms = []
+    ProductSearchTerm.objects.bulk_create(terms, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0006_category_depth_category_path'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='ProductSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.FloatField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='product.product')),
+            ],
+            options={
+                'unique_together': {('term', 'product')},
+            },
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+        migrations.RunPython(index_existing_products, migrations.RunPython.noop),
+    ]
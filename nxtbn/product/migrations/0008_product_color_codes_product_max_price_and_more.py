@@ -0,0 +1,38 @@
+# Generated by Django 4.2.11 on 2026-10-18 03:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0007_product_search_vector_productsearchterm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='color_codes',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='max_price',
+            field=models.DecimalField(blank=True, decimal_places=3, editable=False, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='min_price',
+            field=models.DecimalField(blank=True, decimal_places=3, editable=False, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='total_stock',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='variant_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
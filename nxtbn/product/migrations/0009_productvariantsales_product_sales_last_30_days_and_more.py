@@ -0,0 +1,50 @@
+# Generated by Django 4.2.11 on 2026-10-18 03:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0008_product_color_codes_product_max_price_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductVariantSales',
+            fields=[
+                ('variant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales', serialize=False, to='product.productvariant')),
+                ('total_sales', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='sales_last_30_days',
+            field=models.IntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='sales_last_7_days',
+            field=models.IntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='total_sales',
+            field=models.IntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='ProductVariantDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='product.product')),
+                ('variant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='product.productvariant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'day'], name='product_pro_product_729b44_idx')],
+                'unique_together': {('variant', 'day')},
+            },
+        ),
+    ]
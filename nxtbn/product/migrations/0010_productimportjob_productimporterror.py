@@ -0,0 +1,56 @@
+# Generated by Django 4.2.11 on 2026-10-18 03:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('product', '0009_productvariantsales_product_sales_last_30_days_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_modified', models.DateTimeField(auto_now=True)),
+                ('file', models.FileField(upload_to='imports/products/')),
+                ('file_format', models.CharField(choices=[('csv', 'CSV'), ('jsonl', 'JSON Lines')], default='csv', max_length=10)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='PENDING', max_length=20)),
+                ('total_rows', models.PositiveIntegerField(blank=True, help_text='Rows in the file, counted when the import starts.', null=True)),
+                ('processed_rows', models.PositiveIntegerField(default=0, help_text='Rows imported or rejected so far.')),
+                ('created_count', models.PositiveIntegerField(default=0, help_text='Variants created.')),
+                ('updated_count', models.PositiveIntegerField(default=0, help_text='Existing variants updated, matched by SKU.')),
+                ('error_count', models.PositiveIntegerField(default=0, help_text='Rows rejected, see `errors`.')),
+                ('message', models.TextField(blank=True, default='', help_text='Why the import failed, if it did.')),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='product_imports', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('-created_at',),
+                'permissions': [('resume_productimportjob', 'Can resume a product import'), ('errors_productimportjob', 'Can view the rejected rows of a product import')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductImportError',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row', models.PositiveIntegerField(help_text='1-based number of the row in the file, header excluded.')),
+                ('sku', models.CharField(blank=True, default='', max_length=255)),
+                ('errors', models.JSONField(default=dict)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='errors', to='product.productimportjob')),
+            ],
+            options={
+                'ordering': ('job', 'row'),
+                'indexes': [models.Index(fields=['job', 'row'], name='product_pro_job_id_2cd92f_idx')],
+            },
+        ),
+    ]
@@ -1,18 +1,21 @@
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
-from babel.numbers import get_currency_precision, format_currency
 
 
 
 from nxtbn.core import CurrencyTypes, MoneyFieldTypes
 from nxtbn.core.mixin import MonetaryMixin
+from nxtbn.core.utils import get_currency_formatter
 from nxtbn.core.models import AbstractMetadata, AbstractSEOModel, AbstractUUIDModel, PublishableModel, AbstractBaseUUIDModel, AbstractBaseModel, NameDescriptionAbstract, no_nested_values
 from nxtbn.filemanager.models import Document, Image
-from nxtbn.product import DimensionUnits, StockStatus, WeightUnits
+from nxtbn.product import DimensionUnits, ImportFileFormat, ImportJobStatus, StockStatus, WeightUnits
 from nxtbn.tax.models import TaxClass
 from nxtbn.users.admin import User
 
@@ -39,19 +42,33 @@ class Category(NameDescriptionAbstract, AbstractSEOModel):
         related_name='subcategories'
     )
 
+    # Materialized path of ids from the root down to this category, e.g. "3/17/42/".
+    # A subtree is every category whose path starts with the path of its root.
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='')
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
     def has_sub(self):
         return self.subcategories.exists()
 
+    def get_ancestor_ids(self):
+        return [int(category_id) for category_id in self.path.split('/')[:-2]]
+
     def get_family_tree(self):
-        family_tree = []
-        current = self
-        depth = 0
-        while current is not None:
-            family_tree.insert(0, {'depth': depth, 'name': current.name})
-            current = current.parent
-            depth += 1
+        ancestor_ids = self.get_ancestor_ids()
+        names = dict(Category.objects.filter(id__in=ancestor_ids).values_list('id', 'name'))
+        family_tree = [
+            {'depth': len(ancestor_ids) - index, 'name': names.get(category_id)}
+            for index, category_id in enumerate(ancestor_ids)
+        ]
+        family_tree.append({'depth': 0, 'name': self.name})
         return family_tree
 
+    def get_descendants(self, include_self=False):
+        descendants = Category.objects.filter(path__startswith=self.path)
+        if not include_self:
+            descendants = descendants.exclude(pk=self.pk)
+        return descendants
+
     class Meta:
         verbose_name = _("Category")
         verbose_name_plural = _("Categories")
@@ -61,21 +78,46 @@ class Category(NameDescriptionAbstract, AbstractSEOModel):
 
     def clean(self):
         """Validate that category depth does not exceed 2 levels."""
-        if self._get_depth() > 2:
+        parent_path, parent_depth = self._get_parent_path()
+        if self.path and parent_path.startswith(self.path):
+            raise ValidationError("A category cannot be moved under itself or its subcategories.")
+
+        depth = parent_depth + 1
+        if self.path and depth != self.depth:
+            # A moved category takes its subcategories along
+            deepest = self.get_descendants().aggregate(deepest=models.Max('depth'))['deepest']
+            if deepest is not None:
+                depth += deepest - self.depth
+        if depth > 2:
             raise ValidationError("Category depth must not exceed 2 levels.")
 
+    def _get_parent_path(self):
+        """The stored path and depth of the parent, read fresh so a stale parent instance cannot corrupt the tree."""
+        if self.parent_id is None:
+            return '', -1
+        return Category.objects.filter(pk=self.parent_id).values_list('path', 'depth').get()
+
     def _get_depth(self):
-        """Recursively determine the depth of the category."""
-        depth = 0
-        current = self
-        while current.parent:
-            depth += 1
-            current = current.parent
-        return depth
+        """Determine the depth of the category from the parent's stored depth."""
+        parent_path, parent_depth = self._get_parent_path()
+        return parent_depth + 1
 
     def save(self, *args, **kwargs):
         self.clean()
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+            parent_path, parent_depth = self._get_parent_path()
+            path, depth = f"{parent_path}{self.pk}/", parent_depth + 1
+            if path != self.path:
+                Category.objects.filter(pk=self.pk).update(path=path, depth=depth)
+                if self.path:
+                    # Moved under another parent: re-root the whole subtree in one statement
+                    Category.objects.filter(path__startswith=self.path).exclude(pk=self.pk).update(
+                        path=Concat(Value(path), Substr('path', len(self.path) + 1), output_field=models.CharField()),
+                        depth=F('depth') + (depth - self.depth),
+                    )
+                self.path, self.depth = path, depth
 
 class Collection(NameDescriptionAbstract, AbstractSEOModel):
     created_by = models.ForeignKey(
@@ -143,6 +185,24 @@ class Product(PublishableModel, AbstractMetadata, AbstractSEOModel):
     collections = models.ManyToManyField(Collection, blank=True, related_name='products_in_collection')
     tags = models.ManyToManyField(ProductTag, blank=True)
     tax_class = models.ForeignKey(TaxClass, on_delete=models.PROTECT, related_name='products', null=True, blank=True) # null for tax exempt products
+    search_vector = SearchVectorField(null=True, blank=True, editable=False) # maintained by nxtbn.product.search on PostgreSQL
+
+    # Summary of the variants, kept up to date by nxtbn.product.utils.refresh_product_summaries
+    total_stock = models.IntegerField(default=0, editable=False)
+    variant_count = models.PositiveIntegerField(default=0, editable=False)
+    min_price = models.DecimalField(max_digits=12, decimal_places=3, null=True, blank=True, editable=False)
+    max_price = models.DecimalField(max_digits=12, decimal_places=3, null=True, blank=True, editable=False)
+    color_codes = models.JSONField(default=list, blank=True, editable=False)
+
+    # Units sold, kept up to date by nxtbn.product.utils.record_sales; windows are refreshed daily
+    total_sales = models.IntegerField(default=0, db_index=True, editable=False)
+    sales_last_7_days = models.IntegerField(default=0, db_index=True, editable=False)
+    sales_last_30_days = models.IntegerField(default=0, db_index=True, editable=False)
+
+    SUMMARY_FIELDS = ('total_stock', 'variant_count', 'min_price', 'max_price', 'color_codes')
+    SALES_FIELDS = ('total_sales', 'sales_last_7_days', 'sales_last_30_days')
+    # Columns written by their own maintainers, never from a (possibly stale) instance
+    MAINTAINED_FIELDS = SUMMARY_FIELDS + SALES_FIELDS + ('search_vector',)
 
     class Meta:
         ordering = ('name',)
@@ -152,12 +212,33 @@ class Product(PublishableModel, AbstractMetadata, AbstractSEOModel):
             ('manage_stock', 'Can manage stock'),
         ]
 
+    def get_first_image(self):
+        """
+        Returns the first image of the product, using the `first_images` prefetch
+        (see `Product.prefetch_first_image`) when the queryset planned it.
+        """
+        if hasattr(self, 'first_images'):
+            return self.first_images[0] if self.first_images else None
+        return self.images.order_by('id').first()
+
+    @staticmethod
+    def prefetch_first_image(lookup='images'):
+        """
+        Prefetch that loads only the first image of every product into `first_images`.
+        Pass a `lookup` such as 'product__images' to prefetch it through a relation.
+        """
+        return models.Prefetch(
+            lookup,
+            queryset=Image.objects.order_by('id')[:1],
+            to_attr='first_images',
+        )
+
     def product_thumbnail(self, request):
         """
         Returns the URL of the first image associated with the product. 
         If no image is available, returns None.
         """
-        first_image = self.images.first()  # Get the first image if it exists
+        first_image = self.get_first_image()
         if first_image and hasattr(first_image, 'image') and first_image.image:
             image_url = first_image.image.url
             full_url = request.build_absolute_uri(image_url)
@@ -166,10 +247,18 @@ class Product(PublishableModel, AbstractMetadata, AbstractSEOModel):
 
     
     def colors(self):
-        return self.variants.values_list('color_code', flat=True).distinct()
+        return self.color_codes
     
     def get_stock(self):
-        return self.variants.aggregate(stock=models.Sum('stock'))['stock']
+        return self.total_stock
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.MAINTAINED_FIELDS
+            ]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -269,7 +358,7 @@ class ProductVariant(MonetaryMixin, AbstractUUIDModel, models.Model):
     
     def humanize_total_price(self, locale='en_US'):
         if locale:
-            return format_currency(self.price, self.currency, locale=locale)
+            return get_currency_formatter(self.currency, locale).format(self.price)
         return self.price
     
     def variant_thumbnail(self, request):
@@ -282,8 +371,7 @@ class ProductVariant(MonetaryMixin, AbstractUUIDModel, models.Model):
             full_url = request.build_absolute_uri(image_url)
             return full_url
         
-        if self.product.images.exists():
-            return self.product.product_thumbnail(request)
+        return self.product.product_thumbnail(request)
 
 
 
@@ -305,4 +393,127 @@ class ProductVariant(MonetaryMixin, AbstractUUIDModel, models.Model):
                 if not 'dimension_type' in self.attributes.keys():
                     raise ValidationError("Dimension type is required if dimensions are provided.")
                 if self.attributes['dimension_type'] not in DimensionUnits.choices.keys():
-                    raise ValidationError("Invalid dimension type, must be one of: {}".format(DimensionUnits.choices.keys()))
\ No newline at end of file
+                    raise ValidationError("Invalid dimension type, must be one of: {}".format(DimensionUnits.choices.keys()))
+
+class ProductSearchTerm(models.Model):
+    """
+    Inverted index of product text, used by the search backend on databases without
+    full-text search (see `nxtbn.product.search`). One row per (product, term), weighted
+    by the most important field the term appears in.
+    """
+    term = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_terms')
+    weight = models.FloatField()
+
+    class Meta:
+        unique_together = ('term', 'product')
+
+
+class ProductVariantPrice(models.Model):
+    """
+    Materialized price book: the price of a variant converted to every currency with an exchange rate,
+    stored in subunits of that currency. Lets the storefront filter, order and display prices in the
+    shopper's currency without converting them in Python.
+
+    Rows are maintained by `nxtbn.product.utils`; never edit them by hand.
+    """
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name='currency_prices')
+    currency = models.CharField(max_length=3, choices=CurrencyTypes.choices)
+    price = models.BigIntegerField(help_text="Converted price in subunits of `currency`.")
+
+    class Meta:
+        unique_together = ('variant', 'currency')
+        indexes = [
+            models.Index(fields=['currency', 'price']),
+        ]
+
+    def __str__(self):
+        return f"{self.variant_id} - {self.currency} {self.price}"
+
+
+class ProductVariantSales(models.Model):
+    """
+    Units of a variant sold so far. Maintained by `nxtbn.product.utils.record_sales`
+    together with `ProductVariantDailySales` and the sales counters of the product.
+    """
+    variant = models.OneToOneField(ProductVariant, on_delete=models.CASCADE, primary_key=True, related_name='sales')
+    total_sales = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.variant_id} - {self.total_sales} sold"
+
+
+class ProductVariantDailySales(models.Model):
+    """
+    Units of a variant sold per day of order placement, netted of cancellations and returns.
+    The windowed counters of `Product` (`sales_last_7_days`, ...) are summed from these buckets.
+    """
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name='daily_sales')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('variant', 'day')
+        indexes = [
+            models.Index(fields=['product', 'day']),
+        ]
+
+    def __str__(self):
+        return f"{self.variant_id} - {self.day}: {self.quantity}"
+
+
+class ProductImportJob(AbstractBaseUUIDModel):
+    """
+    A bulk catalog import from an uploaded CSV or JSON Lines feed, run by `nxtbn.product.importer`.
+
+    Rows are imported in chunks of `PRODUCT_IMPORT_CHUNK_SIZE`, each committed together with
+    `processed_rows`, so an interrupted import resumes after the last committed chunk.
+    """
+    created_by = models.ForeignKey(User, on_delete=models.PROTECT, related_name='product_imports')
+    file = models.FileField(upload_to='imports/products/')
+    file_format = models.CharField(max_length=10, choices=ImportFileFormat.choices, default=ImportFileFormat.CSV)
+    status = models.CharField(max_length=20, choices=ImportJobStatus.choices, default=ImportJobStatus.PENDING)
+
+    total_rows = models.PositiveIntegerField(null=True, blank=True, help_text="Rows in the file, counted when the import starts.")
+    processed_rows = models.PositiveIntegerField(default=0, help_text="Rows imported or rejected so far.")
+    created_count = models.PositiveIntegerField(default=0, help_text="Variants created.")
+    updated_count = models.PositiveIntegerField(default=0, help_text="Existing variants updated, matched by SKU.")
+    error_count = models.PositiveIntegerField(default=0, help_text="Rows rejected, see `errors`.")
+    message = models.TextField(blank=True, default='', help_text="Why the import failed, if it did.")
+
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ('-created_at',)
+        permissions = [
+            ('resume_productimportjob', 'Can resume a product import'),
+            ('errors_productimportjob', 'Can view the rejected rows of a product import'),
+        ]
+
+    def get_progress(self):
+        """Percentage of the rows processed, or None until the rows are counted."""
+        if not self.total_rows:
+            return 100 if self.status == ImportJobStatus.COMPLETED else None
+        return min(100, round(self.processed_rows * 100 / self.total_rows, 1))
+
+    def __str__(self):
+        return f"Product import {self.alias} - {self.status}"
+
+
+class ProductImportError(models.Model):
+    """A row of a product import that was rejected, with its validation errors by field."""
+    job = models.ForeignKey(ProductImportJob, on_delete=models.CASCADE, related_name='errors')
+    row = models.PositiveIntegerField(help_text="1-based number of the row in the file, header excluded.")
+    sku = models.CharField(max_length=255, blank=True, default='')
+    errors = models.JSONField(default=dict)
+
+    class Meta:
+        ordering = ('job', 'row')
+        indexes = [
+            models.Index(fields=['job', 'row']),
+        ]
+
+    def __str__(self):
+        return f"Row {self.row}: {self.errors}"
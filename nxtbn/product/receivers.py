@@ -0,0 +1,117 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Substr
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django_celery_beat.models import CrontabSchedule, PeriodicTask
+
+from nxtbn.core.models import CurrencyExchange
+from nxtbn.core.signal_initiators import exchange_rates_updated
+from nxtbn.product.facets import facet_indexes
+from nxtbn.product.models import Category, Collection, Product, ProductType, ProductVariant, Supplier
+from nxtbn.product.search import get_search_backend
+from nxtbn.product.tasks import rebuild_currency_prices_task
+from nxtbn.product.utils import category_trees, rebuild_variant_prices, refresh_product_summaries
+
+
+@receiver(post_save, sender=ProductVariant)
+def update_variant_price_book(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'price' not in update_fields:
+        return
+    transaction.on_commit(lambda: rebuild_variant_prices([instance.pk]))
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def update_product_summary(sender, instance, **kwargs):
+    refresh_product_summaries([instance.product_id])
+
+
+@receiver(post_save, sender=Product)
+def update_product_search_index(sender, instance, **kwargs):
+    transaction.on_commit(lambda: get_search_backend().update([instance.pk]))
+
+
+@receiver(post_save, sender=CurrencyExchange)
+@receiver(post_delete, sender=CurrencyExchange)
+def update_currency_price_book(sender, instance, **kwargs):
+    if instance.base_currency != settings.BASE_CURRENCY:
+        return
+    currencies = [instance.target_currency]
+    transaction.on_commit(lambda: rebuild_currency_prices_task.delay(currencies))
+
+
+@receiver(exchange_rates_updated)
+def update_price_book_after_rate_refresh(sender, currencies, **kwargs):
+    transaction.on_commit(lambda: rebuild_currency_prices_task.delay(currencies))
+
+
+@receiver(post_delete, sender=Category)
+def reroot_orphaned_categories(sender, instance, **kwargs):
+    """
+    Subcategories of a deleted category become top-level (SET_NULL),
+    so their subtrees lose the deleted category's path prefix.
+    """
+    if not instance.path:
+        return
+    Category.objects.filter(path__startswith=instance.path).update(
+        path=Substr('path', len(instance.path) + 1),
+        depth=F('depth') - (instance.depth + 1),
+    )
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_tree(sender, **kwargs):
+    category_trees.invalidate()
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Collection)
+@receiver(post_delete, sender=Collection)
+@receiver(post_save, sender=ProductType)
+@receiver(post_delete, sender=ProductType)
+@receiver(post_save, sender=Supplier)
+@receiver(post_delete, sender=Supplier)
+def invalidate_facet_index(sender, **kwargs):
+    # Saved products are picked up incrementally by FacetIndex.sync; anything else rebuilds the index
+    facet_indexes.invalidate()
+
+
+@receiver(m2m_changed, sender=Product.collections.through)
+def update_collection_facet(sender, instance, action, reverse, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        facet_indexes.invalidate()
+        return
+    # Collection membership does not touch the product row, so mark it for the next incremental sync
+    Product.objects.filter(pk=instance.pk).update(last_modified=timezone.now())
+
+
+@receiver(post_migrate)
+def register_windowed_sales_refresh(sender, **kwargs):
+    if sender.name != 'nxtbn.product':
+        return
+
+    # Drops yesterday's sales from the 7/30-day product sales counters, shortly after midnight
+    schedule, created = CrontabSchedule.objects.get_or_create(
+        minute='5',
+        hour='0',
+        day_of_week='*',
+        day_of_month='*',
+        month_of_year='*',
+        timezone=settings.TIME_ZONE,
+    )
+    # Created once, so a schedule changed in the admin sticks
+    PeriodicTask.objects.get_or_create(
+        name='Refresh windowed product sales',
+        defaults={
+            'task': 'nxtbn.product.tasks.refresh_windowed_sales_task',
+            'crontab': schedule,
+        },
+    )
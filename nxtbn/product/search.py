@@ -0,0 +1,245 @@
+import re
+from abc import ABC, abstractmethod
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Length
+from rest_framework import filters as drf_filters
+
+from nxtbn.product.models import Product, ProductSearchTerm
+
+
+SEARCH_CONFIG = 'english'
+INDEX_BATCH_SIZE = 1000
+
+# Weight of each searched field, most important first
+SEARCH_FIELDS = (
+    ('name', 'A', 1.0),
+    ('brand', 'A', 0.8),
+    ('summary', 'B', 0.4),
+    ('description', 'C', 0.2),
+)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TOKENS = 8
+PREFIX_EXPANSIONS = 50 # indexed terms a query token may expand to by prefix
+
+
+def tokenize(text):
+    """Lowercased words of at least two characters, in order of appearance."""
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall((text or '').lower()) if len(token) > 1]
+
+
+def weigh_terms(values):
+    """
+    Returns {term: weight} for the values of `SEARCH_FIELDS`, each term weighted
+    by the most important field it appears in.
+    """
+    weights = {}
+    for value, (field, weight, score) in zip(values, SEARCH_FIELDS):
+        for token in tokenize(value):
+            weights[token] = max(weights.get(token, 0), score)
+    return weights
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance between `a` and `b`, or `limit + 1` as soon as it exceeds `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def allowed_typos(token):
+    if len(token) >= 8:
+        return 2
+    if len(token) >= 4:
+        return 1
+    return 0
+
+
+class ProductSearchBackend(ABC):
+    """
+    Keeps a search index of product text and answers ranked, typo-tolerant queries.
+    `search()` returns the products matching the query annotated with `search_rank`, best first.
+    """
+
+    @abstractmethod
+    def update(self, product_ids):
+        """Reindexes the given products, e.g. after they were saved."""
+
+    def rebuild(self):
+        """Reindexes every product, in batches."""
+        product_ids = Product.objects.order_by('pk').values_list('pk', flat=True)
+        batch = []
+        for product_id in product_ids.iterator(chunk_size=INDEX_BATCH_SIZE):
+            batch.append(product_id)
+            if len(batch) == INDEX_BATCH_SIZE:
+                self.update(batch)
+                batch = []
+        if batch:
+            self.update(batch)
+
+    @abstractmethod
+    def search(self, queryset, query):
+        """Filters `queryset` to the products matching `query`, annotated with `search_rank`, best first."""
+
+
+class PostgresSearchBackend(ProductSearchBackend):
+    """
+    Full-text search over the weighted `Product.search_vector` column (GIN indexed), with
+    trigram word similarity on the name (gin_trgm_ops index) to match misspelled queries.
+    """
+
+    def get_search_vector(self):
+        vectors = [
+            SearchVector(field, weight=weight, config=SEARCH_CONFIG)
+            for field, weight, score in SEARCH_FIELDS
+        ]
+        search_vector = vectors[0]
+        for vector in vectors[1:]:
+            search_vector = search_vector + vector
+        return search_vector
+
+    def update(self, product_ids):
+        Product.objects.filter(pk__in=product_ids).update(search_vector=self.get_search_vector())
+
+    def search(self, queryset, query):
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+        return queryset.annotate(
+            name_similarity=TrigramWordSimilarity(query, 'name'),
+        ).filter(
+            Q(search_vector=search_query) | Q(name__trigram_word_similar=query)
+        ).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query) + F('name_similarity'),
+        ).order_by('-search_rank', 'pk')
+
+
+class InvertedIndexSearchBackend(ProductSearchBackend):
+    """
+    Search over the `ProductSearchTerm` inverted index, for databases without full-text search
+    (SQLite in development and tests).
+
+    Every query word must match an indexed term: exactly, by prefix, or, when neither finds
+    anything, within one or two typos. Products are ranked by the summed field weights of
+    their matching terms, discounted for prefix and typo matches.
+    """
+    exact_match = 1.0
+    prefix_match = 0.6
+    typo_match = 0.4
+
+    def update(self, product_ids):
+        products = Product.objects.filter(pk__in=product_ids).values_list(
+            'pk', *[field for field, weight, score in SEARCH_FIELDS]
+        )
+        terms = [
+            ProductSearchTerm(product_id=product_id, term=term, weight=weight)
+            for product_id, *values in products
+            for term, weight in weigh_terms(values).items()
+        ]
+
+        with transaction.atomic():
+            ProductSearchTerm.objects.filter(product_id__in=product_ids).delete()
+            ProductSearchTerm.objects.bulk_create(terms, batch_size=INDEX_BATCH_SIZE)
+
+    def expand(self, token):
+        """Returns {indexed term: match quality} for a query word."""
+        # A range scan on the term index, unlike LIKE, which SQLite cannot serve from it
+        prefixed = ProductSearchTerm.objects.filter(term__gte=token, term__lt=token + '\U0010ffff')
+        terms = list(prefixed.order_by('term').values_list('term', flat=True).distinct()[:PREFIX_EXPANSIONS])
+        if terms:
+            return {term: self.exact_match if term == token else self.prefix_match for term in terms}
+
+        limit = allowed_typos(token)
+        if not limit:
+            return {}
+        candidates = ProductSearchTerm.objects.filter(
+            term__gte=token[0], term__lt=token[0] + '\U0010ffff',
+        ).annotate(length=Length('term')).filter(
+            length__gte=len(token) - limit, length__lte=len(token) + limit,
+        ).values_list('term', flat=True).distinct()
+        return {term: self.typo_match for term in candidates if edit_distance(token, term, limit) <= limit}
+
+    def search(self, queryset, query):
+        tokens = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TOKENS]
+        if not tokens:
+            return queryset.none()
+
+        # Each indexed term maps to the query word it matched and how well it matched
+        matches = {}
+        for index, token in enumerate(tokens):
+            expansions = self.expand(token)
+            if not expansions:
+                return queryset.none()
+            for term, quality in expansions.items():
+                if quality > matches.get(term, (None, 0))[1]:
+                    matches[term] = (index, quality)
+
+        groups = {}
+        for term, match in matches.items():
+            groups.setdefault(match, []).append(term)
+
+        postings = ProductSearchTerm.objects.filter(term__in=matches).values('product_id').annotate(
+            matched_tokens=Count(
+                Case(*[When(term__in=terms, then=Value(index)) for (index, quality), terms in groups.items()]),
+                distinct=True,
+            ),
+            score=Sum(
+                F('weight') * Case(
+                    *[When(term__in=terms, then=Value(quality)) for (index, quality), terms in groups.items()],
+                    output_field=FloatField(),
+                ),
+            ),
+        ).filter(matched_tokens=len(tokens))
+
+        return queryset.filter(pk__in=postings.values('product_id')).annotate(
+            search_rank=Subquery(postings.filter(product_id=OuterRef('pk')).values('score')[:1], output_field=FloatField()),
+        ).order_by('-search_rank', 'pk')
+
+
+_search_backends = {}
+
+
+def get_search_backend():
+    """The search backend for the default database."""
+    vendor = connection.vendor
+    if vendor not in _search_backends:
+        _search_backends[vendor] = PostgresSearchBackend() if vendor == 'postgresql' else InvertedIndexSearchBackend()
+    return _search_backends[vendor]
+
+
+class ProductSearchFilter(drf_filters.SearchFilter):
+    """
+    Drop-in replacement of DRF's SearchFilter (same `search` parameter) that queries the product
+    search index instead of scanning text columns with ILIKE. Results are ordered by relevance
+    unless an explicit `ordering` is requested.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return get_search_backend().search(queryset, query)
+
+
+class ProductSearchMatchFilter(drf_filters.SearchFilter):
+    """
+    Like `ProductSearchFilter`, but only keeps the products matching the query, without ranking
+    them, so the view's own ordering (and cursor pagination on it) still applies.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        matches = get_search_backend().search(Product.objects.all(), query)
+        return queryset.filter(pk__in=matches.values('pk'))
@@ -0,0 +1,25 @@
+from celery import shared_task
+
+from nxtbn.product.utils import rebuild_currency_prices, refresh_windowed_sales
+
+
+@shared_task(ignore_result=True)
+def rebuild_currency_prices_task(currencies):
+    """Recomputes the price book of every variant in `currencies` after their exchange rates changed."""
+    rebuild_currency_prices(currencies)
+
+
+@shared_task(ignore_result=True)
+def refresh_windowed_sales_task():
+    """Drops the days that left the windows of the product sales counters; scheduled daily."""
+    refresh_windowed_sales()
+
+
+@shared_task(ignore_result=True, acks_late=True)
+def import_products_task(job_id):
+    """
+    Runs or resumes a bulk product import. Acknowledged only once done, so the job is
+    redelivered if its worker dies; the rerun resumes after the last committed chunk.
+    """
+    from nxtbn.product.importer import run_product_import
+    run_product_import(job_id)
@@ -1,3 +1,498 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.reverse import reverse
+
+from nxtbn.core.currency.abstract_base_currency import exchange_rates
+from nxtbn.core.models import CurrencyExchange
+from nxtbn.filemanager.models import Image
+from nxtbn.home.base_tests import BaseTestCase
+from nxtbn.order.stock import reserve_stock
+from nxtbn.product import ImportJobStatus
+from nxtbn.product.importer import ProductImporter
+from nxtbn.product.models import Category, Product, ProductType, ProductVariant
+from nxtbn.product.facets import FacetIndex, facet_indexes
+from nxtbn.product.models import Collection, ProductImportJob, ProductVariantPrice
+from nxtbn.product.utils import category_trees, rebuild_price_book, rebuild_variant_prices, refresh_product_summaries
+from nxtbn.users import UserRole
+
+
+class ProductFixtureTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(name='Query Count Category')
+        self.product_type = ProductType.objects.create(name='Query Count Type')
+
+    def create_products(self, count):
+        for _ in range(count):
+            index = Product.objects.count()
+            product = Product.objects.create(
+                created_by=self.user,
+                name=f'Product {index}',
+                summary='summary',
+                description='description',
+                category=self.category,
+                product_type=self.product_type,
+            )
+            image = Image.objects.create(created_by=self.user, name=f'Image {index}', image=f'image-{index}.png', image_alt_text='alt')
+            product.images.add(image)
+            for variant_index in range(3):
+                variant = ProductVariant.objects.create(
+                    product=product,
+                    variant_image=image,
+                    price=Decimal('10.00'),
+                    cost_per_unit=Decimal('5.00'),
+                    sku=f'QC-{index}-{variant_index}',
+                )
+            product.default_variant = variant
+            product.save()
+
+
+class StorefrontProductListQueryCountTest(ProductFixtureTestCase):
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertSuccess(response)
+        return len(context.captured_queries)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        urls = [
+            reverse('product-default'),
+            reverse('product-list-products-with-variant'),
+            '/product/storefront/api/products/',
+        ]
+
+        self.create_products(2)
+        small_page_queries = [self.count_queries(url) for url in urls]
+
+        self.create_products(10)
+        large_page_queries = [self.count_queries(url) for url in urls]
+
+        self.assertEqual(small_page_queries, large_page_queries)
+
+
+class DashboardProductCursorPaginationTest(ProductFixtureTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user.role = UserRole.ADMIN
+        self.user.save()
+        self.client.force_login(self.user)
+
+    def collect_pages(self, url, link):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertSuccess(response)
+            ids.extend(product['id'] for product in response.data['results'])
+            url = response.data[link]
+        return ids
+
+    def test_cursor_pages_cover_every_product_once(self):
+        self.create_products(25)
+        expected = list(Product.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+        response = self.client.get(reverse('product-list'))
+        self.assertSuccess(response)
+        self.assertNotIn('count', response.data)
+        self.assertIsNone(response.data['previous_cursor'])
+
+        forward = self.collect_pages(reverse('product-list'), 'next_page_url')
+        self.assertEqual(forward, expected)
+
+        last_page = self.client.get(response.data['next_page_url'])
+        backward = self.collect_pages(last_page.data['previous_page_url'], 'previous_page_url')
+        self.assertEqual(backward, expected[:20])
+
+    def test_cursor_pages_break_created_at_ties_by_id(self):
+        self.create_products(25)
+        # Every product created in the same instant, as a bulk import would
+        Product.objects.update(created_at=Product.objects.earliest('created_at').created_at)
+        expected = list(Product.objects.order_by('created_at', 'id').values_list('id', flat=True))
+
+        url = reverse('product-list') + '?ordering=created_at'
+        forward = self.collect_pages(url, 'next_page_url')
+        self.assertEqual(forward, expected)
+
+        last_page = self.client.get(self.client.get(url).data['next_page_url'])
+        self.assertEqual([product['id'] for product in last_page.data['results']], expected[20:])
+        backward = self.collect_pages(last_page.data['previous_page_url'], 'previous_page_url')
+        self.assertEqual(backward, expected[:20])
+
+    def test_page_mode_and_count_on_request(self):
+        self.create_products(3)
+
+        response = self.client.get(reverse('product-list') + '?with_count=true')
+        self.assertEqual(response.data['count'], 3)
+
+        response = self.client.get(reverse('product-list') + '?pagination=page')
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(response.data['current_page'], 1)
+
+        response = self.client.get(reverse('product-list') + '?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+
+class CategoryTreeTest(BaseTestCase):
+    url = '/product/storefront/api/recursive-categories/'
+
+    def setUp(self):
+        super().setUp()
+        category_trees.clear()
+        self.root = Category.objects.create(name='Root')
+        self.child = Category.objects.create(name='Child', parent=self.root)
+        self.grandchild = Category.objects.create(name='Grandchild', parent=self.child)
+
+    def test_paths_follow_moves_and_deletes(self):
+        self.assertEqual(self.grandchild.path, f'{self.root.id}/{self.child.id}/{self.grandchild.id}/')
+        self.assertEqual([item['name'] for item in self.grandchild.get_family_tree()], ['Root', 'Child', 'Grandchild'])
+
+        other_root = Category.objects.create(name='Other Root')
+        self.child.parent = other_root
+        self.child.save()
+        self.grandchild.refresh_from_db()
+        self.assertEqual(self.grandchild.path, f'{other_root.id}/{self.child.id}/{self.grandchild.id}/')
+
+        other_root.delete()
+        self.grandchild.refresh_from_db()
+        self.assertEqual((self.grandchild.path, self.grandchild.depth), (f'{self.child.id}/{self.grandchild.id}/', 1))
+
+    def test_invalid_moves_are_rejected(self):
+        self.root.parent = self.grandchild
+        with self.assertRaises(ValidationError):
+            self.root.save()
+
+        self.child.parent = Category.objects.create(name='Too Deep', parent=Category.objects.create(name='Deep Root'))
+        with self.assertRaises(ValidationError):
+            self.child.save()
+
+    def test_tree_is_rendered_in_constant_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertSuccess(response)
+        self.assertLessEqual(len(context.captured_queries), 1)
+
+        root = next(node for node in response.data if node['id'] == self.root.id)
+        self.assertEqual(root['children'][0]['children'][0]['name'], 'Grandchild')
+        self.assertEqual(len(response.data), 3)
+
+        Category.objects.create(name='Second Child', parent=self.root)
+        response = self.client.get(self.url)
+        root = next(node for node in response.data if node['id'] == self.root.id)
+        self.assertEqual([child['name'] for child in root['children']], ['Child', 'Second Child'])
+
+
+class ProductSearchTest(ProductFixtureTestCase):
+    url = '/product/storefront/api/products/'
+
+    def create_product(self, name, description='description'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Product.objects.create(
+                created_by=self.user,
+                name=name,
+                summary='summary',
+                description=description,
+                category=self.category,
+                product_type=self.product_type,
+            )
+
+    def search(self, query):
+        response = self.client.get(self.url, {'search': query})
+        self.assertSuccess(response)
+        return [product['name'] for product in response.data['results']]
+
+    def test_results_are_ranked_and_typo_tolerant(self):
+        self.create_product('Travel Mug', description='Keeps coffee warm on the road')
+        self.create_product('Coffee Grinder')
+        self.create_product('Tea Kettle')
+
+        self.assertEqual(self.search('coffee'), ['Coffee Grinder', 'Travel Mug'])
+        self.assertEqual(self.search('cofee grinder'), ['Coffee Grinder'])
+        self.assertEqual(self.search('kett'), ['Tea Kettle'])
+        self.assertEqual(self.search('espresso'), [])
+
+    def test_index_follows_product_changes(self):
+        product = self.create_product('Tea Kettle')
+        product.name = 'Water Boiler'
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+
+        self.assertEqual(self.search('kettle'), [])
+        self.assertEqual(self.search('boiler'), ['Water Boiler'])
+
+    def test_dashboard_search_keeps_the_requested_ordering(self):
+        self.client.force_login(self.user)
+        self.create_product('Travel Mug', description='Keeps coffee warm on the road')
+        self.create_product('Coffee Grinder')
+        self.create_product('Tea Kettle')
+
+        response = self.client.get('/product/dashboard/api/products/', {'search': 'cofee', 'ordering': '-name'})
+        self.assertSuccess(response)
+        self.assertEqual([product['name'] for product in response.data['results']], ['Travel Mug', 'Coffee Grinder'])
+
+
+class ProductFacetTest(ProductFixtureTestCase):
+    url = '/product/storefront/api/products/facets/'
+
+    def setUp(self):
+        super().setUp()
+        facet_indexes.clear()
+        self.other_category = Category.objects.create(name='Other Category')
+        self.collection = Collection.objects.create(name='Summer', created_by=self.user)
+        self.products = []
+        for name, brand, category in [('Mug', 'Acme', self.category), ('Cup', 'Acme', self.other_category), ('Pot', 'Globex', self.category)]:
+            self.products.append(Product.objects.create(
+                created_by=self.user, name=name, brand=brand, summary='summary', description='description',
+                category=category, product_type=self.product_type,
+            ))
+        self.products[0].collections.add(self.collection)
+
+    def get_facets(self, params=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url, params or {})
+        self.assertSuccess(response)
+        counts = {
+            facet: {item['label']: item['count'] for item in values}
+            for facet, values in response.data['facets'].items()
+        }
+        return response.data['count'], counts, len(context.captured_queries)
+
+    def test_counts_follow_filters(self):
+        count, facets, queries = self.get_facets()
+        self.assertEqual(count, 3)
+        self.assertEqual(facets['brand'], {'Acme': 2, 'Globex': 1})
+        self.assertEqual(facets['category'], {'Query Count Category': 2, 'Other Category': 1})
+        self.assertEqual(facets['collection'], {'Summer': 1})
+
+        count, facets, queries = self.get_facets({'brand': 'acme'})
+        self.assertEqual(count, 2)
+        self.assertEqual(facets['category'], {'Query Count Category': 1, 'Other Category': 1})
+        self.assertEqual(queries, 1)
+
+    def test_index_follows_product_saves(self):
+        self.get_facets()
+        product = self.products[2]
+        product.brand = 'Acme'
+        product.save()
+        product.collections.add(self.collection)
+
+        with mock.patch.object(FacetIndex, 'check_interval', 0):
+            count, facets, queries = self.get_facets()
+        self.assertEqual(facets['brand'], {'Acme': 3})
+        self.assertEqual(facets['collection'], {'Summer': 2})
+
+
+class ProductSummaryTest(ProductFixtureTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.create_products(1)
+        self.product = Product.objects.get()
+        self.variant, self.other_variant, self.third_variant = self.product.variants.order_by('pk')
+
+    def assertSummary(self, **expected):
+        self.product.refresh_from_db()
+        self.assertEqual({field: getattr(self.product, field) for field in expected}, expected)
+
+    def test_summary_follows_variant_changes(self):
+        self.assertSummary(variant_count=3, total_stock=0, min_price=Decimal('10.00'), color_codes=[])
+
+        stale_product = Product.objects.get()
+        self.variant.price = Decimal('15.00')
+        self.variant.stock = 4
+        self.variant.color_code = '#ffffff'
+        self.variant.save()
+        self.other_variant.delete()
+
+        # Saving a product loaded before the variants changed keeps the summary intact
+        stale_product.name = 'Renamed'
+        stale_product.save()
+
+        self.assertSummary(
+            variant_count=2, total_stock=4, min_price=Decimal('10.00'), max_price=Decimal('15.00'), color_codes=['#ffffff'],
+        )
+
+    def test_stock_reservation_updates_summary(self):
+        ProductVariant.objects.filter(pk=self.variant.pk).update(track_inventory=True, stock=5)
+        refresh_product_summaries([self.product.pk])
+        self.variant.refresh_from_db()
+
+        reserve_stock([(self.variant, 2)])
+        self.assertSummary(total_stock=3)
+
+        response = self.client.get('/product/storefront/api/products/', {'in_stock': 'false'})
+        self.assertEqual(response.data['results'], [])
+
+
+@override_settings(IS_MULTI_CURRENCY=True, ALLOWED_CURRENCIES=['USD', 'EUR', 'JPY'])
+class ProductPriceBookTest(ProductFixtureTestCase):
+    url = '/product/storefront/api/products/'
+
+    def setUp(self):
+        super().setUp()
+        exchange_rates.clear()
+        self.eur = CurrencyExchange.objects.create(base_currency='USD', target_currency='EUR', exchange_rate=Decimal('2.0000'))
+        self.jpy = CurrencyExchange.objects.create(base_currency='USD', target_currency='JPY', exchange_rate=Decimal('150.0000'))
+        self.create_products(3)
+        self.products = list(Product.objects.order_by('pk'))
+        for product, price in zip(self.products, ('10.00', '20.00', '30.00')):
+            ProductVariant.objects.filter(pk=product.default_variant_id).update(price=Decimal(price))
+        rebuild_price_book()
+
+    def assertPrices(self, variant, expected):
+        self.assertEqual(dict(variant.currency_prices.values_list('currency', 'price')), expected)
+
+    def test_rows_are_kept_per_currency(self):
+        variant = self.products[1].default_variant
+        self.assertPrices(variant, {'USD': 2000, 'EUR': 4000, 'JPY': 3000})
+
+        # Currencies without a rate are dropped on rebuild
+        CurrencyExchange.objects.filter(pk=self.jpy.pk).delete()
+        rebuild_variant_prices([variant.pk])
+        self.assertPrices(variant, {'USD': 2000, 'EUR': 4000})
+        self.assertEqual(ProductVariantPrice.objects.filter(currency='JPY').count(), 8)
+
+    def test_rows_follow_price_and_rate_changes(self):
+        variant = self.products[0].default_variant
+
+        with self.captureOnCommitCallbacks(execute=True):
+            variant.price = Decimal('12.50')
+            variant.save()
+        self.assertPrices(variant, {'USD': 1250, 'EUR': 2500, 'JPY': 1875})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.eur.exchange_rate = Decimal('0.5000')
+            self.eur.save()
+        self.assertPrices(variant, {'USD': 1250, 'EUR': 625, 'JPY': 1875})
+        self.assertPrices(self.products[2].default_variant, {'USD': 3000, 'EUR': 1500, 'JPY': 4500})
+
+    def test_storefront_filters_and_orders_in_the_shopper_currency(self):
+        def names(params, currency):
+            response = self.client.get(self.url, params, HTTP_ACCEPT_CURRENCY=currency)
+            self.assertSuccess(response)
+            return [product['name'] for product in response.data['results']]
+
+        first, second, third = [product.name for product in self.products]
+        self.assertEqual(names({'ordering': '-price'}, 'EUR'), [third, second, first])
+        self.assertEqual(names({'ordering': 'price'}, 'JPY'), [first, second, third])
+
+        # 45 EUR lies between the second (40 EUR) and the third product (60 EUR)
+        self.assertEqual(names({'ordering': 'price', 'max_price': '45'}, 'EUR'), [first, second])
+        self.assertEqual(names({'ordering': 'price', 'min_price': '45'}, 'EUR'), [third])
+        self.assertEqual(names({'ordering': 'price', 'max_price': '45'}, 'USD'), [first, second, third])
+        self.assertEqual(names({'ordering': 'price', 'min_price': '2000', 'max_price': '4000'}, 'JPY'), [second])
+
+
+class ProductImportTest(ProductFixtureTestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_settings = self.settings(MEDIA_ROOT=media_root, PRODUCT_IMPORT_CHUNK_SIZE=2)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        self.create_products(1)
+        Collection.objects.create(name='Summer')
+        self.user.is_superuser = True
+        self.user.save()
+
+    def row(self, sku, name, **fields):
+        return {
+            'sku': sku, 'name': name, 'category': self.category.name, 'product_type': self.product_type.name,
+            'price': '10.00', 'cost_per_unit': '5.00', **fields,
+        }
+
+    def test_upload_upserts_rows_and_reports_errors(self):
+        header = ['sku', 'product_slug', 'name', 'category', 'product_type', 'price', 'cost_per_unit', 'stock', 'track_inventory', 'tags', 'collections']
+        rows = [
+            ['TEE-S', 'tee', 'Tee', self.category.name, self.product_type.name, '12.50', '6', '4', 'true', 'cotton|summer', 'Summer'],
+            ['TEE-M', 'tee', 'Tee', self.category.name, self.product_type.name, '14.00', '6', '1', 'true', 'cotton', ''],
+            ['QC-0-0', 'product-0', 'Product 0', self.category.name, self.product_type.name, '20.00', '5', '', '', '', ''],
+            ['BAD-1', '', 'Bad', 'No Such Category', self.product_type.name, 'abc', '5', '', '', '', ''],
+            ['BAD-2', '', 'Bad', 'No Such Category', self.product_type.name, '10', '5', '', '', '', ''],
+        ]
+        content = '\n'.join(','.join(row) for row in [header, *rows])
+
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/product/dashboard/api/product-imports/',
+                {'file': SimpleUploadedFile('feed.csv', content.encode())},
+                format='multipart',
+            )
+        self.assertEqual(response.status_code, 202)
+
+        job = ProductImportJob.objects.get()
+        self.assertEqual(job.status, ImportJobStatus.COMPLETED)
+        self.assertEqual((job.total_rows, job.created_count, job.updated_count, job.error_count), (5, 2, 1, 2))
+
+        tee = Product.objects.get(slug='tee')
+        self.assertEqual((tee.variant_count, tee.total_stock, tee.min_price, tee.max_price), (2, 5, Decimal('12.50'), Decimal('14.00')))
+        self.assertEqual(tee.default_variant.sku, 'TEE-S')
+        self.assertEqual(set(tee.tags.values_list('name', flat=True)), {'cotton', 'summer'})
+        self.assertEqual(list(tee.collections.values_list('name', flat=True)), ['Summer'])
+        self.assertEqual(ProductVariant.objects.get(sku='QC-0-0').price, Decimal('20.00'))
+        self.assertEqual(Product.objects.count(), 2)
+
+        response = self.client.get(f'/product/dashboard/api/product-imports/{job.alias}/errors/')
+        errors = {error['row']: error['errors'] for error in response.data['results']}
+        self.assertEqual(set(errors), {4, 5})
+        self.assertIn('price', errors[4])
+        self.assertIn('category', errors[5])
+
+    def test_interrupted_import_resumes_after_last_chunk(self):
+        path = os.path.join(tempfile.mkdtemp(), 'feed.jsonl')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with open(path, 'w') as feed:
+            for index in range(5):
+                feed.write(json.dumps(self.row(f'JSON-{index}', f'Json {index}', tags=['json'])) + '\n')
+
+        import_chunk = ProductImporter.import_chunk
+        def crash_on_third_chunk(importer, chunk):
+            if chunk[0][0] == 5:
+                raise RuntimeError('worker lost')
+            import_chunk(importer, chunk)
+
+        output = {'stdout': mock.MagicMock(), 'stderr': mock.MagicMock()}
+        with mock.patch('sys.stderr'), mock.patch.object(ProductImporter, 'import_chunk', crash_on_third_chunk):
+            with self.assertRaises(RuntimeError), self.assertLogs('nxtbn.product.importer', 'ERROR'):
+                call_command('import_products', path, '--user', self.user.email, **output)
+
+        job = ProductImportJob.objects.get()
+        self.assertEqual((job.status, job.processed_rows), (ImportJobStatus.FAILED, 4))
+
+        with mock.patch('sys.stderr'):
+            call_command('import_products', '--resume', str(job.alias), **output)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed_rows, job.created_count), (ImportJobStatus.COMPLETED, 5, 5))
+        self.assertEqual(ProductVariant.objects.filter(sku__startswith='JSON-').count(), 5)
+
+    def test_reimport_only_overwrites_the_given_fields(self):
+        importer = ProductImporter(ProductImportJob.objects.create(created_by=self.user))
+        first = [(1, self.row('MUG-1', 'Mug', product_slug='mug', status='PUBLISHED', brand='Acme', stock='7', track_inventory='true'))]
+        with self.captureOnCommitCallbacks(execute=True):
+            importer.import_chunk(first)
+
+        # A price update feed without status, brand or stock columns
+        with self.captureOnCommitCallbacks(execute=True):
+            importer.import_chunk([(1, self.row('MUG-1', 'Mug', product_slug='mug', price='11.00', summary=''))])
+
+        product = Product.objects.get(slug='mug')
+        variant = product.variants.get()
+        self.assertEqual((product.status, product.is_live, product.brand), ('PUBLISHED', True, 'Acme'))
+        self.assertEqual((variant.price, variant.stock, variant.track_inventory), (Decimal('11.00'), 7, True))
+        self.assertEqual(product.total_stock, 7)
@@ -0,0 +1,295 @@
+import datetime
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from nxtbn.core.local_cache import LocalVersionedCache
+from nxtbn.core.models import CurrencyExchange
+from nxtbn.core.utils import get_currency_formatter
+from nxtbn.product.models import (
+    Category,
+    Product,
+    ProductVariant,
+    ProductVariantDailySales,
+    ProductVariantPrice,
+    ProductVariantSales,
+)
+
+
+PRICE_BOOK_BATCH_SIZE = 2000
+
+# Windowed sales counter of Product: number of days it covers, today included
+SALES_WINDOWS = {
+    'sales_last_7_days': 7,
+    'sales_last_30_days': 30,
+}
+
+category_trees = LocalVersionedCache('category_tree', timeout=300)
+
+
+def get_price_book_rates():
+    """
+    Returns {currency: exchange rate} for every currency the price book is kept in:
+    the base currency plus each currency with a stored exchange rate.
+    """
+    rates = dict(
+        CurrencyExchange.objects.filter(base_currency=settings.BASE_CURRENCY).values_list('target_currency', 'exchange_rate')
+    )
+    rates[settings.BASE_CURRENCY] = Decimal('1')
+    return rates
+
+
+def get_price_book_currency(request):
+    """
+    The currency storefront prices are looked up in; the base currency unless multi-currency is on.
+    """
+    if settings.IS_MULTI_CURRENCY:
+        return request.currency
+    return settings.BASE_CURRENCY
+
+
+def convert_to_subunits(price, exchange_rate, currency):
+    return get_currency_formatter(currency).to_subunit(Decimal(price) * Decimal(exchange_rate))
+
+
+def _upsert_prices(variant_prices, rates):
+    ProductVariantPrice.objects.bulk_create(
+        [
+            ProductVariantPrice(
+                variant_id=variant_id,
+                currency=currency,
+                price=convert_to_subunits(price, exchange_rate, currency),
+            )
+            for variant_id, price in variant_prices
+            for currency, exchange_rate in rates.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['variant', 'currency'],
+        update_fields=['price'],
+    )
+
+
+def rebuild_variant_prices(variant_ids):
+    """
+    Recomputes the price book rows of the given variants in every currency, e.g. after their price changed.
+    """
+    rates = get_price_book_rates()
+    variant_prices = list(ProductVariant.objects.filter(id__in=variant_ids).values_list('id', 'price'))
+    _upsert_prices(variant_prices, rates)
+    ProductVariantPrice.objects.filter(variant_id__in=variant_ids).exclude(currency__in=rates).delete()
+
+
+def rebuild_currency_prices(currencies):
+    """
+    Recomputes the price book rows of every variant in the given currencies, e.g. after their exchange
+    rate changed. Currencies that no longer have a rate are dropped from the price book.
+    Variants are processed in batches, so memory use does not grow with the catalog.
+    """
+    rates = get_price_book_rates()
+    ProductVariantPrice.objects.filter(currency__in=[currency for currency in currencies if currency not in rates]).delete()
+
+    rates = {currency: rates[currency] for currency in currencies if currency in rates}
+    if not rates:
+        return
+
+    batch = []
+    for variant_price in ProductVariant.objects.order_by().values_list('id', 'price').iterator(chunk_size=PRICE_BOOK_BATCH_SIZE):
+        batch.append(variant_price)
+        if len(batch) == PRICE_BOOK_BATCH_SIZE:
+            _upsert_prices(batch, rates)
+            batch = []
+    if batch:
+        _upsert_prices(batch, rates)
+
+
+def rebuild_price_book():
+    """Rebuilds the whole price book, e.g. after installing it on an existing catalog."""
+    rates = get_price_book_rates()
+    ProductVariantPrice.objects.exclude(currency__in=rates).delete()
+    rebuild_currency_prices(list(rates))
+
+
+@contextmanager
+def preset_slugs(model=Product):
+    """
+    Keeps the slugs set on new instances of `model` in bulk_create. AutoSlugField otherwise
+    replaces them, with a query per row to find a unique slug.
+    """
+    slug_field = model._meta.get_field('slug')
+    overwrite_on_add = slug_field.overwrite_on_add
+    slug_field.overwrite_on_add = False
+    try:
+        yield
+    finally:
+        slug_field.overwrite_on_add = overwrite_on_add
+
+
+def build_category_tree(root=None):
+    """
+    Returns the category tree as nested {'id', 'name', 'description', 'children'} nodes,
+    the shape of `RecursiveCategorySerializer`, from a single query.
+    With `root`, returns a one element list holding that category and its subtree.
+    """
+    categories = Category.objects.order_by('depth', 'id').values('id', 'name', 'description', 'parent_id')
+    if root is not None:
+        categories = categories.filter(path__startswith=root.path)
+
+    nodes = {}
+    roots = []
+    for category in categories:
+        node = {'id': category['id'], 'name': category['name'], 'description': category['description'], 'children': []}
+        parent = nodes.get(category['parent_id'])
+        if parent is None:
+            roots.append(node)
+        else:
+            parent['children'].append(node)
+        nodes[category['id']] = node
+    return roots
+
+
+def get_category_tree():
+    """The serialized tree of top-level categories, cached until a category changes."""
+    return category_trees.get('roots', build_category_tree)
+
+
+def get_category_subtrees():
+    """Every category with its subtree, ordered by id; cached until a category changes."""
+    def build():
+        nodes = []
+        pending = list(get_category_tree())
+        while pending:
+            node = pending.pop()
+            nodes.append(node)
+            pending.extend(node['children'])
+        return sorted(nodes, key=lambda node: node['id'])
+
+    return category_trees.get('subtrees', build)
+
+
+def refresh_product_summaries(product_ids):
+    """
+    Recomputes the variant summary columns of the given products (`Product.SUMMARY_FIELDS`).
+
+    The product rows are locked first, so concurrent variant changes of the same product are
+    applied one after another and the last one always sees every committed variant. Run it
+    in the transaction that changed the variants.
+    """
+    with transaction.atomic():
+        products = list(
+            Product.objects.select_for_update().filter(pk__in=set(product_ids)).order_by('pk').only('pk')
+        )
+        if not products:
+            return
+
+        summaries = {
+            row['product_id']: row
+            for row in ProductVariant.objects.filter(product__in=products).order_by().values('product_id').annotate(
+                total_stock=Sum('stock'), variant_count=Count('id'), min_price=Min('price'), max_price=Max('price'),
+            )
+        }
+        colors = {}
+        for product_id, color_code in ProductVariant.objects.filter(
+            product__in=products, color_code__isnull=False,
+        ).order_by('color_code').values_list('product_id', 'color_code').distinct():
+            colors.setdefault(product_id, []).append(color_code)
+
+        for product in products:
+            summary = summaries.get(product.pk, {})
+            product.total_stock = summary.get('total_stock') or 0
+            product.variant_count = summary.get('variant_count') or 0
+            product.min_price = summary.get('min_price')
+            product.max_price = summary.get('max_price')
+            product.color_codes = colors.get(product.pk, [])
+        Product.objects.bulk_update(products, Product.SUMMARY_FIELDS)
+
+
+def adjust_product_stock(stock_changes):
+    """
+    Applies {product_id: stock delta} to `Product.total_stock` after variant stock was changed
+    with a queryset update. Call it after the variant rows are updated, in the same transaction.
+    """
+    for product_id in sorted(stock_changes):
+        if stock_changes[product_id]:
+            Product.objects.filter(pk=product_id).update(total_stock=F('total_stock') + stock_changes[product_id])
+
+
+def _increment_counter(model, lookup, field, amount, **defaults):
+    """Adds `amount` to `field` of the row matching `lookup`, creating the row if needed."""
+    if model.objects.filter(**lookup).update(**{field: F(field) + amount}):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **defaults, **{field: amount})
+    except IntegrityError:
+        # Created by a concurrent transaction in the meantime
+        model.objects.filter(**lookup).update(**{field: F(field) + amount})
+
+
+def get_sales_window_start(days, today=None):
+    return (today or timezone.localdate()) - datetime.timedelta(days=days - 1)
+
+
+def record_sales(sales):
+    """
+    Adds {(variant_id, product_id, day): quantity} to the sales counters: the daily bucket of
+    the variant, its total and the total and windowed counters of its product. Quantities
+    are negative for cancelled or returned items. Rows are updated in key order, so
+    concurrent calls cannot deadlock each other.
+    """
+    today = timezone.localdate()
+    window_starts = {field: get_sales_window_start(days, today) for field, days in SALES_WINDOWS.items()}
+    variant_sales = defaultdict(int)
+    product_sales = defaultdict(lambda: defaultdict(int))
+
+    with transaction.atomic():
+        for (variant_id, product_id, day), quantity in sorted(sales.items()):
+            if not quantity:
+                continue
+            _increment_counter(
+                ProductVariantDailySales, {'variant_id': variant_id, 'day': day}, 'quantity', quantity,
+                product_id=product_id,
+            )
+            variant_sales[variant_id] += quantity
+            product_sales[product_id]['total_sales'] += quantity
+            for field, start in window_starts.items():
+                if start <= day <= today:
+                    product_sales[product_id][field] += quantity
+
+        for variant_id in sorted(variant_sales):
+            _increment_counter(ProductVariantSales, {'variant_id': variant_id}, 'total_sales', variant_sales[variant_id])
+
+        for product_id in sorted(product_sales):
+            Product.objects.filter(pk=product_id).update(**{
+                field: F(field) + quantity for field, quantity in product_sales[product_id].items()
+            })
+
+
+def refresh_windowed_sales():
+    """
+    Recomputes the windowed sales counters of Product from the daily buckets, dropping the
+    days that left each window. Run daily, shortly after midnight (see `CELERY_BEAT_SCHEDULE`).
+    Only products that sold within the longest window or still show windowed sales are updated.
+    """
+    today = timezone.localdate()
+    window_starts = {field: get_sales_window_start(days, today) for field, days in SALES_WINDOWS.items()}
+    oldest = min(window_starts.values())
+
+    buckets = ProductVariantDailySales.objects.filter(product_id=OuterRef('pk')).order_by().values('product_id')
+    sold_recently = ProductVariantDailySales.objects.filter(day__gte=oldest, day__lte=today).values('product_id')
+    stale = Q(pk__in=sold_recently)
+    for field in window_starts:
+        stale |= ~Q(**{field: 0})
+
+    return Product.objects.filter(stale).update(**{
+        field: Coalesce(
+            Subquery(buckets.filter(day__gte=start, day__lte=today).annotate(total=Sum('quantity')).values('total')),
+            0,
+        )
+        for field, start in window_starts.items()
+    })
@@ -92,6 +92,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'django.contrib.sites',
     'django.contrib.sitemaps',
+    'django.contrib.postgres', # search lookups; inert on other databases
 ]
 
 LOCAL_APPS = [
@@ -363,6 +364,8 @@ CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# Run tasks inline instead of sending them to the broker, for development without a worker and for tests
+CELERY_TASK_ALWAYS_EAGER = get_env_var("CELERY_TASK_ALWAYS_EAGER", default=False, var_type=bool) or sys.argv[1] == 'test'
 
 
 CACHES = {
@@ -375,6 +378,15 @@ CACHES = {
         "LOCATION": get_env_var("MEMCACHE_LOCATION", "127.0.0.1:11211"),
     }
 }
+# Cart storage: 'redis' keeps guest and customer carts in Redis hashes (requires REDIS_URL),
+# 'default' keeps guest carts in the session and customer carts in the database.
+CART_STORAGE = get_env_var("CART_STORAGE", default="redis" if get_env_var("REDIS_URL", default="") else "default")
+CART_TTL = get_env_var("CART_TTL", default=60 * 60 * 24 * 30, var_type=int) # seconds an idle Redis cart is kept
+CART_MERGE_ASYNC_THRESHOLD = get_env_var("CART_MERGE_ASYNC_THRESHOLD", default=50, var_type=int) # larger guest carts are merged by a Celery task on login
+
+PRODUCT_IMPORT_CHUNK_SIZE = get_env_var("PRODUCT_IMPORT_CHUNK_SIZE", default=1000, var_type=int) # rows validated and written per transaction
+PRODUCT_IMPORT_STALE_AFTER = get_env_var("PRODUCT_IMPORT_STALE_AFTER", default=600, var_type=int) # seconds without progress before a running import can be taken over
+
 # Default cache backend is dummy/ fallback to dummy cache if no cache backend is configured
 if not get_env_var("REDIS_URL", default=""):
     CACHES["default"]["BACKEND"] = "django.core.cache.backends.dummy.DummyCache"
@@ -399,4 +411,6 @@ NXTBN_JWT_SETTINGS = {
 BASE_CURRENCY = get_env_var("BASE_CURRENCY", default="USD")
 ALLOWED_CURRENCIES = get_env_var("ALLOWED_CURRENCIES", default=[], var_type=list)
 IS_MULTI_CURRENCY = get_env_var("IS_MULTI_CURRENCY", default=False, var_type=bool)
+EXCHANGE_RATE_REFRESH_INTERVAL = get_env_var("EXCHANGE_RATE_REFRESH_INTERVAL", default=3600, var_type=int) # seconds between scheduled refreshes
+EXCHANGE_RATE_REFRESH_JITTER = get_env_var("EXCHANGE_RATE_REFRESH_JITTER", default=300, var_type=int) # max random delay in seconds, spreads calls to the rate provider
 STORE_URL = get_env_var("STORE_URL", default="http://localhost:8000")
\ No newline at end of file
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from nxtbn.shipping.models import ShippingMethod, ShippingRate
+from nxtbn.shipping.utils import shipping_rate_tables
+
+
+@receiver(post_save, sender=ShippingRate)
+@receiver(post_delete, sender=ShippingRate)
+@receiver(post_delete, sender=ShippingMethod)
+def invalidate_shipping_rate_tables(sender, **kwargs):
+    shipping_rate_tables.invalidate()
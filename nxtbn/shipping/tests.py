@@ -1,3 +1,127 @@
+from decimal import Decimal
+
 from django.test import TestCase
 
-# Create your tests here.
+from nxtbn.shipping.models import ShippingMethod, ShippingRate
+from nxtbn.shipping.utils import get_shipping_rate_table, shipping_rate_tables
+
+
+class ShippingRateTableTest(TestCase):
+
+    def setUp(self):
+        shipping_rate_tables.clear()
+        self.method = ShippingMethod.objects.create(name='Standard', carrier='DHL')
+
+    def create_rate(self, weight_min, weight_max, country=None, region=None, city=None):
+        return ShippingRate.objects.create(
+            shipping_method=self.method,
+            country=country,
+            region=region,
+            city=city,
+            weight_min=Decimal(weight_min),
+            weight_max=Decimal(weight_max),
+            rate=Decimal('10.00'),
+        )
+
+    def lookup(self, address, weight=None):
+        """The rate resolved with plain queryset lookups, one location level at a time."""
+        country, region, city = address.get('country'), address.get('state'), address.get('city')
+        levels = []
+        if country:
+            location = {'country': country.upper()}
+            if region:
+                location['region__iexact'] = region
+            else:
+                location['region__isnull'] = True
+            if city:
+                levels.append({**location, 'city__iexact': city})
+            if region:
+                levels.append({'country': country.upper(), 'region__iexact': region, 'city__isnull': True})
+            levels.append({'country': country.upper(), 'region__isnull': True, 'city__isnull': True})
+        levels.append({'country__isnull': True, 'region__isnull': True, 'city__isnull': True})
+
+        rates = ShippingRate.objects.filter(shipping_method=self.method)
+        for location in levels:
+            level_rates = rates.filter(**location)
+            if weight is None:
+                rate = level_rates.order_by('weight_min', 'weight_max').first()
+            else:
+                rate = level_rates.filter(
+                    weight_min__lte=weight, weight_max__gte=weight,
+                ).order_by('-weight_min', '-weight_max').first()
+            if rate is not None:
+                return rate
+        return None
+
+    def assertResolvesLikeLookup(self, addresses, weights):
+        table = get_shipping_rate_table(self.method.id)
+        for address in addresses:
+            for weight in weights:
+                with self.subTest(address=address, weight=weight):
+                    self.assertEqual(table.resolve(address, weight), self.lookup(address, weight))
+
+    def test_location_fallback(self):
+        self.create_rate('0', '100')
+        self.create_rate('0', '50', country='US')
+        self.create_rate('0', '20', country='US', region='California')
+        self.create_rate('0', '10', country='US', region='California', city='San Francisco')
+
+        table = get_shipping_rate_table(self.method.id)
+        self.assertEqual(table.resolve({'country': 'US', 'state': 'california', 'city': 'san francisco'}, 5).city, 'San Francisco')
+        self.assertEqual(table.resolve({'country': 'US', 'state': 'California', 'city': 'San Francisco'}, 15).region, 'California')
+        self.assertEqual(table.resolve({'country': 'us', 'state': 'Texas'}, 15).country.code, 'US')
+        self.assertIsNone(table.resolve({'country': 'DE'}, 60).country)
+        self.assertIsNone(table.resolve({'country': 'DE'}, 150))
+
+        self.assertResolvesLikeLookup(
+            [
+                {'country': 'US', 'state': 'California', 'city': 'San Francisco'},
+                {'country': 'US', 'state': 'California', 'city': 'Oakland'},
+                {'country': 'US', 'state': 'Texas', 'city': 'Austin'},
+                {'country': 'US', 'city': 'San Francisco'},
+                {'country': 'US'},
+                {'country': 'DE', 'state': 'Berlin'},
+                {},
+            ],
+            [Decimal('0'), Decimal('5'), Decimal('10'), Decimal('15'), Decimal('20.5'), Decimal('50'), Decimal('99'), Decimal('150')],
+        )
+
+    def test_overlapping_bands_walk_down(self):
+        self.create_rate('0', '100', country='US')
+        self.create_rate('5', '10', country='US')
+        self.create_rate('5', '30', country='US', region='Ohio')
+        self.create_rate('20', '25', country='US', region='Ohio')
+
+        table = get_shipping_rate_table(self.method.id)
+        # The 5-10 band is found first by the binary search, but does not hold 20kg
+        self.assertEqual(table.resolve({'country': 'US'}, 20).weight_max, Decimal('100'))
+        self.assertEqual(table.resolve({'country': 'US'}, 7).weight_max, Decimal('10'))
+        self.assertEqual(table.resolve({'country': 'US', 'state': 'Ohio'}, 27).weight_min, Decimal('5'))
+
+        self.assertResolvesLikeLookup(
+            [{'country': 'US'}, {'country': 'US', 'state': 'Ohio'}],
+            [Decimal(weight) for weight in ('0', '4.99', '5', '7', '10', '10.01', '20', '22', '25', '27', '30', '31', '100', '101')],
+        )
+
+    def test_without_weight_the_lightest_band_applies(self):
+        self.create_rate('10', '20', country='US')
+        self.create_rate('0', '10', country='US')
+        self.create_rate('0', '5')
+
+        table = get_shipping_rate_table(self.method.id)
+        self.assertEqual(table.resolve({'country': 'US'}).weight_max, Decimal('10'))
+        self.assertResolvesLikeLookup([{'country': 'US'}, {'country': 'FR'}], [None])
+
+    def test_table_is_cached_until_a_rate_changes(self):
+        rate = self.create_rate('0', '10', country='US')
+        get_shipping_rate_table(self.method.id)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_shipping_rate_table(self.method.id).resolve({'country': 'US'}, 5), rate)
+
+        rate.weight_max = Decimal('4')
+        rate.save()
+        self.assertIsNone(get_shipping_rate_table(self.method.id).resolve({'country': 'US'}, 5))
+
+        rate.delete()
+        self.assertIsNone(get_shipping_rate_table(self.method.id).resolve({'country': 'US'}, 1))
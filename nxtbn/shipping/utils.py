@@ -0,0 +1,102 @@
+from bisect import bisect_right
+from collections import defaultdict
+from decimal import Decimal
+
+from nxtbn.core.local_cache import LocalVersionedCache
+from nxtbn.shipping.models import ShippingRate
+
+
+shipping_rate_tables = LocalVersionedCache('shipping_rate_tables', timeout=300)
+
+
+def _normalize(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value.casefold() if value else None
+
+
+class ShippingRateTable:
+    """
+    In-memory rate table of a single ShippingMethod.
+
+    Rates are indexed by (country, region, city); each location holds its weight bands
+    sorted by `weight_min`, so a lookup is a few dict hits plus a binary search.
+    Resolution goes from the most specific location to the least specific one:
+    city > region (state) > country (nationwide) > global.
+    """
+
+    def __init__(self, rates):
+        bands = defaultdict(list)
+        for rate in rates:
+            country = rate.country.code if rate.country else None
+            location = (_normalize(country), _normalize(rate.region), _normalize(rate.city))
+            bands[location].append(rate)
+
+        self.locations = {}
+        for location, location_rates in bands.items():
+            location_rates.sort(key=lambda rate: (rate.weight_min, rate.weight_max))
+            self.locations[location] = (
+                [rate.weight_min for rate in location_rates],
+                location_rates,
+            )
+
+    @classmethod
+    def for_method(cls, shipping_method_id):
+        return cls(ShippingRate.objects.filter(shipping_method_id=shipping_method_id))
+
+    def candidate_locations(self, country, region, city):
+        country, region, city = _normalize(country), _normalize(region), _normalize(city)
+        if country:
+            if city:
+                yield (country, region, city)
+            if region:
+                yield (country, region, None)
+            yield (country, None, None)
+        yield (None, None, None)
+
+    def find_band(self, location, weight):
+        entry = self.locations.get(location)
+        if entry is None:
+            return None
+
+        weight_mins, rates = entry
+        if weight is None:
+            return rates[0]
+
+        # Walk down from the last band starting at or below the weight; normally the first hit wins.
+        index = bisect_right(weight_mins, weight) - 1
+        while index >= 0:
+            rate = rates[index]
+            if weight <= rate.weight_max:
+                return rate
+            index -= 1
+        return None
+
+    def resolve(self, address, weight=None):
+        """
+        Returns the most specific ShippingRate matching the address and total weight, or None.
+        """
+        if weight is not None:
+            weight = Decimal(weight)
+
+        for location in self.candidate_locations(
+            address.get('country'),
+            address.get('state') or address.get('region'),
+            address.get('city'),
+        ):
+            rate = self.find_band(location, weight)
+            if rate is not None:
+                return rate
+        return None
+
+
+def get_shipping_rate_table(shipping_method_id):
+    """
+    Returns the cached ShippingRateTable of a shipping method, building it on first use.
+    Tables are dropped whenever a ShippingRate is saved or deleted.
+    """
+    return shipping_rate_tables.get(
+        int(shipping_method_id),
+        lambda: ShippingRateTable.for_method(shipping_method_id),
+    )
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TaxConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'nxtbn.tax'
+
+    def ready(self):
+        import nxtbn.tax.receivers  # noqa
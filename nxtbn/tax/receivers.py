@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from nxtbn.tax.models import TaxClass, TaxRate
+from nxtbn.tax.utils import tax_rate_tables
+
+
+@receiver(post_save, sender=TaxRate)
+@receiver(post_delete, sender=TaxRate)
+@receiver(post_save, sender=TaxClass)
+@receiver(post_delete, sender=TaxClass)
+def invalidate_tax_rate_table(sender, **kwargs):
+    tax_rate_tables.invalidate()
@@ -1,3 +1,39 @@
+from decimal import Decimal
+
 from django.test import TestCase
 
-# Create your tests here.
+from nxtbn.tax.models import TaxClass, TaxRate
+from nxtbn.tax.utils import get_tax_rate_table, tax_rate_tables
+
+
+class TaxRateTableTest(TestCase):
+
+    def setUp(self):
+        tax_rate_tables.clear()
+        self.tax_class = TaxClass.objects.create(name='Standard')
+        self.country_rate = TaxRate.objects.create(country='US', rate=Decimal('5.00'), tax_class=self.tax_class)
+        self.state_rate = TaxRate.objects.create(country='US', state='CA', rate=Decimal('7.25'), tax_class=self.tax_class)
+
+    def test_state_rate_wins_over_country_rate(self):
+        table = get_tax_rate_table()
+        self.assertEqual(table.resolve(self.tax_class, 'us', 'ca'), self.state_rate)
+        self.assertEqual(table.resolve(self.tax_class.pk, 'US', 'NY'), self.country_rate)
+        self.assertEqual(table.resolve(self.tax_class, 'US'), self.country_rate)
+        self.assertIsNone(table.resolve(self.tax_class, 'DE', 'BE'))
+        self.assertIsNone(table.resolve(None, 'US', 'CA'))
+
+    def test_table_is_cached_until_a_rate_changes(self):
+        get_tax_rate_table()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_tax_rate_table().resolve(self.tax_class, 'US', 'CA').rate, Decimal('7.25'))
+
+        self.state_rate.rate = Decimal('8.00')
+        self.state_rate.save()
+        self.assertEqual(get_tax_rate_table().resolve(self.tax_class, 'US', 'CA').rate, Decimal('8.00'))
+
+        self.state_rate.delete()
+        self.assertEqual(get_tax_rate_table().resolve(self.tax_class, 'US', 'CA'), self.country_rate)
+
+        self.country_rate.is_active = False
+        self.country_rate.save()
+        self.assertIsNone(get_tax_rate_table().resolve(self.tax_class, 'US', 'CA'))
@@ -0,0 +1,53 @@
+from nxtbn.core.local_cache import LocalVersionedCache
+from nxtbn.tax.models import TaxRate
+
+
+tax_rate_tables = LocalVersionedCache('tax_rate_table', timeout=300)
+
+
+def _normalize(value):
+    if not value:
+        return None
+    return str(value).strip().upper() or None
+
+
+class TaxRateTable:
+    """
+    In-memory map of every active TaxRate keyed by (tax_class_id, country, state).
+    Country-wide rates are stored with a `None` state.
+    """
+
+    def __init__(self, rates):
+        self.rates = {}
+        for rate in rates:
+            key = (rate.tax_class_id, _normalize(rate.country.code if rate.country else None), _normalize(rate.state))
+            self.rates[key] = rate
+
+    @classmethod
+    def load(cls):
+        return cls(TaxRate.objects.filter(is_active=True).select_related('tax_class'))
+
+    def resolve(self, tax_class, country, state=None):
+        """
+        Returns the applicable TaxRate, or None for tax exempt products and unknown jurisdictions.
+        Hierarchy: State > Country
+        """
+        if tax_class is None:
+            return None
+
+        tax_class_id = getattr(tax_class, 'pk', tax_class)
+        country, state = _normalize(country), _normalize(state)
+
+        if state:
+            rate = self.rates.get((tax_class_id, country, state))
+            if rate:
+                return rate
+        return self.rates.get((tax_class_id, country, None))
+
+
+def get_tax_rate_table():
+    """
+    Returns the process-local TaxRateTable, loading it with a single query on first use.
+    The table is dropped whenever a TaxRate or TaxClass is saved or deleted.
+    """
+    return tax_rate_tables.get('active', TaxRateTable.load)
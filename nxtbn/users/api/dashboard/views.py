@@ -80,6 +80,7 @@ class CustomerListAPIView(generics.ListAPIView):
     ] 
     serializer_class = CustomerSerializer
     pagination_class = NxtbnPagination
+    count_strategy = 'cached'
     search_fields = ['id', 'username', 'email']
 
     def get_queryset(self):
@@ -14,6 +14,7 @@ from nxtbn.users.api.storefront.serializers import (
     RefreshSerializer,
     SignupSerializer,
 )
+from nxtbn.core.signal_initiators import customer_logged_in
 from nxtbn.users.utils.jwt_utils import JWTManager
 
 
@@ -78,6 +79,8 @@ class LoginView(generics.GenericAPIView):
                     status=status.HTTP_403_FORBIDDEN,
                 )
 
+            customer_logged_in.send(sender=self.__class__, user=user, request=request)
+
             access_token = self.jwt_manager.generate_access_token(user)
             refresh_token = self.jwt_manager.generate_refresh_token(user)
 